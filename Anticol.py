@@ -5,7 +5,9 @@
 import MFRC522
 import signal
 import sys
-from Common import end_read, should_read, print_hex, auto_find_port
+import time
+from Common import end_read, should_read, print_hex, connect_reader
+from EventStream import EventStream, hex_str
 
 CASCADE_BIT = 0x4
 SAK_FLAG_ATS_SUPPORTED = 0x20
@@ -16,25 +18,68 @@ def main():
 
     no_rats = False
     wakeup = False
-    for arg in sys.argv[1:]:
+    json_out = False
+    socket_path = None
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg == '-n':
             no_rats = True
         if arg == '-w':
             wakeup = True
+        if arg == '-j':
+            json_out = True
+        if arg == '-s':
+            json_out = True
+            socket_path = next(args, None)
+            if socket_path is None:
+                print('-s needs the path of the Unix socket')
+                exit(-1)
+
+    events = None
+    if json_out:
+        if socket_path is None:
+            # Keep stdout for the events, everything human readable goes to stderr.
+            events = EventStream()
+            sys.stdout = sys.stderr
+        else:
+            events = EventStream(socket_path)
+
+    try:
+        # Create an object of the class MFRC522, inside the try so the socket
+        # is closed and removed when no reader is found.
+        (mf_reader, port) = connect_reader()
+
+        # Welcome message
+        print("Welcome to the MFRC522(%s) port of nfc-anticol" % port)
+        print("Press Ctrl-C to stop.")
+        if events is not None:
+            events.emit('start', port=port)
+
+        # This loop keeps checking for chips. If one is near it will get the UID and authenticate
+        while should_read():
+            if events is None:
+                if anticol(mf_reader, wakeup=wakeup, no_rats=no_rats)[0]:
+                    # Always halt last success card.
+                    mf_reader.MFRC522_HaltA()
+                continue
+            timing = {}
+            (success, card_info) = anticol(mf_reader, print_info=False, wakeup=wakeup, no_rats=no_rats, timing=timing)
+            if success:
+                t_halt = time.monotonic_ns()
+                mf_reader.MFRC522_HaltA()
+                timing['halt'] = (time.monotonic_ns() - t_halt) // 1000
+                (uid, sak, atqa, ats) = card_info
+                events.emit('tag', uid=hex_str(uid), atqa='%02x%02x' % (atqa[1], atqa[0]), sak='%02x' % sak,
+                            ats=hex_str(ats), us=timing)
+    finally:
+        if events is not None:
+            events.close()
+
+def phase_done(timing, phase, t_start):
+    now = time.monotonic_ns()
+    timing[phase] = (now - t_start) // 1000
+    return now
 
-    # Create an object of the class MFRC522
-    port = auto_find_port()
-    mf_reader = MFRC522.MFRC522(dev=port)
-
-    # Welcome message
-    print("Welcome to the MFRC522(%s) port of nfc-anticol" % port)
-    print("Press Ctrl-C to stop.")
-
-    # This loop keeps checking for chips. If one is near it will get the UID and authenticate
-    while should_read():
-        if anticol(mf_reader, wakeup=wakeup, no_rats=no_rats)[0]:
-            # Always halt last success card.
-            mf_reader.MFRC522_HaltA()
 
 def select_card(mf_reader: MFRC522, uid, ):
     cl = 1
@@ -82,13 +127,47 @@ def select_card(mf_reader: MFRC522, uid, ):
                         sak = sak3
     return True, (uid, cl, sak)                    
 
-def anticol(mf_reader: MFRC522, print_info = True, wakeup = False, no_rats = False):
+def cascade_parts(uid):
+    # UID parts sent at each cascade level, the cascade tag 0x88 prefixes all but the last.
+    if len(uid) == 4:
+        return [uid]
+    if len(uid) == 7:
+        return [[0x88] + uid[0:3], uid[3:7]]
+    return [[0x88] + uid[0:3], [0x88] + uid[3:6], uid[6:10]]
+
+def fast_select(mf_reader: MFRC522, parts):
+    """Wake the tag up and select it by its known UID, no anticollision loop.
+
+    The first frame after an aborted authentication can be taken by the tag
+    as the missing reader answer, so the wakeup is tried twice.
+    """
+    for _ in range(2):
+        (status, _, backLen) = mf_reader.MFRC522_Transceive([mf_reader.PICC_WUPA], 7, mf_reader.TIMEOUT_SHORT)
+        if status == mf_reader.MI_OK and backLen == 16:
+            break
+    else:
+        return False
+    for (cl, part) in enumerate(parts):
+        frame = [mf_reader.PICC_SELECTTAG + 2 * cl, 0x70] + part + [part[0] ^ part[1] ^ part[2] ^ part[3]]
+        (status, sak) = mf_reader.MFRC522_TransceiveCRC(frame, mf_reader.TIMEOUT_SHORT)
+        if status != mf_reader.MI_OK or len(sak) != 1:
+            return False
+    return True
+
+def anticol(mf_reader: MFRC522, print_info = True, wakeup = False, no_rats = False, timing = None):
+    # When timing is a dict, the duration of every phase is stored in it (in us).
+    t_phase = time.monotonic_ns()
+
     # Scan for cards
     (status, atqa, _) = mf_reader.MFRC522_Request(mf_reader.PICC_WUPA if wakeup else mf_reader.PICC_REQA)
+    if timing is not None:
+        t_phase = phase_done(timing, 'req', t_phase)
 
     if status == mf_reader.MI_OK:
         # Get the UID of the card
         (status, uid) = mf_reader.MFRC522_Anticoll()
+        if timing is not None:
+            t_phase = phase_done(timing, 'anticoll', t_phase)
 
         # If we have the UID, continue
         if status == mf_reader.MI_OK:
@@ -96,6 +175,8 @@ def anticol(mf_reader: MFRC522, print_info = True, wakeup = False, no_rats = Fal
             if not success:
                 return False, None
             (uid, cl, sak) = card_info
+            if timing is not None:
+                t_phase = phase_done(timing, 'select', t_phase)
 
             ats = None
             iso_ats_supported = sak & SAK_FLAG_ATS_SUPPORTED
@@ -103,6 +184,8 @@ def anticol(mf_reader: MFRC522, print_info = True, wakeup = False, no_rats = Fal
                 status, ats = mf_reader.MFRC522_RequestATS()
                 if status != mf_reader.MI_OK:
                     print('WARNING: ATS request failed')
+                if timing is not None:
+                    t_phase = phase_done(timing, 'rats', t_phase)
 
             if cl == 1:
                 cascade_uid = uid[0:4]
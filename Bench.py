@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+import MFRC522
+import FakeReader
+import Mfoc
+from Anticol import anticol
+from MFCard import MifareClassicCard
+from MFClassic import read_card, write_card
+from MFDump import Dump, first_block_of_sector
+from MFNdef import read_ndef, mad_crc
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+DEFAULT_REPEAT = 5
+
+# The counts are exact, every increase over the baseline is a regression.
+COUNTERS = ['round_trips', 'writes', 'bytes_out', 'bytes_in']
+
+# The peak of the Python heap and the allocation count may vary a little between runs.
+MEMORY_TOLERANCE = 10
+# Allocations per call tolerated on top, for the calls that allocate next to nothing.
+ALLOCATION_SLACK = 1
+
+# Estimate for a real reader: every round trip waits for the USB-serial
+# adapter, every byte takes 10 bit times at the 1228800 baud the driver uses.
+ROUND_TRIP_LATENCY = 0.001
+BAUD_RATE = 1228800
+
+KEY = [0xff, 0xff, 0xff, 0xff, 0xff, 0xff]
+BLOCK = [0x00, 0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88, 0x99, 0xaa, 0xbb, 0xcc, 0xdd, 0xee, 0xff]
+
+
+def open_fake(card=None, crc_offload=False):
+    fake = FakeReader.FakeSerial(card)
+    return MFRC522.MFRC522(ser=fake, crc_offload=crc_offload), fake
+
+
+def open_selected(card, crc_offload=False):
+    # Reader with the card selected, as the tools have it after anticol().
+    (mf_reader, fake) = open_fake(card, crc_offload)
+    anticol(mf_reader, print_info=False, no_rats=True)
+    return mf_reader, fake
+
+
+def open_authenticated(card, block=0, crc_offload=False):
+    (mf_reader, fake) = open_selected(card, crc_offload)
+    mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, block, KEY, card.uid)
+    return mf_reader, fake
+
+
+def classic_card(blocks):
+    return FakeReader.FakeClassicCard(blocks=blocks, sak=0x18 if blocks == 0xff else 0x08,
+                                      atqa=(0x02, 0x00) if blocks == 0xff else (0x04, 0x00))
+
+
+def mixed_key_card():
+    # Odd sectors use the MAD key A and its key B, so the key search has misses to recover from.
+    card = classic_card(0x3f)
+    for sector in range(1, 16, 2):
+        trailer = (first_block_of_sector(sector) + 3) * 16
+        card.image[trailer:trailer + 6] = bytes([0xa0, 0xa1, 0xa2, 0xa3, 0xa4, 0xa5])
+        card.image[trailer + 10:trailer + 16] = bytes([0xb0, 0xb1, 0xb2, 0xb3, 0xb4, 0xb5])
+    return card
+
+
+def ndef_card(blocks):
+    # NFC Forum formatted card with an URL in sectors 1 and 2, the MAD assigns all sectors to NDEF.
+    card = classic_card(blocks)
+    mad = bytes([0x01]) + bytes([0x03, 0xe1]) * 15
+    card.image[16:48] = bytes([mad_crc(mad)]) + mad
+    card.image[48:64] = bytes([0xa0, 0xa1, 0xa2, 0xa3, 0xa4, 0xa5, 0x78, 0x77, 0x88, 0xc1]) + bytes([0xff] * 6)
+    for sector in range(1, 16):
+        trailer = (first_block_of_sector(sector) + 3) * 16
+        card.image[trailer:trailer + 10] = bytes([0xd3, 0xf7, 0xd3, 0xf7, 0xd3, 0xf7, 0x7f, 0x07, 0x88, 0x40])
+    uri = b'\x04github.com/example/MFRC522-UART-Libnfc-Tools/blob/master/README.md'
+    record = bytes([0xd1, 0x01, len(uri), ord('U')]) + uri
+    tlv = bytes([0x03, len(record)]) + record + bytes([0xfe])
+    # The TLV runs on from sector 1 into sector 2, over the data blocks only.
+    data_blocks = [block for block in range(4, 12) if block % 4 != 3]
+    for (i, block) in enumerate(data_blocks[:(len(tlv) + 15) // 16]):
+        chunk = tlv[i * 16:(i + 1) * 16]
+        card.image[block * 16:block * 16 + len(chunk)] = chunk
+    return card
+
+
+# Each setup returns (mf_reader, fake serial, operation, calls per operation).
+# The setup is not measured, the numbers are reported per call.
+
+def setup_crc():
+    (mf_reader, fake) = open_fake()
+    return mf_reader, fake, lambda: [mf_reader.CalulateCRC(BLOCK) for _ in range(1000)], 1000
+
+
+def setup_write_register():
+    (mf_reader, fake) = open_fake()
+    return mf_reader, fake, lambda: [mf_reader.writeRegister(mf_reader.ModeReg, 0x3D) for _ in range(100)], 100
+
+
+def setup_read_register():
+    (mf_reader, fake) = open_fake()
+    return mf_reader, fake, lambda: [mf_reader.readRegister(mf_reader.VersionReg) for _ in range(100)], 100
+
+
+def setup_to_card():
+    (mf_reader, fake) = open_authenticated(classic_card(0x3f))
+    frame = [mf_reader.PICC_READ, 1] + mf_reader.CalulateCRC([mf_reader.PICC_READ, 1])
+    return mf_reader, fake, lambda: [mf_reader.MFRC522_ToCard(mf_reader.PCD_TRANSCEIVE, frame) for _ in range(10)], 10
+
+
+def setup_auth():
+    card = classic_card(0x3f)
+    (mf_reader, fake) = open_selected(card)
+    return mf_reader, fake, lambda: [mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, 0, KEY, card.uid)
+                                     for _ in range(10)], 10
+
+
+def setup_read(crc_offload=False):
+    (mf_reader, fake) = open_authenticated(classic_card(0x3f), crc_offload=crc_offload)
+    return mf_reader, fake, lambda: [mf_reader.MFRC522_Read(1) for _ in range(10)], 10
+
+
+def setup_write(crc_offload=False):
+    (mf_reader, fake) = open_authenticated(classic_card(0x3f), crc_offload=crc_offload)
+    return mf_reader, fake, lambda: [mf_reader.MFRC522_Write(1, BLOCK) for _ in range(10)], 10
+
+
+def setup_anticol():
+    (mf_reader, fake) = open_fake(classic_card(0x3f))
+    return mf_reader, fake, lambda: anticol(mf_reader, print_info=False, no_rats=True), 1
+
+
+def setup_read_card(blocks, crc_offload=False):
+    card = classic_card(blocks)
+    (mf_reader, fake) = open_selected(card, crc_offload)
+    return mf_reader, fake, lambda: read_card(mf_reader, card.uid, False, None, False, blocks, True, False, False), 1
+
+
+def setup_write_card(blocks, crc_offload=False):
+    card = classic_card(blocks)
+    (mf_reader, fake) = open_selected(card, crc_offload)
+    dump = Dump(bytearray(card.image))
+    return mf_reader, fake, lambda: write_card(mf_reader, card.uid, False, None, False, blocks, True, False, dump,
+                                               False, False), 1
+
+
+def setup_session_read(blocks):
+    card = classic_card(blocks)
+    (mf_reader, fake) = open_selected(card)
+    session = MifareClassicCard(mf_reader, card.uid)
+    return mf_reader, fake, lambda: session.read_blocks(range(blocks + 1)), 1
+
+
+def setup_ndef_read(blocks):
+    card = ndef_card(blocks)
+    (mf_reader, fake) = open_selected(card)
+    session = MifareClassicCard(mf_reader, card.uid)
+    return mf_reader, fake, lambda: read_ndef(session, 16), 1
+
+
+def setup_mfoc_default_keys():
+    card = mixed_key_card()
+    (mf_reader, fake) = open_selected(card)
+    t = Mfoc.MfTag(sectors=[Mfoc.Sector() for _ in range(16)], num_sectors=16, num_blocks=0x3f, auth_uid=card.uid)
+    return mf_reader, fake, lambda: Mfoc.find_default_keys(mf_reader, t, Mfoc.GUESS_KEYS), 1
+
+
+BENCHMARKS = [
+    ('CalulateCRC', setup_crc),
+    ('writeRegister', setup_write_register),
+    ('readRegister', setup_read_register),
+    ('MFRC522_ToCard', setup_to_card),
+    ('MFRC522_Auth', setup_auth),
+    ('MFRC522_Read', setup_read),
+    ('MFRC522_Read offload', lambda: setup_read(True)),
+    ('MFRC522_Write', setup_write),
+    ('MFRC522_Write offload', lambda: setup_write(True)),
+    ('anticol', setup_anticol),
+    ('read_card 1K', lambda: setup_read_card(0x3f)),
+    ('read_card 4K', lambda: setup_read_card(0xff)),
+    ('write_card 1K', lambda: setup_write_card(0x3f)),
+    ('write_card 4K', lambda: setup_write_card(0xff)),
+    ('read_card 1K offload', lambda: setup_read_card(0x3f, True)),
+    ('write_card 1K offload', lambda: setup_write_card(0x3f, True)),
+    ('MifareClassicCard 1K', lambda: setup_session_read(0x3f)),
+    ('read_ndef 1K', lambda: setup_ndef_read(0x3f)),
+    ('Mfoc default keys', setup_mfoc_default_keys),
+]
+
+
+def counters(fake):
+    return [fake.reads, fake.writes, fake.bytes_out, fake.bytes_in]
+
+
+def measure_memory(setup):
+    # Peak of the Python heap above its level at the start of the operation,
+    # in an extra run since tracing slows everything down.
+    (mf_reader, fake, operation, calls) = setup()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return (peak - start) / calls
+
+
+def count_allocations(operation):
+    """Memory blocks the operation allocates, the emulated reader and card left out.
+
+    sys.getallocatedblocks() is sampled before every bytecode, each rise
+    counts, so objects that are freed again later count as well. Blocks
+    allocated and freed within one bytecode, and objects CPython takes from
+    its free lists, are not seen. The frame objects tracing itself needs are
+    taken off.
+    """
+    # Last sample, total, emulator code running, frame objects held by the tracing.
+    state = [0, 0, False, 0]
+    get_blocks = sys.getallocatedblocks
+
+    def tracer(frame, event, arg):
+        if event == 'call':
+            state[3] += 1
+        now = get_blocks() - state[3]
+        if not state[2] and now > state[0]:
+            state[1] += now - state[0]
+        if event == 'return':
+            state[3] -= 1
+        state[0] = now
+        state[2] = frame.f_code.co_filename == FakeReader.__file__
+        frame.f_trace_opcodes = True
+        return tracer
+
+    state[0] = get_blocks()
+    sys.settrace(tracer)
+    try:
+        operation()
+    finally:
+        sys.settrace(None)
+    return state[1]
+
+
+def measure_allocations(setup):
+    # In an extra run as well, tracing every bytecode is slow.
+    (mf_reader, fake, operation, calls) = setup()
+    with contextlib.redirect_stdout(io.StringIO()):
+        allocations = count_allocations(operation)
+    return allocations / calls
+
+
+def run_benchmark(setup, repeat):
+    """Run one benchmark repeat times, each on a fresh reader and card.
+
+    Returns the counters of the first run (they are the same every run), the
+    best wall time, the heap peak and the allocations, all per call.
+    """
+    result = None
+    best = None
+    for _ in range(repeat):
+        (mf_reader, fake, operation, calls) = setup()
+        start = counters(fake)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t_start = time.perf_counter()
+            operation()
+            elapsed = time.perf_counter() - t_start
+        if result is None:
+            result = dict(zip(COUNTERS, [(b - a) / calls for (a, b) in zip(start, counters(fake))]))
+        best = elapsed / calls if best is None else min(best, elapsed / calls)
+    result['time_us'] = best * 1000000
+    result['peak_bytes'] = measure_memory(setup)
+    result['allocations'] = measure_allocations(setup)
+    result['estimate_ms'] = (result['round_trips'] * ROUND_TRIP_LATENCY +
+                             (result['bytes_out'] + result['bytes_in']) * 10 / BAUD_RATE) * 1000
+    return result
+
+
+def compare(name, result, baseline, time_tolerance):
+    # Returns the list of regressions of one benchmark against its baseline.
+    regressions = []
+    for counter in COUNTERS:
+        if result[counter] > baseline[counter]:
+            regressions.append('%s: %s %g > %g' % (name, counter, result[counter], baseline[counter]))
+    if 'peak_bytes' in baseline and result['peak_bytes'] > baseline['peak_bytes'] * (1 + MEMORY_TOLERANCE / 100):
+        regressions.append('%s: peak_bytes %g > %g + %d%%' % (name, result['peak_bytes'], baseline['peak_bytes'],
+                                                             MEMORY_TOLERANCE))
+    if 'allocations' in baseline and result['allocations'] > max(baseline['allocations'] * (1 + MEMORY_TOLERANCE / 100),
+                                                                 baseline['allocations'] + ALLOCATION_SLACK):
+        regressions.append('%s: allocations %g > %g + %d%%' % (name, result['allocations'], baseline['allocations'],
+                                                              MEMORY_TOLERANCE))
+    if time_tolerance is not None and result['time_us'] > baseline['time_us'] * (1 + time_tolerance / 100):
+        regressions.append('%s: time_us %.1f > %.1f + %d%%' % (name, result['time_us'], baseline['time_us'],
+                                                              time_tolerance))
+    return regressions
+
+
+def print_results(results):
+    print('%-20s %12s %11s %8s %10s %10s %10s %8s %12s' % ('', 'time/call', 'round trips', 'writes', 'bytes out',
+                                                           'bytes in', 'heap peak', 'allocs', 'est. on USB'))
+    for (name, result) in results.items():
+        print('%-20s %9.1f us %11g %8g %10g %10g %8.0f B %8.1f %9.2f ms' % (
+            name, result['time_us'], result['round_trips'], result['writes'], result['bytes_out'], result['bytes_in'],
+            result['peak_bytes'], result['allocations'], result['estimate_ms']))
+
+
+def usage(program_name):
+    print('Usage: %s [-b <baseline.json>] [-u] [-t <percent>] [-r <repeat>] [<name> ...]' % program_name)
+    print('  Runs the driver and the tools against an emulated reader and card, no hardware needed.')
+    print('  -b <baseline>  - baseline file, default %s' % os.path.basename(DEFAULT_BASELINE))
+    print('  -u             - store the results as the new baseline')
+    print('  -t <percent>   - also fail when a wall time exceeds its baseline by more than percent')
+    print('  -r <repeat>    - runs per benchmark, the best time counts, default %d' % DEFAULT_REPEAT)
+    print('  <name>         - only run the benchmarks whose name starts with one of these')
+    print('More round trips, writes or bytes than the baseline fail the run, so does a heap peak or')
+    print('an allocation count more than %d%% over it.' % MEMORY_TOLERANCE)
+
+
+def main():
+    args = sys.argv[1:]
+    baseline_path = DEFAULT_BASELINE
+    update = False
+    time_tolerance = None
+    repeat = DEFAULT_REPEAT
+    names = []
+    try:
+        while args:
+            if args[0] == '-b':
+                baseline_path = args[1]
+                args = args[2:]
+            elif args[0] == '-u':
+                update = True
+                args = args[1:]
+            elif args[0] == '-t':
+                time_tolerance = int(args[1])
+                args = args[2:]
+            elif args[0] == '-r':
+                repeat = int(args[1])
+                args = args[2:]
+            elif args[0].startswith('-'):
+                raise ValueError(args[0])
+            else:
+                names.append(args[0])
+                args = args[1:]
+    except (IndexError, ValueError) as err:
+        print('Illegal argument: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+
+    results = {}
+    for (name, setup) in BENCHMARKS:
+        if names and not [prefix for prefix in names if name.startswith(prefix)]:
+            continue
+        results[name] = run_benchmark(setup, repeat)
+    print_results(results)
+
+    baselines = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as fp:
+            baselines = json.load(fp)
+    if update:
+        baselines.update(results)
+        with open(baseline_path, 'w') as fp:
+            json.dump(baselines, fp, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % baseline_path)
+        exit(0)
+
+    regressions = []
+    for (name, result) in results.items():
+        if name in baselines:
+            regressions += compare(name, result, baselines[name], time_tolerance)
+        else:
+            print('No baseline for %s' % name)
+    if regressions:
+        print('Regressions:')
+        for regression in regressions:
+            print('  %s' % regression)
+        exit(-1)
+    print('No regressions.')
+
+
+if __name__ == '__main__':
+    main()
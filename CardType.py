@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import MFRC522
+import sys
+from dataclasses import dataclass
+from Anticol import anticol, connect_reader, cascade_parts, fast_select
+from MFUltralight import detect_type
+
+CLASSIC = 'classic'
+ULTRALIGHT = 'ultralight'
+ISO_DEP = 'iso-dep'
+UNKNOWN = 'unknown'
+
+# Magic card generations.
+GEN1A = 'gen1a'     # HALT + 40/43 backdoor, block 0 written without authentication
+GEN1B = 'gen1b'     # answers 40 but not 43
+GEN2 = 'gen2'       # also sold as CUID, block 0 is written with a plain authenticated WRITE
+GEN3 = 'gen3'       # APDU configured, block 0 reads without authentication
+GEN4 = 'gen4'       # GTU, password protected configuration commands
+
+# Magic generations whose block 0 takes a plain authenticated WRITE.
+DIRECT_WRITE = [GEN2]
+
+
+@dataclass
+class CardType:
+    name: str
+    family: str
+    blocks: int = None      # last block of a MIFARE Classic, None for other cards
+    magic: str = None
+
+
+# Keyed on (SAK, ATQA), the UID size bits 7..6 of the ATQA are masked out so
+# 4 and 7 byte UID variants share an entry. ATQA as printed, high byte first.
+FINGERPRINTS = {
+    (0x01, 0x0004): CardType('TNP3xxx (MIFARE Classic 1K)', CLASSIC, 0x3f),
+    (0x08, 0x0004): CardType('MIFARE Classic 1K', CLASSIC, 0x3f),
+    (0x09, 0x0004): CardType('MIFARE Classic Mini', CLASSIC, 0x13),
+    (0x10, 0x0004): CardType('MIFARE Plus 2K (SL2)', CLASSIC, 0x7f),
+    (0x11, 0x0002): CardType('MIFARE Plus 4K (SL2)', CLASSIC, 0xff),
+    (0x18, 0x0002): CardType('MIFARE Classic 4K', CLASSIC, 0xff),
+    (0x28, 0x0004): CardType('SmartMX with MIFARE Classic 1K', CLASSIC, 0x3f),
+    (0x38, 0x0002): CardType('SmartMX with MIFARE Classic 4K', CLASSIC, 0xff),
+    (0x88, 0x0004): CardType('Infineon MIFARE Classic 1K', CLASSIC, 0x3f),
+    (0x00, 0x0004): CardType('MIFARE Ultralight/NTAG', ULTRALIGHT),
+    (0x20, 0x0004): CardType('MIFARE Plus (SL3)', ISO_DEP),
+    (0x20, 0x0002): CardType('MIFARE Plus 4K (SL3)', ISO_DEP),
+    (0x20, 0x0304): CardType('MIFARE DESFire', ISO_DEP),
+}
+
+# Fallback on the SAK alone, for ATQAs not in the table.
+SAK_TYPES = {
+    0x08: CardType('MIFARE Classic 1K compatible', CLASSIC, 0x3f),
+    0x09: CardType('MIFARE Classic Mini compatible', CLASSIC, 0x13),
+    0x18: CardType('MIFARE Classic 4K compatible', CLASSIC, 0xff),
+    0x00: CardType('MIFARE Ultralight/NTAG compatible', ULTRALIGHT),
+}
+
+# ATS without its CRC, as answered by magic cards.
+MAGIC_ATS = {
+    (0x09, 0x78, 0x00, 0x91, 0x02, 0xDA, 0xBC, 0x19, 0x10): CardType('MIFARE Classic 1K gen2', CLASSIC, 0x3f, GEN2),
+    (0x0D, 0x78, 0x00, 0x71, 0x02, 0x88, 0x49, 0xA1, 0x30, 0x20, 0x15, 0x06, 0x08, 0x56, 0x3D):
+        CardType('MIFARE Classic 1K gen2 (7 byte UID)', CLASSIC, 0x3f, GEN2),
+    (0x0A, 0x78, 0x00, 0x81, 0x02, 0xDB, 0xA0, 0xC1, 0x19, 0x40): CardType('MIFARE Ultralight gen2', ULTRALIGHT, None, GEN2),
+}
+
+# Historical bytes of a MIFARE Plus 2K in SL1, it looks like a 1K by SAK and ATQA.
+PLUS_2K_HISTORICAL = [0xc1, 0x05, 0x2f, 0x2f]
+
+GEN4_GET_CONFIG = [0xCF, 0x00, 0x00, 0x00, 0x00, 0xC6]
+
+# Most common generations first, the probing stops at the first hit.
+MAGIC_PROBES = [GEN1A, GEN2, GEN4, GEN3]
+
+
+def strip_ats_crc(ats):
+    # The driver returns the ATS as received, TL counts the bytes without the CRC.
+    if not ats:
+        return None
+    return list(ats[:ats[0]])
+
+
+def lookup(sak, atqa, ats=None):
+    """Card type from the anticollision answers alone, no exchange with the card.
+
+    atqa is the 2 byte list anticol() returns, ats as returned by RATS or None.
+    """
+    ats = strip_ats_crc(ats)
+    if ats is not None and tuple(ats) in MAGIC_ATS:
+        return MAGIC_ATS[tuple(ats)]
+    word = (atqa[1] << 8 | atqa[0]) & 0xFF3F
+    card_type = FINGERPRINTS.get((sak, word)) or SAK_TYPES.get(sak)
+    if card_type is None:
+        if sak & 0x20:
+            return CardType('ISO 14443-4 card (SAK %02x)' % sak, ISO_DEP)
+        return CardType('Unknown (SAK %02x, ATQA %04x)' % (sak, atqa[1] << 8 | atqa[0]), UNKNOWN)
+    if card_type.blocks == 0x3f and ats is not None and ats[5:9] == PLUS_2K_HISTORICAL and not atqa[0] & 0x02:
+        return CardType('MIFARE Plus 2K (SL1)', CLASSIC, 0x7f)
+    return card_type
+
+
+def probe_gen1a(mf_reader: MFRC522):
+    # Returns GEN1A, GEN1B or None. The card is halted afterwards.
+    mf_reader.MFRC522_HaltA()
+    (status, data, bits) = mf_reader.MFRC522_Transceive([mf_reader.PICC_MIFARE_CLONE_UNLOCK1], 7,
+                                                         mf_reader.TIMEOUT_SHORT)
+    if status != mf_reader.MI_OK or bits != 4 or data[0] & 0x0F != 0x0A:
+        return None
+    (status, data, bits) = mf_reader.MFRC522_Transceive([mf_reader.PICC_MIFARE_CLONE_UNLOCK2],
+                                                         timeout=mf_reader.TIMEOUT_SHORT)
+    magic = GEN1A if status == mf_reader.MI_OK and bits == 4 and data[0] & 0x0F == 0x0A else GEN1B
+    mf_reader.MFRC522_HaltA()
+    return magic
+
+
+# The other probes send one frame. A card that does not understand it drops
+# back to idle by itself, one that answers is halted.
+
+def probe_frame(mf_reader: MFRC522, frame, check):
+    (status, data) = mf_reader.MFRC522_TransceiveCRC(frame, mf_reader.TIMEOUT_MEDIUM)
+    if status != mf_reader.MI_OK or not check(data):
+        return False
+    mf_reader.MFRC522_HaltA()
+    return True
+
+
+def probe_gen2(mf_reader: MFRC522):
+    # A gen2 card answers RATS with its ATS although its SAK says it can not.
+    found = probe_frame(mf_reader, [mf_reader.PICC_ATS, 0x50],
+                        lambda ats: tuple(ats) in MAGIC_ATS and MAGIC_ATS[tuple(ats)].family == CLASSIC)
+    return GEN2 if found else None
+
+
+def probe_gen3(mf_reader: MFRC522):
+    # Only gen3 answers a READ of block 0 without authentication.
+    found = probe_frame(mf_reader, [mf_reader.PICC_READ, 0], lambda data: len(data) == 16)
+    return GEN3 if found else None
+
+
+def probe_gen4(mf_reader: MFRC522):
+    # GTU get config with the default password 00000000, 30 or 32 bytes of configuration.
+    found = probe_frame(mf_reader, GEN4_GET_CONFIG, lambda data: len(data) in [30, 32])
+    return GEN4 if found else None
+
+
+PROBES = {GEN1A: probe_gen1a, GEN2: probe_gen2, GEN3: probe_gen3, GEN4: probe_gen4}
+
+
+def probe_magic(mf_reader: MFRC522, uid, generations=MAGIC_PROBES):
+    """Probe a selected MIFARE Classic for the given magic generations, in order.
+
+    Stops at the first hit. A probe leaves the card idle or halted, it is
+    selected again by its UID (WUPA + SELECT, no anticollision) before the
+    next probe and before returning.
+    """
+    parts = cascade_parts(uid)
+    magic = None
+    for generation in generations:
+        magic = PROBES[generation](mf_reader)
+        if not fast_select(mf_reader, parts):
+            return None
+        if magic is not None:
+            break
+    return magic
+
+
+def identify(mf_reader: MFRC522, card_info, generations=MAGIC_PROBES):
+    """Card type of the card anticol() just selected.
+
+    MIFARE Classic compatible cards are probed for the magic generations
+    given (none when empty), Ultralight/NTAG cards are told apart with
+    GET_VERSION. The card is selected again afterwards.
+    """
+    (uid, sak, atqa, ats) = card_info
+    card_type = lookup(sak, atqa, ats)
+    if card_type.family == CLASSIC and card_type.magic is None and generations:
+        magic = probe_magic(mf_reader, uid, generations)
+        if magic is not None:
+            card_type = CardType('%s %s' % (card_type.name, magic), CLASSIC, card_type.blocks, magic)
+    elif card_type.family == ULTRALIGHT and card_type.magic is None:
+        (ul_type, _) = detect_type(mf_reader)
+        if ul_type is not None:
+            card_type = CardType(ul_type.name, ULTRALIGHT)
+    return card_type
+
+
+def usage(program_name):
+    print('Usage: %s [-n]' % program_name)
+    print('  Identifies the card in the field: type, size and magic generation.')
+    print('  -n          - no magic probes, only what the anticollision tells')
+
+
+def main():
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] != '-n'):
+        usage(sys.argv[0])
+        exit(-1)
+    generations = [] if len(sys.argv) == 2 else MAGIC_PROBES
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+    (success, card_info) = anticol(mf_reader)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    card_type = identify(mf_reader, card_info, generations)
+    print('Type: %s' % card_type.name)
+    if card_type.blocks is not None:
+        print('Size: %d bytes' % ((card_type.blocks + 1) * 16))
+    if card_type.magic is not None:
+        print('Magic: %s' % card_type.magic)
+    elif card_type.family == CLASSIC:
+        print('Magic: %s' % ('none found' if generations else 'not probed'))
+    mf_reader.MFRC522_HaltA()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 
+import MFRC522
+import ReaderDaemon
 from serial.tools import list_ports
 
 continue_reading = True
@@ -22,4 +24,20 @@ def auto_find_port():
     if len(valid_ports) > 0:
         return valid_ports[0].device
     print('No valid COM port found!')
-    exit(-10)
\ No newline at end of file
+    exit(-10)
+
+def connect_reader():
+    # The resident ReaderDaemon when it runs, the reader on the first USB serial port otherwise.
+    mf_reader = ReaderDaemon.connect()
+    if mf_reader is not None:
+        return mf_reader, 'daemon %s' % mf_reader.path
+    port = auto_find_port()
+    return open_reader(port), port
+
+def open_reader(port):
+    # Open and initialise the reader, then apply the RF profile RfTune saved for it.
+    # RfTune needs Anticol, which imports this module, so it is imported here.
+    from RfTune import apply_saved_profile
+    mf_reader = MFRC522.MFRC522(dev=port)
+    apply_saved_profile(mf_reader, port)
+    return mf_reader
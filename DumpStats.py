@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass
+import numpy as np
+from MFDump import Dump, BLOCK_SIZE, dump_format, first_block_of_sector, blocks_in_sector, sector_of_block
+from MFIndex import DUMP_EXTENSIONS, DUMP_SIZES
+
+# Dumps loaded into one array at a time, 4 MB for 1K images and 16 MB for 4K.
+CHUNK_DUMPS = 4096
+
+DEFAULT_LAYOUTS = 10
+
+
+@dataclass
+class FleetStats:
+    size: int
+    dumps: int = 0
+    cards: int = 0
+    pairs: int = 0              # consecutive dumps of the same card
+    byte_changes: np.ndarray = None     # per byte, pairs in which it changed
+    block_changes: np.ndarray = None    # per block, pairs in which any of its bytes changed
+    value_dumps: np.ndarray = None      # per block, dumps holding a valid value block there
+    value_changes: np.ndarray = None    # per block, pairs in which the value changed
+    value_min: np.ndarray = None
+    value_max: np.ndarray = None
+    layouts: Counter = None     # access bits of all trailers -> dumps
+
+    def __post_init__(self):
+        blocks = self.size // BLOCK_SIZE
+        self.byte_changes = np.zeros(self.size, dtype=np.int64)
+        self.block_changes = np.zeros(blocks, dtype=np.int64)
+        self.value_dumps = np.zeros(blocks, dtype=np.int64)
+        self.value_changes = np.zeros(blocks, dtype=np.int64)
+        self.value_min = np.full(blocks, np.iinfo(np.int32).max, dtype=np.int64)
+        self.value_max = np.full(blocks, np.iinfo(np.int32).min, dtype=np.int64)
+        self.layouts = Counter()
+
+
+def find_dumps(paths):
+    # Dump files given directly or found under the given directories.
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for (dir_path, _, file_names) in os.walk(path):
+            for file_name in sorted(file_names):
+                if os.path.splitext(file_name)[1].lower() in DUMP_EXTENSIONS:
+                    yield os.path.join(dir_path, file_name)
+
+
+def read_uid(path):
+    # Returns (size, uid), raw images are not mapped for these 4 bytes.
+    if dump_format(path) == 'raw':
+        with open(path, 'rb') as fp:
+            return os.fstat(fp.fileno()).st_size, fp.read(4)
+    with Dump.open(path) as dump:
+        return dump.size, bytes(dump.uid())
+
+
+def scan(paths):
+    """First pass, only UID and size of every dump are read.
+
+    Returns the entries (uid, mtime, path) of the most common dump size,
+    ordered by card and time, that size and the number of skipped files.
+    """
+    entries = {}
+    skipped = 0
+    for path in find_dumps(paths):
+        try:
+            (size, uid) = read_uid(path)
+            if size not in DUMP_SIZES:
+                skipped += 1
+                continue
+            entries.setdefault(size, []).append((uid, os.stat(path).st_mtime, path))
+        except (IOError, ValueError) as err:
+            print('Skip %s, err = %s' % (path, err))
+            skipped += 1
+    if not entries:
+        return [], None, skipped
+    size = max(entries, key=lambda s: len(entries[s]))
+    skipped += sum([len(e) for (s, e) in entries.items() if s != size])
+    return sorted(entries[size]), size, skipped
+
+
+def load_into(row, path):
+    if dump_format(path) == 'raw':
+        row[:] = np.fromfile(path, dtype=np.uint8, count=len(row))
+        return
+    with Dump.open(path) as dump:
+        row[:] = np.frombuffer(dump.data, dtype=np.uint8)
+
+
+def trailer_blocks(size):
+    sectors = DUMP_SIZES[size]
+    return np.array([first_block_of_sector(s) + blocks_in_sector(s) - 1 for s in range(sectors)])
+
+
+def value_blocks(blocks):
+    """Vectorised MFValue.is_value_block over the last axis of 16 bytes.
+
+    Returns the validity mask and the decoded values (int32 little endian).
+    """
+    valid = (np.all(blocks[..., 0:4] == blocks[..., 8:12], axis=-1) &
+             np.all(blocks[..., 0:4] == ~blocks[..., 4:8], axis=-1) &
+             (blocks[..., 12] == blocks[..., 14]) & (blocks[..., 13] == blocks[..., 15]) &
+             (blocks[..., 12] == ~blocks[..., 13]))
+    values = np.ascontiguousarray(blocks[..., 0:4]).view('<i4')[..., 0]
+    return valid, values
+
+
+def update(stats, rows, card_ids, carry):
+    """Add a chunk of dumps to the statistics.
+
+    rows is (n, size), card_ids tells which rows belong to the same card.
+    With carry the first row is the last dump of the previous chunk, it only
+    counts for the pair it forms with the next row.
+    """
+    blocks = rows.reshape(len(rows), -1, BLOCK_SIZE)
+    (valid, values) = value_blocks(blocks)
+    valid[:, trailer_blocks(stats.size)] = False
+
+    same = card_ids[1:] == card_ids[:-1]
+    changed = (rows[1:] != rows[:-1]) & same[:, None]
+    stats.pairs += int(np.count_nonzero(same))
+    stats.byte_changes += np.count_nonzero(changed, axis=0)
+    # The block count is explicit, a chunk of one dump has no pairs to infer it from.
+    block_changed = changed.reshape(len(changed), stats.size // BLOCK_SIZE, BLOCK_SIZE).any(axis=2)
+    stats.block_changes += np.count_nonzero(block_changed, axis=0)
+    stats.value_changes += np.count_nonzero(block_changed & valid[1:] & valid[:-1], axis=0)
+
+    first = 1 if carry else 0
+    (new, valid, values, new_ids) = (rows[first:], valid[first:], values[first:], card_ids[first:])
+    stats.dumps += len(new)
+    stats.cards += int(np.count_nonzero(new_ids[1:] != new_ids[:-1])) + (0 if carry and same[0] else 1)
+    stats.value_dumps += np.count_nonzero(valid, axis=0)
+    stats.value_min = np.minimum(stats.value_min, np.where(valid, values, np.iinfo(np.int32).max).min(axis=0))
+    stats.value_max = np.maximum(stats.value_max, np.where(valid, values, np.iinfo(np.int32).min).max(axis=0))
+
+    acls = blocks[first:, trailer_blocks(stats.size), 6:10].reshape(len(new), -1)
+    (layouts, counts) = np.unique(acls, axis=0, return_counts=True)
+    for (layout, count) in zip(layouts, counts):
+        stats.layouts[layout.tobytes()] += int(count)
+
+
+def analyse(entries, size, chunk_dumps=CHUNK_DUMPS):
+    """Second pass over the ordered entries, chunk_dumps dumps in memory at a time."""
+    stats = FleetStats(size)
+    uids = {}
+    card_ids = np.array([uids.setdefault(uid, len(uids)) for (uid, _, _) in entries])
+    buf = np.empty((chunk_dumps + 1, size), dtype=np.uint8)
+    start = 0
+    # Rows of buf the previous chunk filled.
+    n = 0
+    while start < len(entries):
+        # The last dump of the previous chunk is kept in row 0 for the pair across the chunks.
+        carry = start > 0
+        if carry:
+            buf[0] = buf[n - 1]
+        first = 1 if carry else 0
+        n = first + min(chunk_dumps, len(entries) - start)
+        for (i, (_, _, path)) in enumerate(entries[start:start + n - first]):
+            load_into(buf[first + i], path)
+        update(stats, buf[:n], card_ids[start - first:start + n - first], carry)
+        start += n - first
+    return stats
+
+
+def diff_dumps(a, b):
+    """Compact diff of two images of the same size.
+
+    Returns (block, offset in the block, old bytes, new bytes) for every run
+    of changed bytes, runs do not cross block boundaries.
+    """
+    a = np.frombuffer(a, dtype=np.uint8)
+    b = np.frombuffer(b, dtype=np.uint8)
+    changed = np.flatnonzero(a != b)
+    if not len(changed):
+        return []
+    breaks = np.flatnonzero((np.diff(changed) > 1) | (np.diff(changed // BLOCK_SIZE) > 0)) + 1
+    runs = []
+    for run in np.split(changed, breaks):
+        (start, end) = (int(run[0]), int(run[-1]) + 1)
+        runs.append((start // BLOCK_SIZE, start % BLOCK_SIZE, a[start:end].tobytes(), b[start:end].tobytes()))
+    return runs
+
+
+def heat(changes, pairs):
+    # One character per byte, '.' never changed, otherwise the changed share in tenths.
+    return ''.join(['.' if not c else str(min(9, c * 10 // pairs)) for c in changes])
+
+
+def format_layout(layout):
+    # Access bits per sector, runs of sectors sharing them are folded.
+    acls = [layout[i:i + 4].hex() for i in range(0, len(layout), 4)]
+    parts = []
+    first = 0
+    for sector in range(1, len(acls) + 1):
+        if sector == len(acls) or acls[sector] != acls[first]:
+            sectors = str(first) if sector - 1 == first else '%d-%d' % (first, sector - 1)
+            parts.append('%s:%s' % (sectors, acls[first]))
+            first = sector
+    return ' '.join(parts)
+
+
+def print_report(stats, top_layouts=DEFAULT_LAYOUTS):
+    print('%d dumps of %d bytes, %d cards, %d consecutive dumps of the same card' %
+          (stats.dumps, stats.size, stats.cards, stats.pairs))
+    if stats.pairs:
+        print('Changed blocks, per byte changed share in tenths:')
+        for block in np.flatnonzero(stats.block_changes):
+            print('  %3d  sector %2d  %s  %5.1f%%' %
+                  (block, sector_of_block(block), heat(stats.byte_changes[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE],
+                                                       stats.pairs), stats.block_changes[block] * 100 / stats.pairs))
+    values = np.flatnonzero(stats.value_dumps)
+    if len(values):
+        print('Value blocks:')
+        for block in values:
+            print('  %3d  sector %2d  valid in %d dumps, changed %d times, %d..%d' %
+                  (block, sector_of_block(block), stats.value_dumps[block], stats.value_changes[block],
+                   stats.value_min[block], stats.value_max[block]))
+    print('Access bit layouts:')
+    for (layout, count) in stats.layouts.most_common(top_layouts):
+        print('  %6d  %s' % (count, format_layout(layout)))
+    if len(stats.layouts) > top_layouts:
+        print('  %d more layouts' % (len(stats.layouts) - top_layouts))
+
+
+def print_diff(runs, a, b):
+    # Value blocks valid on both sides get their decoded values appended.
+    (valid, values) = value_blocks(np.frombuffer(a + b, dtype=np.uint8).reshape(2, -1, BLOCK_SIZE))
+    for (block, offset, old, new) in runs:
+        line = '  %3d [%2d:%2d]  %s -> %s' % (block, offset, offset + len(old), old.hex(), new.hex())
+        if valid[:, block].all():
+            line += '  value %d -> %d' % (values[0, block], values[1, block])
+        print(line)
+
+
+def usage(program_name):
+    print('Usage: %s [-n <layouts>] <dir or dump> ...' % program_name)
+    print('       %s -d <dump a> <dump b>' % program_name)
+    print('  Fleet statistics over many dumps of the same size, no reader needed: how often')
+    print('  every block and byte changes between consecutive dumps of the same card, value')
+    print('  blocks and their range, and the cards grouped by the access bits of their trailers.')
+    print('  -n <layouts>  - number of access bit layouts listed, default %d' % DEFAULT_LAYOUTS)
+    print('  -d            - only print the changed bytes between two dumps')
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 3 and args[0] == '-d':
+        try:
+            with Dump.open(args[1]) as a, Dump.open(args[2]) as b:
+                (a, b) = (bytes(a.data), bytes(b.data))
+        except (IOError, ValueError) as err:
+            print('Could not read dump, err = %s' % err)
+            exit(-1)
+        if len(a) != len(b):
+            print('Error: dump sizes differ, %d and %d bytes' % (len(a), len(b)))
+            exit(-1)
+        runs = diff_dumps(a, b)
+        print('%d bytes changed in %d blocks' % (sum([len(old) for (_, _, old, _) in runs]),
+                                               len(set([block for (block, _, _, _) in runs]))))
+        print_diff(runs, a, b)
+        exit(0)
+
+    top_layouts = DEFAULT_LAYOUTS
+    try:
+        if len(args) >= 2 and args[0] == '-n':
+            top_layouts = int(args[1])
+            args = args[2:]
+        if not args or [arg for arg in args if arg.startswith('-')]:
+            raise ValueError(' '.join(args))
+    except ValueError:
+        usage(sys.argv[0])
+        exit(-1)
+
+    (entries, size, skipped) = scan(args)
+    if skipped:
+        print('Skipped %d files of another size or not a dump' % skipped)
+    if not entries:
+        print('Error: no dumps found')
+        exit(-1)
+    print_report(analyse(entries, size), top_layouts)
+
+
+if __name__ == '__main__':
+    main()
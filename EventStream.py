@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+# Drop events once this many bytes are waiting for a slow consumer.
+MAX_PENDING = 64 * 1024
+# Seconds close() waits for a socket consumer to take the rest of the stream.
+DRAIN_TIMEOUT = 1.0
+
+
+def hex_str(data):
+    if data is None:
+        return None
+    return ''.join(['%02x' % x for x in data])
+
+
+def encode_event(record):
+    return json.dumps(record, separators=(',', ':')).encode() + b'\n'
+
+
+class EventSink:
+    # block switches send to blocking writes, for the drain at the end.
+    def __init__(self, send, close, block):
+        self.send = send
+        self.close = close
+        self.block = block
+        self.pending = bytearray()
+        self.dropped = 0
+
+    def push(self, line):
+        if len(self.pending) + len(line) > MAX_PENDING:
+            self.dropped += 1
+        else:
+            self.pending += line
+            self.dropped = 0
+        return self.flush()
+
+    def flush(self):
+        # Returns False once the consumer has gone away.
+        while self.pending:
+            try:
+                n = self.send(self.pending)
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            if n <= 0:
+                return True
+            del self.pending[:n]
+        return True
+
+    def drain(self):
+        # Events still pending are written out in blocking mode.
+        self.block()
+        self.flush()
+
+
+def stdout_sink():
+    """Sink for stdout that never blocks the caller nor changes stdout.
+
+    O_NONBLOCK on stdout would be shared by everything writing to the same
+    open file description, stderr too when both are a tty or the same pipe.
+    The events go into a non blocking pipe instead, a thread copies them to
+    stdout with blocking writes. Once stdout is gone the thread stops and the
+    pipe breaks, which ends the sink like a closed socket does.
+    """
+    sys.stdout.flush()
+    out_fd = sys.stdout.fileno()
+    (read_fd, write_fd) = os.pipe()
+    os.set_blocking(write_fd, False)
+
+    def copy():
+        try:
+            while True:
+                data = os.read(read_fd, MAX_PENDING)
+                if not data:
+                    break
+                while data:
+                    data = data[os.write(out_fd, data):]
+        except OSError:
+            pass
+        os.close(read_fd)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+
+    def close():
+        os.close(write_fd)
+        thread.join()
+
+    return EventSink(lambda buf: os.write(write_fd, buf), close, lambda: os.set_blocking(write_fd, True))
+
+
+class EventStream:
+    """One compact JSON object per line, written without ever blocking the caller.
+
+    With no path the events go to stdout, otherwise a Unix domain socket is
+    created at path and every connected consumer gets a copy of the stream.
+    A consumer that can not keep up loses events instead of stalling the
+    polling loop, the loss is reported in the 'dropped' field.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.server = None
+        self.sinks = []
+        if path is None:
+            self.sinks.append(stdout_sink())
+        else:
+            if os.path.exists(path):
+                os.unlink(path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(path)
+            self.server.listen(8)
+            self.server.setblocking(False)
+
+    def accept(self):
+        while self.server is not None:
+            try:
+                (conn, _) = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            self.sinks.append(EventSink(conn.send, conn.close, lambda conn=conn: conn.settimeout(DRAIN_TIMEOUT)))
+
+    def emit(self, event, **fields):
+        self.accept()
+        record = {'ev': event, 't': time.monotonic()}
+        record.update(fields)
+        line = encode_event(record)
+        for sink in list(self.sinks):
+            if sink.dropped:
+                alive = sink.push(encode_event(dict(record, dropped=sink.dropped)))
+            else:
+                alive = sink.push(line)
+            if not alive:
+                sink.close()
+                self.sinks.remove(sink)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.drain()
+            sink.close()
+        self.sinks = []
+        if self.server is not None:
+            self.server.close()
+            os.unlink(self.path)
+            self.server = None
@@ -0,0 +1,630 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import random
+import struct
+
+# Hardware free stand-in for an MFRC522 on its UART with a tag in the field,
+# used by Bench.py. Pass a FakeSerial as ser to MFRC522.MFRC522():
+#   mf_reader = MFRC522.MFRC522(ser=FakeSerial(FakeClassicCard()))
+
+
+def crc_a(data):
+    crc = 0x6363
+    for bt in data:
+        bt = (bt ^ (crc & 0xff))
+        bt = (bt ^ (bt << 4)) & 0xff
+        crc = (crc >> 8) ^ (bt << 8) ^ (bt << 3) ^ (bt >> 4)
+    return [crc & 0xff, (crc >> 8) & 0xff]
+
+
+GEN2_ATS = [0x09, 0x78, 0x00, 0x91, 0x02, 0xDA, 0xBC, 0x19, 0x10]
+GEN4_CONFIG = [0x00] * 30
+
+
+def blank_classic(uid, blocks):
+    image = bytearray((blocks + 1) * 16)
+    image[0:4] = bytes(uid)
+    image[4] = uid[0] ^ uid[1] ^ uid[2] ^ uid[3]
+    image[5:8] = bytes([0x08, 0x04, 0x00])
+    for block in range(blocks + 1):
+        if (block < 128 and block % 4 == 3) or (block >= 128 and block % 16 == 15):
+            image[block * 16:(block + 1) * 16] = bytes([0xff] * 6 + [0xff, 0x07, 0x80, 0x69] + [0xff] * 6)
+    return image
+
+
+def swap_endian(x):
+    return int.from_bytes(x.to_bytes(4, 'big'), 'little')
+
+
+def prng_successor(x, n):
+    x = swap_endian(x)
+    for _ in range(n):
+        x = x >> 1 | ((x >> 16 ^ x >> 18 ^ x >> 19 ^ x >> 21) & 1) << 31
+    return swap_endian(x)
+
+
+class FakeCard:
+    """ISO 14443-3 type A part of an emulated tag: REQA/WUPA, anticollision,
+    select for 4 and 7 byte UIDs, HALT and RATS. Subclasses answer the frames
+    received in the ACTIVE state through command().
+    """
+
+    IDLE = 0
+    READY = 1
+    ACTIVE = 2
+    HALT = 3
+
+    def __init__(self, uid, sak, atqa, ats=None):
+        self.uid = list(uid)
+        self.sak = sak
+        self.atqa = list(atqa)
+        self.ats = ats
+        self.state = self.IDLE
+        self.halted = False
+        self.level = 0
+
+    def cascade(self, level):
+        # UID part and SAK answered at a cascade level.
+        if len(self.uid) == 4:
+            return self.uid, self.sak
+        if level == 0:
+            return [0x88] + self.uid[0:3], 0x04
+        return self.uid[3:7], self.sak
+
+    def reset(self):
+        pass
+
+    def receive(self, frame, bits):
+        # Returns (data, bits) of the answer, or None when the card keeps silent.
+        if bits == 7 and len(frame) == 1:
+            if frame[0] == 0x26 and self.state == self.IDLE or frame[0] == 0x52 and self.state in [self.IDLE, self.HALT]:
+                self.state = self.READY
+                self.level = 0
+                self.reset()
+                return self.atqa, 16
+            answer = self.short_frame(frame[0])
+            if answer is None:
+                self.state = self.HALT if self.state == self.HALT else self.IDLE
+            return answer
+
+        if self.state == self.READY and len(frame) >= 2 and frame[0] in [0x93, 0x95] and frame[0] == 0x93 + 2 * self.level:
+            (part, sak) = self.cascade(self.level)
+            bcc = part[0] ^ part[1] ^ part[2] ^ part[3]
+            if frame[1] == 0x20:
+                return part + [bcc], 40
+            if frame[1] == 0x70 and len(frame) == 9 and crc_a(frame[:7]) == list(frame[7:]) and list(frame[2:6]) == part:
+                if sak & 0x04:
+                    self.level += 1
+                else:
+                    self.state = self.ACTIVE
+                return [sak] + crc_a([sak]), 24
+            return None
+
+        if self.state != self.ACTIVE:
+            if self.state == self.READY:
+                self.state = self.IDLE
+            return None
+        answer = self.pending(frame)
+        if answer is not False:
+            return answer
+        if len(frame) < 3 or crc_a(frame[:-2]) != list(frame[-2:]):
+            self.reset()
+            self.state = self.IDLE
+            return None
+        if frame[0] == 0x50 and frame[1] == 0x00:
+            self.reset()
+            self.state = self.HALT
+            return None
+        if frame[0] == 0xE0 and self.ats is not None:
+            self.rats(frame[1])
+            return list(self.ats) + crc_a(self.ats), (len(self.ats) + 2) * 8
+        answer = self.command(frame[:-2])
+        if answer is None:
+            # NAK, the tag drops back to idle.
+            self.reset()
+            self.state = self.IDLE
+            return [0x04], 4
+        return answer
+
+    def short_frame(self, cmd):
+        return None
+
+    def rats(self, param):
+        pass
+
+    def pending(self, frame):
+        # Second frame of a two phase command, False when none is expected.
+        return False
+
+    def command(self, frame):
+        return None
+
+
+class FakeClassicCard(FakeCard):
+    """MIFARE Classic tag, magic selects the clone generation it emulates.
+
+    gen1a: HALT + 40/43 backdoor. gen2: answers RATS with the gen2 ATS. gen3:
+    block 0 reads without authentication. gen4: answers the GTU get config
+    command with the default password.
+
+    Crypto1 is not emulated, an authentication only checks the key against the
+    sector trailer and opens the sector for plain READ/WRITE frames.
+    """
+
+    def __init__(self, uid=(0x01, 0x23, 0x45, 0x67), blocks=0x3f, sak=0x08, atqa=(0x04, 0x00), ats=None, magic='gen1a',
+                 image=None, prng='hardened'):
+        FakeCard.__init__(self, uid, sak, atqa, ats)
+        self.blocks = blocks
+        self.magic = magic
+        if magic == 'gen2' and ats is None:
+            self.ats = GEN2_ATS
+        self.image = bytearray(image) if image is not None else blank_classic(self.uid, blocks)
+        self.auth_sector = None
+        self.backdoor = False
+        self.pending_write = None
+        self.pending_value = None
+        self.value = None
+        self.nt = 0x01200145
+        self.prng = prng
+        self.frames = 0
+
+    def reset(self):
+        self.auth_sector = None
+        self.backdoor = False
+        self.pending_write = None
+        self.pending_value = None
+
+    def next_nonce(self):
+        self.frames += 1
+        if self.prng == 'static':
+            return 0x01200145
+        if self.prng == 'weak':
+            return prng_successor(0x01200145, self.frames * 37 % 65535)
+        return (self.nt * 1103515245 + 12345) & 0xFFFFFFFF
+
+    def trailer_of(self, block):
+        if block < 128:
+            return block | 3
+        return block | 15
+
+    def sector_of(self, block):
+        if block < 128:
+            return block // 4
+        return 32 + (block - 128) // 16
+
+    def authenticate(self, cmd, block, key, uid):
+        if self.state != self.ACTIVE or block > self.blocks or uid != self.uid[-4:]:
+            return False
+        trailer = self.trailer_of(block) * 16
+        expected = self.image[trailer:trailer + 6] if cmd == 0x60 else self.image[trailer + 10:trailer + 16]
+        if bytes(key) != bytes(expected):
+            self.reset()
+            self.state = self.IDLE
+            return False
+        self.auth_sector = self.sector_of(block)
+        return True
+
+    def may_access(self, block):
+        return block <= self.blocks and (self.backdoor or self.auth_sector == self.sector_of(block))
+
+    def short_frame(self, cmd):
+        if cmd == 0x40 and self.magic == 'gen1a' and self.state == self.HALT:
+            self.backdoor = True
+            self.state = self.ACTIVE
+            return [0x0A], 4
+        return None
+
+    def pending(self, frame):
+        if self.backdoor and len(frame) == 1 and frame[0] in [0x41, 0x43]:
+            if frame[0] == 0x41:
+                self.image = blank_classic(self.uid, self.blocks)
+            return [0x0A], 4
+
+        if self.pending_write is not None:
+            block = self.pending_write
+            self.pending_write = None
+            if len(frame) == 18 and crc_a(frame[:16]) == list(frame[16:]):
+                self.image[block * 16:(block + 1) * 16] = bytes(frame[:16])
+                return [0x0A], 4
+            return [0x05], 4
+
+        if self.pending_value is not None:
+            (cmd, block) = self.pending_value
+            self.pending_value = None
+            if len(frame) != 6 or crc_a(frame[:4]) != list(frame[4:]):
+                return [0x05], 4
+            current = struct.unpack('<i', bytes(self.image[block * 16:block * 16 + 4]))[0]
+            operand = struct.unpack('<i', bytes(frame[:4]))[0]
+            self.value = (current + operand if cmd == 0xC1 else current - operand if cmd == 0xC0 else current,
+                          bytes(self.image[block * 16 + 12:block * 16 + 16]))
+            # Value operations do not acknowledge the operand.
+            return None
+        return False
+
+    def command(self, frame):
+        cmd = frame[0]
+        if cmd in [0x60, 0x61] and len(frame) == 2:
+            # Plain auth request, answer the tag nonce and wait for a reader answer that never comes.
+            self.nt = self.next_nonce()
+            self.state = self.IDLE
+            return list(struct.pack('>I', self.nt)), 32
+        if cmd == 0xCF and self.magic == 'gen4' and list(frame[1:5]) == [0, 0, 0, 0] and frame[5:] == [0xC6]:
+            return GEN4_CONFIG + crc_a(GEN4_CONFIG), 32 * 8
+        if cmd == 0x30 and list(frame) == [0x30, 0x00] and self.magic == 'gen3':
+            data = list(self.image[0:16])
+            return data + crc_a(data), 18 * 8
+        if len(frame) != 2 or not self.may_access(frame[1]):
+            return None
+        block = frame[1]
+        if cmd == 0x30:
+            data = list(self.image[block * 16:(block + 1) * 16])
+            return data + crc_a(data), 18 * 8
+        if cmd == 0xA0:
+            self.pending_write = block
+            return [0x0A], 4
+        if cmd in [0xC0, 0xC1, 0xC2]:
+            self.pending_value = (cmd, block)
+            return [0x0A], 4
+        if cmd == 0xB0 and self.value is not None:
+            value = struct.pack('<i', self.value[0])
+            inverted = bytes([~x & 0xff for x in value])
+            self.image[block * 16:block * 16 + 16] = value + inverted + value + self.value[1]
+            self.value = None
+            return [0x0A], 4
+        return None
+
+
+class FakeUltralightCard(FakeCard):
+    """NTAG21x/Ultralight EV1 tag, pages are 4 bytes."""
+
+    def __init__(self, uid=(0x04, 0x11, 0x22, 0x33, 0x44, 0x55, 0x66), pages=231, version=None):
+        FakeCard.__init__(self, uid, 0x00, (0x44, 0x00))
+        self.pages = bytearray(pages * 4)
+        self.pages[0:3] = bytes(self.uid[0:3]) + bytes([0x88 ^ self.uid[0] ^ self.uid[1] ^ self.uid[2]])
+        self.pages[4:8] = bytes(self.uid[3:7])
+        self.pages[8] = self.uid[3] ^ self.uid[4] ^ self.uid[5] ^ self.uid[6]
+        self.version = version if version is not None else [0x00, 0x04, 0x04, 0x02, 0x01, 0x00, 0x13, 0x03]
+
+    def command(self, frame):
+        cmd = frame[0]
+        count = len(self.pages) // 4
+        if cmd == 0x60 and len(frame) == 1 and self.version:
+            return self.version + crc_a(self.version), 10 * 8
+        if cmd == 0x30 and len(frame) == 2 and frame[1] < count:
+            data = [self.pages[((frame[1] + i) % count) * 4 + j] for i in range(4) for j in range(4)]
+            return data + crc_a(data), 18 * 8
+        if cmd == 0x3A and len(frame) == 3 and frame[1] <= frame[2] < count and self.version:
+            data = list(self.pages[frame[1] * 4:(frame[2] + 1) * 4])
+            return data + crc_a(data), (len(data) + 2) * 8
+        if cmd == 0xA2 and len(frame) == 6 and 2 <= frame[1] < count:
+            self.pages[frame[1] * 4:(frame[1] + 1) * 4] = bytes(frame[2:6])
+            return [0x0A], 4
+        return None
+
+
+class FakeIsoDepCard(FakeCard):
+    """ISO 14443-4 card, the APDU handler maps a command APDU to its response.
+
+    Answers are chained to the reader's FSD, commands chained by the reader
+    are collected. wtx asks for that many waiting time extensions before each
+    answer, drop_answers swallows the next answers to test the recovery.
+    """
+
+    FRAME_SIZES = [16, 24, 32, 40, 48, 64, 96, 128, 256]
+
+    def __init__(self, uid=(0x04, 0x51, 0x52, 0x53, 0x54, 0x55, 0x56), fsci=8,
+                 ats=None, handler=None):
+        if ats is None:
+            ats = [0x06, 0x70 | fsci, 0x00, 0x81, 0x02, 0x80]
+        FakeCard.__init__(self, uid, 0x20, (0x44, 0x03), ats)
+        self.handler = handler or (lambda apdu: list(apdu) + [0x90, 0x00])
+        self.fsd = 32
+        self.wtx = 0
+        self.drop_answers = 0
+        # (reader to card, card to reader) speed codes, PPS changes them.
+        self.rates = (0, 0)
+        # Blocks above this speed code get lost, to test the fallback.
+        self.max_reliable = 3
+        self.reset()
+
+    def reset(self):
+        self.block_number = 1
+        self.chain_in = []
+        self.chain_out = []
+        self.last = None
+        self.wtx_left = 0
+        self.held = None
+
+    def rats(self, param):
+        self.fsd = self.FRAME_SIZES[min(param >> 4, 8)]
+        self.rates = (0, 0)
+        self.reset()
+
+    def block(self, data):
+        self.last = data + crc_a(data), (len(data) + 2) * 8
+        return self.last
+
+    def next_chunk(self):
+        size = self.fsd - 3
+        chunk = self.chain_out[:size]
+        self.chain_out = self.chain_out[size:]
+        return self.block([0x02 | self.block_number | (0x10 if self.chain_out else 0)] + chunk)
+
+    def receive(self, frame, bits):
+        answer = FakeCard.receive(self, frame, bits)
+        if answer is not None and answer[1] == 4 or self.drop_answers and answer is not None and bits == 8:
+            if answer is not None and answer[1] != 4:
+                self.drop_answers -= 1
+            return None
+        return answer
+
+    def command(self, frame):
+        pcb = frame[0]
+        if pcb & 0xF0 == 0xD0 and len(frame) == 3 and frame[1] == 0x11 and self.last is None:
+            self.rates = (frame[2] & 0x03, frame[2] >> 2 & 0x03)
+            return [pcb] + crc_a([pcb]), 24
+        if pcb & 0xE2 == 0x02:
+            if (pcb & 1) == self.block_number:
+                # Repeated I-block, our answer got lost.
+                return self.last
+            self.block_number ^= 1
+            if pcb & 0x10:
+                self.chain_in += frame[1:]
+                return self.block([0xA2 | self.block_number])
+            self.chain_out = list(self.handler(self.chain_in + list(frame[1:])))
+            self.chain_in = []
+            if self.wtx:
+                self.wtx_left = self.wtx - 1
+                return self.block([0xF2, 0x01])
+            return self.next_chunk()
+        if pcb & 0xF7 == 0xF2:
+            if self.wtx_left:
+                self.wtx_left -= 1
+                return self.block([0xF2, 0x01])
+            return self.next_chunk()
+        if pcb & 0xF6 == 0xA2:
+            if (pcb & 1) != self.block_number and self.chain_out:
+                self.block_number ^= 1
+                return self.next_chunk()
+            return self.last
+        if pcb & 0xF6 == 0xB2:
+            if (pcb & 1) == self.block_number or self.last is None:
+                return self.last
+            return self.block([0xA2 | self.block_number])
+        if pcb & 0xF7 == 0xC2:
+            self.state = self.HALT
+            return self.block([0xC2])
+        return None
+
+
+class FakeSerial:
+    """Scripted stand-in for serial.Serial that emulates the MFRC522 UART protocol.
+
+    Register writes are echoed with their address, register reads answer the
+    register value. A transceive started through BitFramingReg.StartSend is
+    handed to the card, its answer lands in the FIFO as the real chip does it.
+    """
+
+    CommandReg = 0x01
+    CommIrqReg = 0x04
+    DivIrqReg = 0x05
+    ErrorReg = 0x06
+    Status2Reg = 0x08
+    FIFODataReg = 0x09
+    FIFOLevelReg = 0x0A
+    ControlReg = 0x0C
+    BitFramingReg = 0x0D
+    TxModeReg = 0x12
+    RxModeReg = 0x13
+    CRCResultRegM = 0x21
+    CRCResultRegL = 0x22
+    TxControlReg = 0x14
+    VersionReg = 0x37
+
+    def __init__(self, card=None):
+        self.card = card
+        self.baudrate = 9600
+        self.regs = bytearray(64)
+        self.regs[self.VersionReg] = 0x92
+        self.regs[self.TxControlReg] = 0x80
+        # Reset values of RFCfgReg, RxThresholdReg, CWGsPReg and ModGsPReg.
+        self.regs[0x26] = 0x48
+        self.regs[0x18] = 0x84
+        self.regs[0x28] = 0x20
+        self.regs[0x29] = 0x20
+        self.fifo = bytearray()
+        self.out = bytearray()
+        self.pending_addr = None
+        # With rf_period set, the RF side moves one byte every rf_period
+        # register accesses so frames longer than the FIFO have to be streamed.
+        self.rf_period = None
+        self.rf_ticks = 0
+        # error_model(regs) gives the chance that a frame is lost with the current settings.
+        self.error_model = None
+        self.random = random.Random(1)
+        self.tx = None
+        self.rx = None
+        # Counters used by the benchmarks.
+        self.writes = 0
+        self.reads = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def reset_input_buffer(self):
+        self.out.clear()
+
+    def close(self):
+        pass
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes_out += len(data)
+        for b in data:
+            self.tick()
+            if self.pending_addr is not None:
+                addr = self.pending_addr
+                self.pending_addr = None
+                self.write_register(addr, b)
+                self.out.append(addr)
+            elif b & 0x80:
+                self.out.append(self.read_register(b & 0x3F))
+            else:
+                self.pending_addr = b & 0x3F
+        return len(data)
+
+    def read(self, size=1):
+        self.reads += 1
+        data = bytes(self.out[:size])
+        del self.out[:size]
+        self.bytes_in += len(data)
+        return data
+
+    def tick(self):
+        if self.rf_period is None:
+            return
+        self.rf_ticks += 1
+        if self.rf_ticks < self.rf_period:
+            return
+        self.rf_ticks = 0
+        if self.tx is not None:
+            if not self.fifo:
+                frame = bytes(self.tx)
+                self.tx = None
+                self.fifo += frame
+                self.send(self.regs[self.BitFramingReg] & 0x07, expect_answer=True)
+                if self.regs[self.CommIrqReg] & 0x20:
+                    # Hold the answer back and feed it at the RF rate.
+                    self.rx = bytearray(self.fifo)
+                    self.fifo.clear()
+                    self.regs[self.CommIrqReg] &= ~0x30 & 0xFF
+                return
+            self.tx += self.fifo[:1]
+            del self.fifo[:1]
+        elif self.rx is not None:
+            chunk = self.rx[:1]
+            del self.rx[:1]
+            if len(self.fifo) + len(chunk) > 64:
+                self.regs[self.ErrorReg] |= 0x10
+            self.fifo += chunk[:64 - len(self.fifo)]
+            if not self.rx:
+                self.rx = None
+                self.regs[self.CommIrqReg] |= 0x30
+
+    def read_register(self, addr):
+        if addr == 0x07:
+            level = len(self.fifo)
+            water = self.regs[0x0B]
+            return (0x01 if level <= water else 0) | (0x02 if 64 - level <= water else 0)
+        if addr == self.FIFODataReg:
+            if not self.fifo:
+                return 0
+            val = self.fifo[0]
+            del self.fifo[0]
+            return val
+        if addr == self.FIFOLevelReg:
+            return len(self.fifo)
+        return self.regs[addr]
+
+    def write_register(self, addr, val):
+        if addr == self.FIFODataReg:
+            if len(self.fifo) < 64:
+                self.fifo.append(val)
+            else:
+                self.regs[self.ErrorReg] |= 0x10
+        elif addr == self.FIFOLevelReg:
+            if val & 0x80:
+                self.fifo.clear()
+                self.regs[self.ErrorReg] &= ~0x10 & 0xFF
+        elif addr in [self.CommIrqReg, self.DivIrqReg]:
+            if val & 0x80:
+                self.regs[addr] |= val & 0x7F
+            else:
+                self.regs[addr] &= ~val & 0x7F
+        elif addr == self.TxControlReg:
+            if self.regs[addr] & 0x03 and not val & 0x03 and self.card is not None:
+                # Field off, the card loses power.
+                self.card.state = FakeCard.IDLE
+                self.card.reset()
+                if hasattr(self.card, 'rates'):
+                    self.card.rates = (0, 0)
+            self.regs[addr] = val
+        elif addr == self.CommandReg:
+            self.regs[addr] = val
+            self.command(val & 0x0F)
+        elif addr == self.BitFramingReg:
+            self.regs[addr] = val & 0x7F
+            if val & 0x80 and self.regs[self.CommandReg] & 0x0F == 0x0C:
+                if self.rf_period is None:
+                    self.transceive(val & 0x07)
+                else:
+                    self.tx = bytearray()
+        else:
+            self.regs[addr] = val
+
+    def command(self, cmd):
+        if cmd == 0x03:
+            crc = crc_a(self.fifo)
+            self.regs[self.CRCResultRegL] = crc[0]
+            self.regs[self.CRCResultRegM] = crc[1]
+            self.regs[self.DivIrqReg] |= 0x04
+        elif cmd == 0x0E:
+            data = bytes(self.fifo)
+            self.fifo.clear()
+            ok = self.card is not None and len(data) == 12 and \
+                self.card.authenticate(data[0], data[1], list(data[2:8]), list(data[8:12]))
+            if ok:
+                self.regs[self.Status2Reg] |= 0x08
+            else:
+                self.regs[self.Status2Reg] &= ~0x08 & 0xFF
+            self.regs[self.CommIrqReg] |= 0x10 if ok else 0x01
+            self.regs[self.CommandReg] = 0x00
+        elif cmd == 0x04:
+            self.send(self.regs[self.BitFramingReg] & 0x07, expect_answer=False)
+        elif cmd == 0x0F:
+            self.fifo.clear()
+            self.regs[self.TxModeReg] = 0
+            self.regs[self.RxModeReg] = 0
+
+    def transceive(self, tx_bits):
+        self.send(tx_bits, expect_answer=True)
+
+    def send(self, tx_bits, expect_answer):
+        frame = list(self.fifo)
+        self.fifo.clear()
+        self.regs[self.ErrorReg] = 0
+        self.regs[self.ControlReg] = 0
+        if self.regs[self.TxModeReg] & 0x80:
+            frame += crc_a(frame)
+        answer = None
+        if self.card is not None:
+            if not (self.regs[self.Status2Reg] & 0x08) and getattr(self.card, 'auth_sector', None) is not None:
+                # Crypto1 was switched off by the host, the tag no longer understands us.
+                self.card.reset()
+                self.card.state = FakeCard.IDLE
+            rates = getattr(self.card, 'rates', (0, 0))
+            if self.error_model is not None and self.random.random() < self.error_model(self.regs):
+                rates = None
+            if rates != (self.regs[self.TxModeReg] >> 4 & 0x07, self.regs[self.RxModeReg] >> 4 & 0x07):
+                answer = None
+            elif max(rates) > getattr(self.card, 'max_reliable', 3):
+                answer = None
+            else:
+                answer = self.card.receive(frame, tx_bits if tx_bits else 8)
+        self.regs[self.CommIrqReg] |= 0x40
+        if not expect_answer:
+            self.regs[self.CommIrqReg] |= 0x10
+            self.regs[self.CommandReg] = 0x00
+            return
+        if answer is None:
+            self.regs[self.CommIrqReg] |= 0x01
+            return
+        (data, bits) = answer
+        if self.regs[self.RxModeReg] & 0x80 and bits >= 24:
+            if crc_a(data[:-2]) != list(data[-2:]):
+                self.regs[self.ErrorReg] |= 0x04
+            data = data[:-2]
+            bits -= 16
+        self.fifo += bytes(data)
+        self.regs[self.ControlReg] = bits % 8
+        self.regs[self.CommIrqReg] |= 0x30
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import contextlib
+import io
+import MFRC522
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from Anticol import anticol, connect_reader
+from CardType import lookup
+from MFAccess import sector_count
+from MFClassic import DEFAULT_KEY, read_card
+from MFDump import first_block_of_sector, blocks_in_sector
+
+
+class IoEngine:
+    """Runs MFRC522 calls on a dedicated serial thread.
+
+    submit() queues a driver call and returns a Future right away, calls run
+    strictly in submission order. While the thread waits for the UART, the
+    caller is free to build the next frames, compute CRCs or write finished
+    data to disk; the serial wait releases the GIL so both really overlap.
+    """
+
+    def __init__(self, mf_reader: MFRC522):
+        self.reader = mf_reader
+        self.commands = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            command = self.commands.get()
+            if command is None:
+                break
+            (future, method, args) = command
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(method(*args))
+            except Exception as err:
+                future.set_exception(err)
+
+    def submit(self, method, *args):
+        # method is the name of a driver method or any callable taking the reader first.
+        future = Future()
+        if isinstance(method, str):
+            self.commands.put((future, getattr(self.reader, method), args))
+        else:
+            self.commands.put((future, method, (self.reader,) + args))
+        return future
+
+    def submit_batch(self, calls):
+        # calls is a list of (method, args) tuples, returns their futures in the same order.
+        return [self.submit(method, *args) for (method, args) in calls]
+
+    def close(self):
+        self.commands.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def sector_frames(mf_reader: MFRC522, sector, key_a):
+    # Host side before a sector goes out, done by the caller: the AUTH command
+    # and the READ frames with their CRC.
+    first = first_block_of_sector(sector)
+    auth = (mf_reader.PICC_AUTHENT1A if key_a else mf_reader.PICC_AUTHENT1B, first)
+    return auth, [mf_reader.commandFrame(mf_reader.PICC_READ, block) for block in range(first, first + blocks_in_sector(sector))]
+
+
+def exchange_sector(mf_reader: MFRC522, auth, uid, key, frames):
+    """One queued unit, only the exchanges with the card: AUTH and the prepared READ frames.
+
+    Returns the answers as received, with their CRC. After a failure the card
+    is idle, it is selected again for the next sector and None is returned.
+    """
+    if mf_reader.MFRC522_Auth(auth[0], auth[1], key, uid) == mf_reader.MI_OK:
+        answers = []
+        for frame in frames:
+            # CRC_TX, the answer's CRC is left for the caller to check.
+            (status, data, _) = mf_reader.MFRC522_TransceiveBytes(frame, 0, mf_reader.TIMEOUT_MEDIUM, mf_reader.CRC_TX)
+            if status != mf_reader.MI_OK:
+                break
+            answers.append(data)
+        else:
+            return answers
+    mf_reader.MFRC522_StopCrypto1()
+    anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
+    return None
+
+
+def sector_data(mf_reader: MFRC522, answers, key, key_a):
+    # Host side after a sector came back: CRC checked and stripped, keys filled
+    # into the trailer as MFClassic does it. None when a CRC is wrong.
+    data = bytearray()
+    for answer in answers:
+        # The CRC_A over a frame including its own CRC is 0.
+        if len(answer) != 18 or mf_reader.crcA(answer):
+            return None
+        data += answer[:16]
+    data[-16:-10] = bytes(key if key_a else DEFAULT_KEY)
+    data[-6:] = bytes(DEFAULT_KEY if key_a else key)
+    return data
+
+
+def store_sector(fp, sector, data):
+    # Written through to the file as soon as the sector is there.
+    fp.seek(first_block_of_sector(sector) * 16)
+    fp.write(data)
+    fp.flush()
+
+
+def read_card_current(mf_reader: MFRC522, uid, key, key_a, blocks, path):
+    # The current pattern: MFClassic.read_card, then the dump is saved at once.
+    with contextlib.redirect_stdout(io.StringIO()):
+        (success, dump_bin) = read_card(mf_reader, uid, False, None, False, blocks, key_a, True, False, [key])
+    if success:
+        dump_bin.save(path)
+    return success
+
+
+def read_card_overlapped(engine, uid, key, key_a, blocks, fp):
+    """Queue all sectors at once, the caller's work overlaps the exchanges.
+
+    Frames are built and queued before the serial thread needs them, CRCs are
+    checked and sectors stored while it is busy with the next ones.
+    """
+    reader = engine.reader
+    futures = []
+    for sector in range(sector_count(blocks)):
+        (auth, frames) = sector_frames(reader, sector, key_a)
+        futures.append(engine.submit(exchange_sector, auth, uid, key, frames))
+    failed = []
+    for (sector, future) in enumerate(futures):
+        answers = future.result()
+        data = sector_data(reader, answers, key, key_a) if answers is not None else None
+        if data is None:
+            failed.append(sector)
+            continue
+        store_sector(fp, sector, data)
+    return failed
+
+
+def usage(program_name):
+    print('Usage: %s a|b <key> <dump.mfd> [-c]' % program_name)
+    print('  a|b         - read with key A or key B')
+    print('  <key>       - 12 HEX digits, used for every sector')
+    print('  <dump.mfd>  - output, each sector is written to disk as soon as it is read')
+    print('  -c          - read the card twice, once with MFClassic.read_card and once overlapped, and compare')
+    print('                the wall time')
+
+
+def main():
+    args = sys.argv[1:]
+    compare = '-c' in args
+    args = [arg for arg in args if arg != '-c']
+    if len(args) != 3 or args[0] not in ['a', 'b'] or len(args[1]) != 12:
+        usage(sys.argv[0])
+        exit(-1)
+    key_a = args[0] == 'a'
+    try:
+        key = list(bytes.fromhex(args[1]))
+    except ValueError as err:
+        print('Illegal key: %s' % err)
+        exit(-1)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+    (success, card_info) = anticol(mf_reader, no_rats=True)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    (uid, sak, atqa, ats) = card_info
+    blocks = lookup(sak, atqa, ats).blocks
+    if blocks is None:
+        blocks = 0x3f
+
+    try:
+        fp = open(args[2], 'w+b')
+    except IOError as err:
+        print('Could not open dump file: %s, err = %s' % (args[2], err))
+        exit(-1)
+    with fp:
+        fp.truncate((blocks + 1) * 16)
+        if compare:
+            t_start = time.monotonic()
+            success = read_card_current(mf_reader, uid, key, key_a, blocks, args[2])
+            print('read_card:  %.3f s, %s' % (time.monotonic() - t_start, 'ok' if success else 'failed'))
+            mf_reader.MFRC522_HaltA()
+            anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
+        with IoEngine(mf_reader) as engine:
+            t_start = time.monotonic()
+            failed = read_card_overlapped(engine, uid, key, key_a, blocks, fp)
+            print('Overlapped: %.3f s, %d sectors failed' % (time.monotonic() - t_start, len(failed)))
+    if failed:
+        print('Sectors not read: %s' % ' '.join([str(s) for s in failed]))
+    mf_reader.MFRC522_HaltA()
+    exit(0 if not failed else -1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import MFRC522
+import sys
+import time
+from dataclasses import dataclass
+from Anticol import anticol, connect_reader, print_hex, SAK_FLAG_ATS_SUPPORTED
+
+# Frame size coded by FSCI/FSDI, bigger codes are RFU and read as 256.
+FRAME_SIZES = [16, 24, 32, 40, 48, 64, 96, 128, 256]
+
+# 256 * 16 / fc in us, the frame waiting time is FWT_UNIT * 2^FWI.
+FWT_UNIT = 302
+# FWT with FWI 14, also the limit of FWT * WTXM.
+FWT_MAX = FWT_UNIT << 14
+# Timer ticks of 13.56 MHz / (2 * TPrescaler 0xA9 + 1), ~25 us.
+TIMER_TICK = 25
+FC_KHZ = 13560
+
+PPSS = 0xD0
+PPS0_PPS1_PRESENT = 0x11
+
+PCB_I_BLOCK = 0x02
+PCB_R_ACK = 0xA2
+PCB_R_NAK = 0xB2
+PCB_S_DESELECT = 0xC2
+PCB_S_WTX = 0xF2
+PCB_CHAINING = 0x10
+PCB_BLOCK_NUMBER = 0x01
+
+# Attempts per block before the exchange is given up.
+RETRIES = 3
+
+
+@dataclass
+class AtsInfo:
+    fsc: int = 32           # largest frame the card accepts
+    fwi: int = 4
+    sfgi: int = 0
+    ta: int = None          # supported bit rates, for PPS
+    cid: bool = False
+    nad: bool = False
+    historical: list = None
+
+
+def frame_size(code):
+    return FRAME_SIZES[min(code, len(FRAME_SIZES) - 1)]
+
+
+def parse_ats(ats):
+    """Decode the interface bytes of an ATS, with or without its CRC.
+
+    TL is the length byte, T0 carries FSCI and tells which of TA(1), TB(1)
+    and TC(1) follow. Missing bytes keep their ISO 14443-4 defaults.
+    """
+    info = AtsInfo()
+    if not ats or ats[0] < 2:
+        info.historical = []
+        return info
+    ats = ats[:ats[0]]
+    t0 = ats[1]
+    info.fsc = frame_size(t0 & 0x0F)
+    i = 2
+    if t0 & 0x10:
+        info.ta = ats[i]
+        i += 1
+    if t0 & 0x20:
+        info.fwi = ats[i] >> 4
+        info.sfgi = ats[i] & 0x0F
+        i += 1
+    if t0 & 0x40:
+        info.nad = bool(ats[i] & 0x01)
+        info.cid = bool(ats[i] & 0x02)
+        i += 1
+    info.historical = list(ats[i:])
+    return info
+
+
+def choose_bit_rate(ta, max_code=3):
+    """Pick the fastest bit rates TA(1) allows, as (DRI, DSI) speed codes.
+
+    TA(1) b7..b5 flag DS = 8, 4, 2 (card to reader), b3..b1 DR = 8, 4, 2
+    (reader to card), b8 asks for the same divisor in both directions.
+    Codes 0..3 stand for 106, 212, 424 and 848 kbit/s.
+    """
+    if ta is None or ta & 0x08:
+        return 0, 0
+    dsi = max([i for i in range(1, max_code + 1) if ta & (0x10 << (i - 1))], default=0)
+    dri = max([i for i in range(1, max_code + 1) if ta & (0x01 << (i - 1))], default=0)
+    if ta & 0x80:
+        dsi = dri = min(dsi, dri)
+    return dri, dsi
+
+
+class IsoDep:
+    """ISO 14443-4 half duplex block transport on top of MFRC522.
+
+    Blocks go out with MFRC522_TransceiveLong, so frames of up to FSD/FSC
+    bytes stream through the FIFO instead of being cut at 64 bytes. APDUs
+    longer than FSC - 3 are chained, chained answers are collected with
+    R(ACK). Waiting time extensions are granted, failed blocks are recovered
+    with R(NAK) as far as the protocol allows. CID and NAD are not used.
+
+    activate() negotiates the fastest bit rate up to max_rate (a speed code,
+    see choose_bit_rate) with PPS. When an APDU fails above 106 kbit/s the
+    card is powered down, activated again one rate lower and the APDU is sent
+    once more, so non idempotent commands should be run with max_rate 0.
+    """
+
+    def __init__(self, mf_reader: MFRC522, fsdi=8, max_rate=0):
+        self.reader = mf_reader
+        self.fsdi = fsdi
+        self.fsd = frame_size(fsdi)
+        self.max_rate = max_rate
+        self.ats = None
+        self.info = AtsInfo()
+        self.block_number = 0
+        self.bit_rate = (0, 0)
+
+    def activate(self):
+        # RATS for a selected card, returns the ATS without its CRC or None.
+        (status, ats) = self.reader.MFRC522_RequestATS(self.fsdi)
+        if status != self.reader.MI_OK or not ats or ats[0] + 2 != len(ats) or self.reader.crcA(ats):
+            return None
+        self.ats = ats[:ats[0]]
+        self.info = parse_ats(self.ats)
+        self.block_number = 0
+        # Start-up frame guard time before the first block.
+        if self.info.sfgi:
+            time.sleep(FWT_UNIT * (1 << self.info.sfgi) / 1000000)
+        # PPS is only accepted as the first block after the ATS.
+        (dri, dsi) = choose_bit_rate(self.info.ta, self.max_rate)
+        if (dri, dsi) != (0, 0):
+            self.pps(dri, dsi)
+        return self.ats
+
+    def pps(self, dri, dsi):
+        (status, answer) = self.reader.MFRC522_TransceiveCRC([PPSS, PPS0_PPS1_PRESENT, dsi << 2 | dri],
+                                                           self.reader.TIMEOUT_MEDIUM)
+        if status != self.reader.MI_OK or answer != [PPSS]:
+            return False
+        self.reader.setBitRate(dri, dsi)
+        self.bit_rate = (dri, dsi)
+        return True
+
+    def reactivate(self, max_rate):
+        # Power cycle the card through the field and run the activation again.
+        self.max_rate = max_rate
+        if self.bit_rate != (0, 0):
+            self.reader.setBitRate(0, 0)
+            self.bit_rate = (0, 0)
+        self.reader.antennaOff()
+        time.sleep(0.01)
+        self.reader.antennaOn()
+        time.sleep(0.005)
+        if not anticol(self.reader, print_info=False, wakeup=True, no_rats=True)[0]:
+            return False
+        return self.activate() is not None
+
+    def rate_kbps(self):
+        # Reader to card and card to reader bit rate.
+        return self.reader.BIT_RATES[self.bit_rate[0]], self.reader.BIT_RATES[self.bit_rate[1]]
+
+    def set_fwt(self, fwt_us):
+        """Program the chip timer for a frame waiting time, returns it in us.
+
+        The timer is reprogrammed only when the waiting time changes. Waits
+        over 65535 ticks of ~25 us (1.6 s, FWI 13 and 14 or a long WTX) run
+        with a bigger TPrescaler, transceive_block() puts the driver's back.
+        """
+        fwt_us = min(fwt_us, FWT_MAX)
+        prescaler = self.reader.TIMER_PRESCALER
+        if fwt_us // TIMER_TICK + 1 > 0xFFFF:
+            # Smallest prescaler whose 65535 ticks of (2 * prescaler + 1) / fc cover it.
+            prescaler = -(-fwt_us * FC_KHZ // (1000 * 0xFFFF)) // 2
+            reload = min(0xFFFF, fwt_us * FC_KHZ // (1000 * (2 * prescaler + 1)) + 1)
+        else:
+            reload = fwt_us // TIMER_TICK + 1
+        self.reader.setTimerPrescaler(prescaler, reload)
+        return fwt_us
+
+    def transceive_block(self, block, wtxm=1):
+        # Send one block with CRC, returns the answer block without CRC or None.
+        fwt_us = self.set_fwt(FWT_UNIT * (1 << self.info.fwi) * wtxm)
+        frame = block + self.reader.CalulateCRC(block)
+        (status, data, back_len) = self.reader.MFRC522_TransceiveLong(frame, fwt_us / 1000000 + 0.05)
+        if self.reader.timer_prescaler != self.reader.TIMER_PRESCALER:
+            # The timeout profiles count in ticks of the default prescaler.
+            self.reader.setTimerPrescaler(self.reader.TIMER_PRESCALER, self.reader.timeouts[self.reader.TIMEOUT_LONG])
+        if status != self.reader.MI_OK or back_len % 8 or len(data) < 3 or len(data) > self.fsd:
+            return None
+        if self.reader.CalulateCRC(data[:-2]) != data[-2:]:
+            return None
+        return data[:-2]
+
+    def exchange_block(self, block, retry=None):
+        """Send a block and wait for the next I- or R-block of the card.
+
+        S(WTX) requests are answered in between. A lost or broken answer is
+        asked for again with retry, R(NAK) by default; while the card chains
+        its answer the R(ACK) is repeated instead. An R(ACK) of the other
+        block number to an I-block means the card never got it, the I-block
+        is sent again (rule 6).
+        """
+        wtxm = 1
+        sent = block
+        for attempt in range(RETRIES + 1):
+            answer = self.transceive_block(sent, wtxm)
+            wtxm = 1
+            while answer is not None and answer[0] & 0xF7 == PCB_S_WTX and len(answer) >= 2:
+                wtxm = max(1, min(59, answer[1] & 0x3F))
+                answer = self.transceive_block([PCB_S_WTX, wtxm], wtxm)
+                wtxm = 1
+            if answer is None:
+                sent = retry if retry is not None else [PCB_R_NAK | self.block_number]
+            elif (block[0] & 0xE2 == PCB_I_BLOCK and answer[0] & 0xF6 == PCB_R_ACK & 0xF6 and
+                  answer[0] & PCB_BLOCK_NUMBER != self.block_number):
+                sent = block
+            else:
+                return answer
+        return None
+
+    def transceive(self, apdu):
+        # Send a command APDU, returns the response APDU or None on a protocol error.
+        response = self.exchange_apdu(apdu)
+        while response is None and self.bit_rate != (0, 0):
+            rate = max(self.bit_rate) - 1
+            print('Falling back to %d kbit/s' % self.reader.BIT_RATES[rate])
+            if not self.reactivate(rate):
+                return None
+            response = self.exchange_apdu(apdu)
+        return response
+
+    def exchange_apdu(self, apdu):
+        chunk_size = self.info.fsc - 3
+        offset = 0
+        while True:
+            chunk = list(apdu[offset:offset + chunk_size])
+            offset += len(chunk)
+            more = offset < len(apdu)
+            pcb = PCB_I_BLOCK | self.block_number | (PCB_CHAINING if more else 0)
+            answer = self.exchange_block([pcb] + chunk)
+            if answer is None:
+                return None
+            if not more:
+                break
+            # A chained I-block is acknowledged with R(ACK) of the same number.
+            if answer[0] & 0xF6 != PCB_R_ACK & 0xF6 or answer[0] & PCB_BLOCK_NUMBER != self.block_number:
+                return None
+            self.block_number ^= 1
+
+        response = []
+        while True:
+            if answer[0] & 0xE2 != PCB_I_BLOCK or answer[0] & PCB_BLOCK_NUMBER != self.block_number:
+                return None
+            self.block_number ^= 1
+            response += answer[1:]
+            if not answer[0] & PCB_CHAINING:
+                return response
+            ack = [PCB_R_ACK | self.block_number]
+            answer = self.exchange_block(ack, ack)
+            if answer is None:
+                return None
+
+    def deselect(self):
+        answer = self.transceive_block([PCB_S_DESELECT])
+        return answer is not None and answer[0] == PCB_S_DESELECT
+
+
+def parse_apdu(text):
+    return list(bytes.fromhex(text.replace(' ', '').replace(':', '')))
+
+
+def usage(program_name):
+    print('Usage: %s [-f <fsdi>] [-p <kbit/s>] [-r <count>] <apdu> [<apdu> ...]' % program_name)
+    print('  <apdu>      - command APDU in HEX, e.g. 00a4040007d276000085010100')
+    print('                without APDU, commands are read from stdin, one per line')
+    print('  -f <fsdi>   - largest frame the reader accepts, 0..8 = 16..256 bytes, default 8')
+    print('  -p <kbit/s> - highest bit rate to negotiate with PPS, 106, 212, 424 or 848, default 848')
+    print('  -r <count>  - send every APDU count times and report the throughput')
+    print('                with PPS, the first APDU is measured at 106 kbit/s before the negotiation')
+
+
+def benchmark(iso_dep, apdu, repeat):
+    # Returns the last response (None on error) and the elapsed seconds.
+    t_start = time.monotonic()
+    response = None
+    for _ in range(repeat):
+        response = iso_dep.transceive(apdu)
+        if response is None:
+            break
+    return response, time.monotonic() - t_start
+
+
+def print_throughput(iso_dep, apdu, response, repeat, elapsed):
+    print('%d/%d kbit/s: %d exchanges in %.3f s, %.1f APDU/s, %.0f bytes/s' %
+          (iso_dep.rate_kbps() + (repeat, elapsed, repeat / elapsed, repeat * (len(apdu) + len(response)) / elapsed)))
+
+
+def main():
+    args = sys.argv[1:]
+    fsdi = 8
+    repeat = 1
+    max_rate = 3
+    try:
+        while args and args[0] in ['-f', '-p', '-r']:
+            if args[0] == '-f':
+                fsdi = int(args[1])
+            elif args[0] == '-p':
+                max_rate = MFRC522.MFRC522.BIT_RATES.index(int(args[1]))
+            else:
+                repeat = int(args[1])
+            args = args[2:]
+        apdus = [parse_apdu(arg) for arg in args]
+        if not apdus:
+            apdus = [parse_apdu(line) for line in sys.stdin if line.strip()]
+    except (IndexError, ValueError) as err:
+        print('Illegal argument: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+    if fsdi < 0 or fsdi > 8 or repeat < 1 or not apdus:
+        usage(sys.argv[0])
+        exit(-1)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+
+    (success, card_info) = anticol(mf_reader, no_rats=True)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    if not card_info[1] & SAK_FLAG_ATS_SUPPORTED:
+        print('Error: tag does not support ISO 14443-4')
+        exit(-1)
+
+    # With a benchmark, measure at 106 kbit/s first and negotiate PPS afterwards.
+    measure_before = repeat > 1 and max_rate > 0
+    iso_dep = IsoDep(mf_reader, fsdi, 0 if measure_before else max_rate)
+    if iso_dep.activate() is None:
+        print('Error: RATS failed')
+        exit(-1)
+    print_hex(' ATS: ', iso_dep.ats)
+    print('FSC %d, FSD %d, FWT %d us' % (iso_dep.info.fsc, iso_dep.fsd, FWT_UNIT * (1 << iso_dep.info.fwi)))
+    if measure_before and choose_bit_rate(iso_dep.info.ta, max_rate) != (0, 0):
+        (response, elapsed) = benchmark(iso_dep, apdus[0], repeat)
+        if response is not None:
+            print_throughput(iso_dep, apdus[0], response, repeat, elapsed)
+        if not iso_dep.reactivate(max_rate):
+            print('Error: tag was removed')
+            exit(-1)
+    print('Bit rate %d/%d kbit/s (reader to card/card to reader)' % iso_dep.rate_kbps())
+
+    success = True
+    for apdu in apdus:
+        print_hex('>> ', apdu)
+        (response, elapsed) = benchmark(iso_dep, apdu, repeat)
+        if response is None:
+            print('Error: no answer')
+            success = False
+            break
+        print_hex('<< ', response)
+        if repeat > 1:
+            print_throughput(iso_dep, apdu, response, repeat, elapsed)
+
+    iso_dep.deselect()
+    exit(0 if success else -1)
+
+
+if __name__ == '__main__':
+    main()
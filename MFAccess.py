@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import sys
+from dataclasses import dataclass, field
+from MFDump import Dump, first_block_of_sector, blocks_in_sector
+
+# Access conditions, indexed by C1C2C3 read as a 3 bit number (C1 is the MSB).
+# Each entry lists which keys may perform the operation, '' means never.
+
+# Data blocks: read, write, increment, decrement/transfer/restore
+DATA_ACCESS = [
+    ('AB', 'AB', 'AB', 'AB'),   # 000 transport configuration
+    ('AB', '', '', 'AB'),       # 001 value block
+    ('AB', '', '', ''),         # 010 read/write block
+    ('B', 'B', '', ''),         # 011 read/write block
+    ('AB', 'B', '', ''),        # 100 read/write block
+    ('B', '', '', ''),          # 101 read/write block
+    ('AB', 'B', 'B', 'AB'),     # 110 value block
+    ('', '', '', ''),           # 111 read/write block
+]
+
+# Sector trailer: key A write, access bits read, access bits write, key B read, key B write
+TRAILER_ACCESS = [
+    ('A', 'A', '', 'A', 'A'),   # 000
+    ('A', 'A', 'A', 'A', 'A'),  # 001 transport configuration
+    ('', 'A', '', 'A', ''),     # 010
+    ('B', 'AB', 'B', '', 'B'),  # 011
+    ('B', 'AB', '', '', 'B'),   # 100
+    ('', 'AB', 'B', '', ''),    # 101
+    ('', 'AB', '', '', ''),     # 110
+    ('', 'AB', '', '', ''),     # 111
+]
+
+DATA_READ = 0
+DATA_WRITE = 1
+DATA_INCREMENT = 2
+DATA_DECREMENT = 3
+
+TRAILER_KEY_A_WRITE = 0
+TRAILER_ACL_READ = 1
+TRAILER_ACL_WRITE = 2
+TRAILER_KEY_B_READ = 3
+TRAILER_KEY_B_WRITE = 4
+
+# FF 07 80: data blocks 000, trailer 001
+DEFAULT_ACCESS_BITS = [0xff, 0x07, 0x80]
+
+
+def decode_access_bits(acl):
+    # Returns the C1C2C3 value of the 4 block groups, trailer last, or None when
+    # the inverted copy does not match.
+    c1 = acl[1] >> 4
+    c2 = acl[2] & 0x0F
+    c3 = acl[2] >> 4
+    if (acl[0] & 0x0F) != (~c1 & 0x0F) or (acl[0] >> 4) != (~c2 & 0x0F) or (acl[1] & 0x0F) != (~c3 & 0x0F):
+        return None
+    return [((c1 >> i) & 1) << 2 | ((c2 >> i) & 1) << 1 | ((c3 >> i) & 1) for i in range(4)]
+
+
+def encode_access_bits(conditions):
+    c1 = c2 = c3 = 0
+    for (i, c) in enumerate(conditions):
+        c1 |= ((c >> 2) & 1) << i
+        c2 |= ((c >> 1) & 1) << i
+        c3 |= (c & 1) << i
+    return [(~c2 & 0x0F) << 4 | (~c1 & 0x0F), c1 << 4 | (~c3 & 0x0F), c3 << 4 | c2]
+
+
+def block_group(sector, index):
+    # Small sectors have one access group per block, the 16 block sectors of a
+    # 4K card share each group between 5 data blocks.
+    if blocks_in_sector(sector) == 4:
+        return index
+    return 3 if index == 15 else index // 5
+
+
+def usable_keys(conditions, keys):
+    # Key B is readable in trailer modes 000, 010 and 001, it then works as plain data
+    # and the card refuses to authenticate with it.
+    usable = ''
+    if keys.get('A') is not None:
+        usable += 'A'
+    if keys.get('B') is not None and not TRAILER_ACCESS[conditions[3]][TRAILER_KEY_B_READ]:
+        usable += 'B'
+    return usable
+
+
+def allowed_keys(conditions, sector, index, operation):
+    group = block_group(sector, index)
+    if group == 3:
+        if operation == 'read':
+            return TRAILER_ACCESS[conditions[3]][TRAILER_ACL_READ]
+        # A full trailer write needs the rights for both keys and the access bits.
+        rights = TRAILER_ACCESS[conditions[3]]
+        return ''.join([k for k in 'AB' if k in rights[TRAILER_KEY_A_WRITE] and k in rights[TRAILER_ACL_WRITE] and
+                        k in rights[TRAILER_KEY_B_WRITE]])
+    return DATA_ACCESS[conditions[group]][DATA_READ if operation == 'read' else DATA_WRITE]
+
+
+@dataclass
+class SectorPlan:
+    sector: int
+    key_letter: str = None
+    key: list = None
+    blocks: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+
+
+def plan_sector(sector, acl, keys, operation, indexes=None):
+    """Pick the one key that gives access to most blocks of the sector.
+
+    keys maps 'A'/'B' to the known key (or None), acl holds trailer bytes 6..8.
+    Blocks no usable key can reach are listed in skipped with the reason.
+    """
+    plan = SectorPlan(sector)
+    conditions = decode_access_bits(acl)
+    first = first_block_of_sector(sector)
+    count = blocks_in_sector(sector)
+    if indexes is None:
+        indexes = range(count)
+    if conditions is None:
+        plan.skipped = [(first + i, 'invalid access bits') for i in indexes]
+        return plan
+
+    usable = usable_keys(conditions, keys)
+    allowed = {i: allowed_keys(conditions, sector, i, operation) for i in indexes}
+    best = None
+    for letter in usable:
+        covered = [i for i in indexes if letter in allowed[i]]
+        if best is None or len(covered) > len(best[1]):
+            best = (letter, covered)
+    if best is not None and best[1]:
+        plan.key_letter = best[0]
+        plan.key = keys[best[0]]
+        plan.blocks = [first + i for i in best[1]]
+    for i in indexes:
+        if first + i in plan.blocks:
+            continue
+        if not allowed[i]:
+            reason = 'never allowed'
+        elif not any([k in usable for k in allowed[i]]):
+            reason = 'needs key %s' % ' or '.join(allowed[i])
+        else:
+            reason = 'needs key %s, second auth' % ' or '.join(allowed[i])
+        plan.skipped.append((first + i, reason))
+    return plan
+
+
+def plan_card(num_sectors, acls, keys, operation, sectors=None):
+    # acls[sector] are the access bytes, keys[sector] the dict of known keys.
+    return [plan_sector(s, acls[s], keys[s], operation) for s in (sectors if sectors is not None else range(num_sectors))]
+
+
+def plan_from_dump(dump, operation, sectors=None, key_letters='AB'):
+    # Keys and access bits come from a dump of the card, e.g. the <keys.mfd> file.
+    num_sectors = sector_count(dump.last_block)
+    acls = []
+    keys = []
+    for sector in range(num_sectors):
+        trailer = first_block_of_sector(sector) + blocks_in_sector(sector) - 1
+        acls.append(list(dump.access_bits(trailer)[0:3]))
+        keys.append({'A': list(dump.key_a(trailer)) if 'A' in key_letters else None,
+                     'B': list(dump.key_b(trailer)) if 'B' in key_letters else None})
+    return plan_card(num_sectors, acls, keys, operation, sectors)
+
+
+def sector_count(last_block):
+    if last_block < 128:
+        return (last_block + 1) // 4
+    return 32 + (last_block - 127) // 16
+
+
+def print_plan(plans, operation):
+    auths = 0
+    count = 0
+    for plan in plans:
+        if plan.key_letter is not None:
+            auths += 1
+            count += len(plan.blocks)
+            print('Sector %02d: key %s %s %s, %s blocks %s' %
+                  (plan.sector, plan.key_letter, ''.join(['%02x' % x for x in plan.key]), operation,
+                   len(plan.blocks), ' '.join(['%02x' % b for b in plan.blocks])))
+        else:
+            print('Sector %02d: no usable key' % plan.sector)
+        for (block, reason) in plan.skipped:
+            print('           skip block %02x: %s' % (block, reason))
+    print('%d blocks to %s with %d authentications.' % (count, operation, auths))
+
+
+def usage(program_name):
+    print('Usage: %s <keys.mfd> [r|w] [a|b|ab]' % program_name)
+    print('  <keys.mfd>  - dump holding the current keys and access bits of the card')
+    print('  r|w         - plan a read (default) or a write')
+    print('  a|b|ab      - keys known for the card, default both')
+
+
+def main():
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        usage(sys.argv[0])
+        exit(-1)
+    operation = 'write' if len(sys.argv) > 2 and sys.argv[2] == 'w' else 'read'
+    key_letters = sys.argv[3].upper() if len(sys.argv) > 3 else 'AB'
+    try:
+        with Dump.open(sys.argv[1]) as dump:
+            print_plan(plan_from_dump(dump, operation, key_letters=key_letters), operation)
+    except (IOError, ValueError) as err:
+        print('Could not open key file: %s, err = %s' % (sys.argv[1], err))
+        exit(-1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import MFRC522
+from Anticol import cascade_parts, fast_select
+from MFDump import sector_of_block, trailer_of_block
+
+DEFAULT_KEY = [0xff, 0xff, 0xff, 0xff, 0xff, 0xff]
+
+
+class MifareClassicCard:
+    """Session with a MIFARE Classic card anticol() has selected.
+
+    Keeps track of the Crypto1 session the card is in: the sector
+    authenticated and the key that did it. A block of that sector is read or
+    written without another AUTH, the key of every sector is remembered once
+    found. Blocks read are cached as bytes until they are written or
+    invalidate() is called; value operations done with the driver directly
+    need the latter.
+
+    A failed AUTH, READ or WRITE sends the card back to idle, it is selected
+    again by its UID (WUPA + SELECT, no anticollision) right away.
+    """
+
+    def __init__(self, mf_reader: MFRC522, uid, keys=None, key_a=True):
+        self.reader = mf_reader
+        self.uid = list(uid)
+        self.parts = cascade_parts(self.uid)
+        self.key_a = key_a
+        # Tried in order on a sector whose key is not known yet.
+        self.guess_keys = keys or [DEFAULT_KEY]
+        self.keys = {}
+        self.sector = None
+        self.cache = {}
+        self.auths = 0
+
+    def set_key(self, sector, key):
+        self.keys[sector] = list(key)
+
+    def invalidate(self, block=None):
+        # Forget one cached block, all of them when block is None.
+        if block is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(block, None)
+
+    def reselect(self):
+        # Selected again without a Crypto1 session, False when the card is gone.
+        self.reader.MFRC522_StopCrypto1()
+        self.sector = None
+        return fast_select(self.reader, self.parts)
+
+    def halt(self):
+        self.reader.MFRC522_HaltA()
+        self.reader.MFRC522_StopCrypto1()
+        self.sector = None
+
+    def authenticate(self, block):
+        # AUTH for the sector of block, unless it is the one authenticated.
+        sector = sector_of_block(block)
+        if sector == self.sector:
+            return True
+        auth_cmd = self.reader.PICC_AUTHENT1A if self.key_a else self.reader.PICC_AUTHENT1B
+        keys = [self.keys[sector]] if sector in self.keys else self.guess_keys
+        for key in keys:
+            self.auths += 1
+            if self.reader.MFRC522_Auth(auth_cmd, block, key, self.uid) == self.reader.MI_OK:
+                (self.sector, self.keys[sector]) = (sector, list(key))
+                return True
+            if not self.reselect():
+                break
+        return False
+
+    def read_block(self, block):
+        # The 16 bytes of block, None when it can not be read.
+        if block in self.cache:
+            return self.cache[block]
+        if not self.authenticate(block):
+            return None
+        (status, data) = self.reader.MFRC522_ReadBlock(block)
+        if status != self.reader.MI_OK:
+            self.reselect()
+            return None
+        self.cache[block] = data
+        return data
+
+    def write_block(self, block, data):
+        if not self.authenticate(block):
+            return False
+        if self.reader.MFRC522_Write(block, data) != self.reader.MI_OK:
+            self.invalidate(block)
+            self.reselect()
+            return False
+        if trailer_of_block(block) == block:
+            # The keys read back masked and the next AUTH needs the new key.
+            self.invalidate(block)
+            self.keys[self.sector] = list(data[0:6] if self.key_a else data[10:16])
+        else:
+            self.cache[block] = bytes(data[:16])
+        return True
+
+    def by_sector(self, blocks):
+        # Blocks of the authenticated sector first, then sector by sector.
+        return sorted(blocks, key=lambda block: (sector_of_block(block) != self.sector, block))
+
+    def read_blocks(self, blocks):
+        """Read blocks with one AUTH per sector, returns {block: data} of the blocks read.
+
+        After a block of a sector fails, the rest of that sector is skipped.
+        """
+        data = {}
+        failed_sector = None
+        for block in self.by_sector(blocks):
+            if sector_of_block(block) == failed_sector:
+                continue
+            data[block] = self.read_block(block)
+            if data[block] is None:
+                del data[block]
+                failed_sector = sector_of_block(block)
+        return data
+
+    def write_blocks(self, blocks):
+        """Write a list of (block, data) with one AUTH per sector.
+
+        Returns the blocks not written. After a block of a sector fails, the
+        rest of that sector is not tried.
+        """
+        contents = dict(blocks)
+        failed = []
+        for block in self.by_sector(contents):
+            if failed and sector_of_block(failed[-1]) == sector_of_block(block):
+                failed.append(block)
+            elif not self.write_block(block, contents[block]):
+                failed.append(block)
+        return failed
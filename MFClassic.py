@@ -3,9 +3,14 @@
 
 
 import MFRC522
+import os
 import sys
 import time
-from Anticol import anticol, auto_find_port, print_hex
+from Anticol import anticol, connect_reader, print_hex
+from CardType import CLASSIC, DIRECT_WRITE, GEN1A, MAGIC_PROBES, identify
+from MFAccess import plan_from_dump
+from MFDump import Dump, sector_of_block, first_block_of_sector, blocks_in_sector
+from MFIndex import load_key_dictionary
 
 # Guess keys
 GUESS_KEYS = [
@@ -42,7 +47,12 @@ def usage(program_name):
     print("  u|U           - Use any (u) uid or supply a uid specifically as U01ab23cd.")
     print("  <dump.mfd>    - MiFare Dump (MFD) used to write (card to MFD) or (MFD to card)")
     print("  <keys.mfd>    - MiFare Dump (MFD) that contain the keys (optional)")
+    print("                  *** dumps and key files can also be .eml or .json, picked by extension")
+    print("                  *** a .txt/.dic key dictionary (e.g. from MFIndex export) is tried before the default keys")
     print("  f             - Force using the keyfile even if UID does not match (optional)")
+    print("  --sectors=1-3 - Only read/write/format the given sectors, e.g. --sectors=1-3,5 (optional)")
+    print("  --blocks=4-15 - Only read/write/format the given blocks (optional)")
+    print("                  *** a partial read is merged into <dump.mfd> when it exists, other blocks are kept")
     print("Examples: \n")
     print("  Read card to file, using key A:\n")
     print("    %s r a u mycard.mfd\n" % program_name)
@@ -55,9 +65,48 @@ def usage(program_name):
     print("    %s f B u dummy.mfd keyfile.mfd f\n" % program_name)
     print("  Read card to file, using key A and uid 0x01 0xab 0x23 0xcd:\n")
     print("    %s r a U01ab23cd mycard.mfd\n" % program_name)
+    print("  Refresh sectors 1 to 3 of an existing dump:\n")
+    print("    %s r a u mycard.mfd --sectors=1-3\n" % program_name)
+
+
+def parse_ranges(text):
+    # 1-3,5 style list, numbers may be given as 0x.. too
+    values = []
+    for part in text.split(','):
+        bounds = part.split('-')
+        first = int(bounds[0], 0)
+        last = int(bounds[-1], 0)
+        if len(bounds) > 2 or first > last:
+            raise ValueError('illegal range %s' % part)
+        values += range(first, last + 1)
+    return values
+
+
+def blocks_of_sectors(sectors):
+    selection = set()
+    for sector in sectors:
+        first = first_block_of_sector(sector)
+        selection.update(range(first, first + blocks_in_sector(sector)))
+    return selection
 
 
 def main():
+    # Range options may be given anywhere, the rest are positional arguments.
+    selection = None
+    for arg in [arg for arg in sys.argv[1:] if arg.startswith('--')]:
+        try:
+            if arg.startswith('--sectors='):
+                selection = (selection or set()) | blocks_of_sectors(parse_ranges(arg[len('--sectors='):]))
+            elif arg.startswith('--blocks='):
+                selection = (selection or set()) | set(parse_ranges(arg[len('--blocks='):]))
+            else:
+                raise ValueError('unknown option')
+        except ValueError as err:
+            print('Error, illegal option %s: %s' % (arg, err))
+            usage(sys.argv[0])
+            exit(-1)
+    sys.argv = [arg for arg in sys.argv if not arg.startswith('--')]
+
     if len(sys.argv) < 5:
         usage(sys.argv[0])
         exit(-1)
@@ -80,6 +129,15 @@ def main():
     key_a = sys.argv[2] in ['a', 'A']
     allow_failure = sys.argv[2] in ['A', 'B']
     key_file = len(sys.argv) > 5
+    guess_keys = GUESS_KEYS
+    if key_file and sys.argv[5].lower().endswith(('.txt', '.dic')):
+        try:
+            guess_keys = load_key_dictionary(sys.argv[5]) + GUESS_KEYS
+            print('%d keys loaded from dictionary %s' % (len(guess_keys) - len(GUESS_KEYS), sys.argv[5]))
+        except IOError as err:
+            print('Could not open key dictionary: %s, err = %s' % (sys.argv[5], err))
+            exit(-1)
+        key_file = False
     force_key_file = len(sys.argv) > 6 and sys.argv[6] == 'f'
 
     if sys.argv[3][0] == 'U':
@@ -99,18 +157,16 @@ def main():
     key_bin = None
     if key_file:
         try:
-            with open(sys.argv[5], 'rb') as key_fp:
-                key_bin = list(key_fp.read())
-                if len(key_bin) < 4:
-                    print("Could not read UID from key file: %s" % sys.argv[5])
-                    exit(-1)
-        except IOError as err:
+            key_bin = Dump.open(sys.argv[5])
+            if key_bin.size < 4:
+                print("Could not read UID from key file: %s" % sys.argv[5])
+                exit(-1)
+        except (IOError, ValueError) as err:
             print('Could not open keys file: %s, err = %s' %
                   (sys.argv[5], err))
             exit(-1)
 
-    port = auto_find_port()
-    mf_reader = MFRC522.MFRC522(dev=port)
+    (mf_reader, port) = connect_reader()
 
     # Welcome message
     print("MFRC522(%s) opened." % port)
@@ -120,77 +176,85 @@ def main():
         print('Error: no tag was found')
         exit(-1)
     (uid, sak, atqa, ats) = card_info
-    if sak & 0x08 == 0:
+    # The magic generation only matters when block 0 may be written or the backdoor is used.
+    card_type = identify(mf_reader, card_info, MAGIC_PROBES if action_write or unlock else [])
+    if card_type.family != CLASSIC:
         print('Warning: tag is probably not a MFC!')
     if key_file:
-        if uid != key_bin[:4]:
+        if uid != list(key_bin.uid()):
             print_hex(
-                "Expected MIFARE Classic card with UID starting as: ", key_bin[:4])
+                "Expected MIFARE Classic card with UID starting as: ", key_bin.uid())
             print_hex(
                 "Got card with UID starting as:                     ", uid)
             if not force_key_file:
                 print("Aborting!")
                 exit(-1)
     print_hex('Found MIFARE Classic card: ', uid)
-    # Guess size.
-    if atqa[1] & 0x02 == 0x02 or sak == 0x18:
-        # 4K
-        blocks = 0xff
-    elif sak == 0x09:
-        # 320b
-        blocks = 0x13
-    else:
-        # 1K/2K, checked through RATS
-        blocks = 0x3f
-    # Testing RATS
-    magic2 = False
-    if ats != None:
-        if len(ats) > 10 and ats[5:9] == [0xc1, 0x05, 0x2f, 0x2f] and (atqa[1] & 0x02 == 0):
-            # MIFARE Plus 2K
-            blocks = 0x7f
-        elif len(ats) == 9 and ats[5:9] == [0xda, 0xbc, 0x19, 0x10]:
-            #  // Chinese magic emulation card, ATS=0978009102:dabc1910
-            magic2 = True
+    print('Card type: %s' % card_type.name)
+    blocks = card_type.blocks if card_type.blocks is not None else 0x3f
+    magic2 = card_type.magic in DIRECT_WRITE
+    if unlock and not magic2 and card_type.magic != GEN1A:
+        print('Error: the card has no gen1a backdoor, it can not be read or written unlocked')
+        exit(-1)
     print('Guessing size: seems to be a %lu-byte card' % ((blocks + 1) * 16))
 
     if key_file:
-        if len(key_bin) != (blocks + 1) * 16:
+        if key_bin.size != (blocks + 1) * 16:
             print('Could not read key file: %s, should %d vs %d' %
-                  (sys.argv[5], (blocks + 1) * 16, len(key_bin)))
+                  (sys.argv[5], (blocks + 1) * 16, key_bin.size))
             exit(-1)
 
+    if selection is not None:
+        if max(selection) > blocks:
+            print('Error: block 0x%02x selected, the card has only %d blocks' % (max(selection), blocks + 1))
+            exit(-1)
+        selection = set(selection)
+
     dump_bin = None
+    if selection is not None and not action_write and os.path.exists(sys.argv[4]):
+        # Partial read, keep the blocks of the existing dump that are not read again.
+        try:
+            with Dump.open(sys.argv[4]) as old_dump:
+                if old_dump.size == (blocks + 1) * 16:
+                    dump_bin = Dump(bytearray(old_dump.data), meta=old_dump.meta)
+                    print('Merging into existing dump: %s' % sys.argv[4])
+                else:
+                    print('Existing dump %s has %d bytes, not merged' % (sys.argv[4], old_dump.size))
+        except (IOError, ValueError) as err:
+            print('Could not open dump file: %s, err = %s' % (sys.argv[4], err))
+            exit(-1)
     if action_write:
         try:
-            with open(sys.argv[4], 'rb') as dump_fp:
-                dump_bin = list(dump_fp.read((blocks + 1) * 16))
-                if len(dump_bin) != (blocks + 1) * 16:
-                    print('Could not read key file: %s, should %d vs %d' %
-                          (sys.argv[4], (blocks + 1) * 16, len(dump_bin)))
-                    exit(-1)
-        except IOError as err:
+            dump_bin = Dump.open(sys.argv[4])
+            if dump_bin.size < (blocks + 1) * 16:
+                print('Could not read key file: %s, should %d vs %d' %
+                      (sys.argv[4], (blocks + 1) * 16, dump_bin.size))
+                exit(-1)
+        except (IOError, ValueError) as err:
             print('Could not open dump file: %s, err = %s' %
                   (sys.argv[4], err))
             exit(-1)
 
     # Begin the real work.
     if not action_write:
-        (success, dump_bin) = read_card(mf_reader, uid, unlock, key_bin, magic2, blocks, key_a, allow_failure, no_auth)
+        (success, dump_bin) = read_card(mf_reader, uid, unlock, key_bin, magic2, blocks, key_a, allow_failure, no_auth, guess_keys,
+                                       selection, dump_bin)
         if success:
             print('Writing data to file: %s ...' % sys.argv[4], end='', flush=True)
             try:
-                with open(sys.argv[4], 'wb') as dump_fp:
-                    write_cnt = dump_fp.write(bytearray(dump_bin))
-                    if write_cnt != (blocks + 1) * 16:
-                        print('Could not write to file: %s, should %d vs %d' % (sys.argv[4], (blocks + 1) * 16, write_cnt))
-                        success = False
-                    else:
-                        print('Done.')
+                card = {'UID': ''.join(['%02X' % x for x in uid]), 'ATQA': '%02X%02X' % (atqa[1], atqa[0]), 'SAK': '%02X' % sak}
+                write_cnt = dump_bin.save(sys.argv[4], {'Card': card})
+                if write_cnt != (blocks + 1) * 16:
+                    print('Could not write to file: %s, should %d vs %d' % (sys.argv[4], (blocks + 1) * 16, write_cnt))
+                    success = False
+                else:
+                    print('Done.')
             except IOError as err:
                 print('Could not open dump file: %s, err = %s' % (sys.argv[4], err))
                 success = False
     else:
-        success = write_card(mf_reader, uid, unlock, key_bin, magic2, blocks, key_a, allow_failure, dump_bin, format_card, no_auth)
+        success = write_card(mf_reader, uid, unlock, key_bin, magic2, blocks, key_a, allow_failure, dump_bin, format_card, no_auth,
+                             guess_keys, selection)
 
     mf_reader.MFRC522_HaltA()
     mf_reader.MFRC522_StopCrypto1()
@@ -218,18 +282,14 @@ def get_trailer_block(block):
         return block + (15 - (block % 16))
 
 
-def auth_card(mf_reader: MFRC522, uid, key_bin, block, key_a, format):
+def auth_card(mf_reader: MFRC522, uid, key_bin, block, key_a, format, guess_keys=GUESS_KEYS):
     cmd = mf_reader.PICC_AUTHENT1A if key_a else mf_reader.PICC_AUTHENT1B
     if key_bin is not None:
-        trailer_block = get_trailer_block(block)
-        if key_a:
-            key = key_bin[trailer_block * 16 : (trailer_block * 16) + 6]
-        else:
-            key = key_bin[(trailer_block * 16) + 10 : (trailer_block * 16) + 16]
+        key = key_bin.key_a(block) if key_a else key_bin.key_b(block)
         if mf_reader.MFRC522_Auth(cmd, block, key, uid) == mf_reader.MI_OK:
             return True, key
     if format or key_bin is None:
-        for key in GUESS_KEYS:
+        for key in guess_keys:
             if mf_reader.MFRC522_Auth(cmd, block, key, uid) == mf_reader.MI_OK:
                 return True, key
             # Try to anticol again.
@@ -252,7 +312,15 @@ def print_success_or_failure(failure, success_blocks):
     return success_blocks
 
 
-def read_card(mf_reader, uid, read_unlock, key_bin, magic2, blocks, key_a, allow_failure, no_auth):
+def print_skipped():
+    # Access bits do not allow the operation with any known key.
+    print('-', end='', flush=True)
+
+
+def read_card(mf_reader, uid, read_unlock, key_bin, magic2, blocks, key_a, allow_failure, no_auth, guess_keys=GUESS_KEYS,
+              selection=None, dump_bin=None):
+    # selection is the set of blocks to read (all when None), only their sectors are authenticated.
+    # The blocks read are stored into dump_bin, the other blocks of it are left as they are.
     if read_unlock:
         if magic2:
             print('Note: This card does not require an unlocked write (R)')
@@ -264,24 +332,40 @@ def read_card(mf_reader, uid, read_unlock, key_bin, magic2, blocks, key_a, allow
             else:
                 return False, None
 
-    print('Reading out %d blocks |' % (blocks + 1), end='', flush=True)
+    plans = None
+    if key_bin and not read_unlock and not no_auth:
+        # Keys and access bits are known, choose the key of every sector from them.
+        plans = plan_from_dump(key_bin, 'read')
+
+    # Read the card from end to begin
+    selected = [block for block in range(blocks, -1, -1) if selection is None or block in selection]
+    print('Reading out %d blocks |' % len(selected), end='', flush=True)
 
     failure = False
-    dump_bin = []
+    if dump_bin is None:
+        dump_bin = Dump.blank(blocks)
     success_blocks = 0
-    # Read the card from end to begin
-    for block in range(blocks, -1, -1):
-        # Authenticate everytime we reach a trailer block
-        if is_trailer_block(block):
+    current_sector = None
+    for block in selected:
+        sector = sector_of_block(block)
+        plan = plans[sector] if plans else None
+        if plan is not None and block not in plan.blocks:
+            print_skipped()
+            continue
+        # Authenticate everytime we reach a new sector
+        if sector != current_sector:
+            current_sector = sector
             if failure:
                 # When a failure occured we need to redo the anti-collision
                 (success, _) = anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
                 if not success:
                     print('!\nError: tag was removed')
                     return False, None
+                failure = False
 
+            sector_key_a = key_a if plan is None else plan.key_letter == 'A'
             if not read_unlock and not no_auth:
-                (success, key) = auth_card(mf_reader, uid, key_bin, block, key_a, False)
+                (success, key) = auth_card(mf_reader, uid, key_bin, block, sector_key_a, False, guess_keys)
                 if not success:
                     print('!\nError: authentication failed for block 0x%02x' % block)
                     return False, None
@@ -289,25 +373,29 @@ def read_card(mf_reader, uid, read_unlock, key_bin, magic2, blocks, key_a, allow
                 # Try to collect as default key.
                 key = DEFAULT_KEY
 
-            (status, data) = mf_reader.MFRC522_Read(block)
+        if is_trailer_block(block):
+            (status, data) = mf_reader.MFRC522_ReadBlock(block)
             if status == mf_reader.MI_OK:
-                # We read in reverse order, so we append data in front of last data.
+                trailer = dump_bin.block(block)
+                trailer[:] = data
+                # Keys read back as zeros, fill in the ones we know.
                 if read_unlock:
-                    dump_bin = data[1] + dump_bin
+                    pass
                 elif key_bin:
-                    dump_bin = (key_bin[block * 16 : (block * 16) + 6] + data[1][6:10] + key_bin[(block * 16) + 10 : (block * 16) + 16]) + dump_bin
+                    trailer[0:6] = key_bin.key_a(block)
+                    trailer[10:16] = key_bin.key_b(block)
                 else:
-                    dump_bin = ((key if key_a else DEFAULT_KEY) + data[1][6:10] + (DEFAULT_KEY if key_a else key)) + dump_bin
+                    trailer[0:6] = bytes(key if sector_key_a else DEFAULT_KEY)
+                    trailer[10:16] = bytes(DEFAULT_KEY if sector_key_a else key)
             else:
                 print('!\nfailed to read trailer block 0x%02x' % block)
                 failure = True
         else:
             # Make sure a earlier readout did not fail
             if not failure:
-                (status, data) = mf_reader.MFRC522_Read(block)
+                (status, data) = mf_reader.MFRC522_ReadBlock(block)
                 if status == mf_reader.MI_OK:
-                    # We read in reverse order, so we append data in front of last data.
-                    dump_bin = data[1] + dump_bin
+                    dump_bin.block(block)[:] = data
                 else:
                     print('!\nError: unable to read block 0x%02x' % block)
                     failure = True
@@ -316,45 +404,81 @@ def read_card(mf_reader, uid, read_unlock, key_bin, magic2, blocks, key_a, allow
         if not allow_failure and failure:
             return False, None
     print('|')
-    print('Done, %d of %d blocks read.' % (success_blocks, blocks + 1))
-    
+    print('Done, %d of %d blocks read.' % (success_blocks, len(selected)))
+
     return True, dump_bin
 
 
-def write_card(mf_reader, uid, write_block_zero, key_bin, magic2, blocks, key_a, allow_failure, dump_bin, format_card, no_auth):
+def write_card_unlocked(mf_reader, blocks, dump_bin, selection=None):
+    selected = [block for block in range(0, blocks+1) if selection is None or block in selection]
+    data = dump_bin.block(0)
+    if 0 in selected and data[0] ^ data[1] ^ data[2] ^ data[3] ^ data[4] != 0x0:
+        print('Error: incorrect BCC in MFD file!')
+        print('Expecting BCC=%02X' % (data[0] ^ data[1] ^ data[2] ^ data[3]))
+        return False
+
+    print('Writing %d blocks unlocked ...' % len(selected), end='', flush=True)
+    mf_reader.MFRC522_HaltA()
+    (status, failed) = mf_reader.MFRC522_BackdoorWriteBlocks([(block, dump_bin.block(block)) for block in selected])
+    if status != mf_reader.MI_OK:
+        print('!\nError: %d blocks not written, first failed block 0x%02x' % (len(failed), failed[0]))
+        return False
+    print('Done, %d of %d blocks written.' % (len(selected), len(selected)))
+    return True
+
+
+def write_card(mf_reader, uid, write_block_zero, key_bin, magic2, blocks, key_a, allow_failure, dump_bin, format_card, no_auth,
+               guess_keys=GUESS_KEYS, selection=None):
+    # selection is the set of blocks to write (all when None), only their sectors are authenticated.
     if write_block_zero:
         if magic2:
             print('Note: This card does not require an unlocked write (W)')
             write_block_zero = False
         else:
-            mf_reader.MFRC522_HaltA()
-            if mf_reader.MFRC522_OpenUidBackdoor():
-                print("Card unlocked!")
-            else:
-                return False
+            # Unlock once and stream the whole image through the backdoor.
+            return write_card_unlocked(mf_reader, blocks, dump_bin, selection)
+
+    plans = None
+    if key_bin and not write_block_zero and not no_auth:
+        plans = plan_from_dump(key_bin, 'write')
 
-    print('Writing %d blocks |' % (blocks + 1), end='', flush=True)
+    selected = [block for block in range(0, blocks+1) if selection is None or block in selection]
+    print('Writing %d blocks |' % len(selected), end='', flush=True)
 
     failure = False
     success_blocks = 0
-    for block in range(0, blocks+1):
-        if is_first_block(block):
+    current_sector = None
+    for block in selected:
+        sector = sector_of_block(block)
+        plan = plans[sector] if plans else None
+        if sector != current_sector:
+            current_sector = sector
             if failure:
                 (success, _) = anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
                 if not success:
                     print('!\nError: tag was removed')
                     return False
+                failure = False
+
+            if plan is not None and plan.key_letter is None:
+                # No known key may write to this sector, do not waste an authentication.
+                pass
+            elif not write_block_zero and not no_auth:
+                sector_key_a = key_a if plan is None else plan.key_letter == 'A'
+                if not auth_card(mf_reader, uid, key_bin, block, sector_key_a, format_card, guess_keys)[0] and not allow_failure:
+                    print('!\nError: authentication failed for block 0x%02x' % block)
+                    return False
 
-            if not write_block_zero and not no_auth and not auth_card(mf_reader, uid, key_bin, block, key_a, format_card) and not allow_failure:
-                print('!\nError: authentication failed for block 0x%02x' % block)
-                return False
+        if plan is not None and block not in plan.blocks:
+            print_skipped()
+            continue
 
         if is_trailer_block(block):
             if format_card:
                 # Copy the default key and reset the access bits
                 trailer = DEFAULT_KEY + DEFAULT_ACL + DEFAULT_KEY
             else:
-                trailer = dump_bin[block*16 : (block+1)*16]
+                trailer = dump_bin.block(block)
             # Try to write the trailer
             if mf_reader.MFRC522_Write(block, trailer) != mf_reader.MI_OK:
                 print('failed to write trailer block %d' % block, end='', flush=True)
@@ -368,7 +492,7 @@ def write_card(mf_reader, uid, write_block_zero, key_bin, magic2, blocks, key_a,
                 if format_card and block:
                     data = [0x00] * 16
                 else:
-                    data = dump_bin[block*16 : (block+1)*16]
+                    data = dump_bin.block(block)
                 if block == 0:
                     if data[0] ^ data[1] ^ data[2] ^ data[3] ^ data[4] != 0x0 and not magic2:
                         print('!\nError: incorrect BCC in MFD file!')
@@ -381,10 +505,31 @@ def write_card(mf_reader, uid, write_block_zero, key_bin, magic2, blocks, key_a,
         if not allow_failure and failure:
             return False
     print('|')
-    print('Done, %d of %d blocks written.' % (success_blocks, blocks + 1))
-    
+    print('Done, %d of %d blocks written.' % (success_blocks, len(selected)))
+
     return True
 
 
+def read_sectors(mf_reader, uid, sectors, blocks, key_a=True, key_bin=None, dump_bin=None, allow_failure=False,
+                 guess_keys=GUESS_KEYS):
+    """Read only the given sectors of the card into dump_bin (a blank image when None)."""
+    return read_card(mf_reader, uid, False, key_bin, False, blocks, key_a, allow_failure, False, guess_keys,
+                     blocks_of_sectors(sectors), dump_bin)
+
+
+def write_sectors(mf_reader, uid, sectors, blocks, dump_bin, key_a=True, key_bin=None, allow_failure=False,
+                  guess_keys=GUESS_KEYS):
+    """Write only the given sectors of dump_bin to the card."""
+    return write_card(mf_reader, uid, False, key_bin, False, blocks, key_a, allow_failure, dump_bin, False, False,
+                      guess_keys, blocks_of_sectors(sectors))
+
+
+def format_sectors(mf_reader, uid, sectors, blocks, key_a=True, key_bin=None, allow_failure=False,
+                   guess_keys=GUESS_KEYS):
+    """Reset data, keys and access bits of the given sectors."""
+    return write_card(mf_reader, uid, False, key_bin, False, blocks, key_a, allow_failure, None, True, False,
+                      guess_keys, blocks_of_sectors(sectors))
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import json
+import mmap
+import os
+import sys
+
+BLOCK_SIZE = 16
+
+# Raw images are memory mapped, the text forms are parsed on first access.
+RAW_EXTENSIONS = ['.mfd', '.bin', '.dump']
+
+
+def first_block_of_sector(sector):
+    if sector < 32:
+        return sector * 4
+    return 128 + (sector - 32) * 16
+
+
+def blocks_in_sector(sector):
+    return 4 if sector < 32 else 16
+
+
+def sector_of_block(block):
+    if block < 128:
+        return block // 4
+    return 32 + (block - 128) // 16
+
+
+def trailer_of_block(block):
+    if block < 128:
+        return block + (3 - (block % 4))
+    return block + (15 - (block % 16))
+
+
+def dump_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.eml':
+        return 'eml'
+    if ext == '.json':
+        return 'json'
+    return 'raw'
+
+
+class Dump:
+    """MIFARE Classic image with block, sector and trailer views.
+
+    Views are memoryview slices of the backing buffer, nothing is copied. Raw
+    .mfd/.bin images are memory mapped, .eml and .json dumps are only parsed
+    when their data is first touched.
+    """
+
+    def __init__(self, data=None, path=None, meta=None, loader=None):
+        self._data = data
+        self._view = None
+        self._loader = loader
+        self._mmap = None
+        self._fp = None
+        self.path = path
+        self.meta = meta if meta is not None else {}
+
+    @classmethod
+    def blank(cls, blocks):
+        # blocks is the last block number, as used by the tools.
+        return cls(bytearray((blocks + 1) * BLOCK_SIZE))
+
+    @classmethod
+    def open(cls, path, writable=False):
+        fmt = dump_format(path)
+        if fmt == 'eml':
+            return cls(path=path, loader=lambda dump: load_eml(path))
+        if fmt == 'json':
+            return cls(path=path, loader=lambda dump: load_json(path, dump.meta))
+
+        dump = cls(path=path)
+        dump._fp = open(path, 'r+b' if writable else 'rb')
+        if os.fstat(dump._fp.fileno()).st_size == 0:
+            dump._data = bytearray()
+        else:
+            dump._mmap = mmap.mmap(dump._fp.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            dump._data = dump._mmap
+        return dump
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._loader(self)
+        return self._data
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = memoryview(self.data)
+        return self._view
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def last_block(self):
+        return self.size // BLOCK_SIZE - 1
+
+    def __len__(self):
+        return self.size
+
+    def block(self, block):
+        return self.view[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+
+    def blocks(self, first, last):
+        return self.view[first * BLOCK_SIZE:(last + 1) * BLOCK_SIZE]
+
+    def sector(self, sector):
+        first = first_block_of_sector(sector)
+        return self.blocks(first, first + blocks_in_sector(sector) - 1)
+
+    def trailer(self, block):
+        # Trailer of the sector holding block.
+        return self.block(trailer_of_block(block))
+
+    def key_a(self, block):
+        return self.trailer(block)[0:6]
+
+    def access_bits(self, block):
+        return self.trailer(block)[6:10]
+
+    def key_b(self, block):
+        return self.trailer(block)[10:16]
+
+    def uid(self):
+        return self.view[0:4]
+
+    def save(self, path, meta=None):
+        fmt = dump_format(path)
+        if meta is not None:
+            self.meta.update(meta)
+        if fmt == 'eml':
+            return save_eml(path, self.view)
+        if fmt == 'json':
+            return save_json(path, self.view, self.meta)
+        with open(path, 'wb') as fp:
+            return fp.write(self.view)
+
+    def flush(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A block view is still held by the caller, the map goes with it.
+                pass
+            self._mmap = None
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def hex_to_bytes(text):
+    # Unknown bytes are written as '--' by some tools.
+    return bytes.fromhex(text.replace('-', '0'))
+
+
+def load_eml(path):
+    data = bytearray()
+    with open(path, 'r') as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                data += hex_to_bytes(line)
+    return data
+
+
+def save_eml(path, view):
+    with open(path, 'w') as fp:
+        for i in range(0, len(view), BLOCK_SIZE):
+            fp.write(view[i:i + BLOCK_SIZE].hex().upper() + '\n')
+    return len(view)
+
+
+def load_json(path, meta):
+    with open(path, 'r') as fp:
+        content = json.load(fp)
+    blocks = content.get('blocks', {}) if isinstance(content, dict) else None
+    if not isinstance(blocks, dict) or not all(isinstance(text, str) for text in blocks.values()):
+        raise ValueError('not a dump')
+    # Sized by the highest block, blocks missing from a partial dump stay zero.
+    data = bytearray((max([int(block) for block in blocks], default=-1) + 1) * BLOCK_SIZE)
+    for (block, text) in blocks.items():
+        block_data = hex_to_bytes(text)
+        if int(block) < 0 or len(block_data) != BLOCK_SIZE:
+            raise ValueError('not a dump')
+        data[int(block) * BLOCK_SIZE:(int(block) + 1) * BLOCK_SIZE] = block_data
+    meta.update({k: v for (k, v) in content.items() if k != 'blocks'})
+    return data
+
+
+def save_json(path, view, meta):
+    content = {'Created': 'MFRC522-UART-Libnfc-Tools', 'FileType': 'mfcard'}
+    content.update(meta)
+    content['blocks'] = {str(i // BLOCK_SIZE): view[i:i + BLOCK_SIZE].hex().upper() for i in range(0, len(view), BLOCK_SIZE)}
+    with open(path, 'w') as fp:
+        json.dump(content, fp, indent=2)
+    return len(view)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print('Usage: %s <in.mfd|in.eml|in.json> <out.mfd|out.eml|out.json>' % sys.argv[0])
+        exit(-1)
+    try:
+        with Dump.open(sys.argv[1]) as dump:
+            dump.save(sys.argv[2])
+            print('Converted %d blocks from %s to %s' % (dump.last_block + 1, sys.argv[1], sys.argv[2]))
+    except (IOError, ValueError) as err:
+        print('Could not convert %s, err = %s' % (sys.argv[1], err))
+        exit(-1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import getopt
+import os
+import re
+import sqlite3
+import sys
+from MFDump import Dump, first_block_of_sector, blocks_in_sector
+
+DEFAULT_INDEX = 'mfindex.db'
+
+DUMP_EXTENSIONS = ['.mfd', '.bin', '.dump', '.eml', '.json']
+
+# Mini, 1K, 2K and 4K images.
+DUMP_SIZES = {320: 5, 1024: 16, 2048: 32, 4096: 40}
+
+KEY_REGEX = '([0-9A-Fa-f]{12})'
+
+# Files indexed between commits, an aborted scan keeps what it has done.
+COMMIT_INTERVAL = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dumps (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    uid TEXT NOT NULL,
+    manufacturer TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trailers (
+    dump_id INTEGER NOT NULL REFERENCES dumps(id) ON DELETE CASCADE,
+    sector INTEGER NOT NULL,
+    key_a TEXT NOT NULL,
+    key_b TEXT NOT NULL,
+    acl TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rejected (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dumps_uid ON dumps(uid);
+CREATE INDEX IF NOT EXISTS trailers_dump ON trailers(dump_id);
+CREATE INDEX IF NOT EXISTS trailers_key_a ON trailers(sector, key_a);
+CREATE INDEX IF NOT EXISTS trailers_key_b ON trailers(sector, key_b);
+'''
+
+
+def usage(program_name):
+    print('Usage: %s [-i index.db] scan|uid|keys|export ...' % program_name)
+    print('  scan <dir>                       - index new and changed dumps under dir, forget deleted ones')
+    print('  uid <01ab23cd>                   - list dumps whose UID starts with the given bytes')
+    print('  keys [-s 1,2] [-m 1:a0a1a2a3a4a5] [-n 20]')
+    print('                                   - most frequent keys, optionally only for some sectors (-s)')
+    print('                                     and only from dumps having the given key in a sector (-m)')
+    print('  export <keys.txt> [-s ..] [-m ..] - write a frequency ordered key dictionary, usable with')
+    print('                                     Mfoc -f and as <keys> file of MFClassic')
+    print('Examples:')
+    print('  %s scan dumps/' % program_name)
+    print('  %s keys -m 1:a0a1a2a3a4a5' % program_name)
+    print('  %s export keys.txt -s 1,2,3' % program_name)
+
+
+def open_index(path):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA foreign_keys = ON')
+    db.executescript(SCHEMA)
+    return db
+
+
+def key_hex(view):
+    return bytes(view).hex()
+
+
+def reject_dump(db, path, stat):
+    # Remembered with mtime and size, so it is only read again once it changes.
+    # Rows a failed index_dump got to insert are dropped.
+    db.execute('DELETE FROM dumps WHERE path = ?', (path,))
+    db.execute('INSERT OR REPLACE INTO rejected (path, mtime, size) VALUES (?, ?, ?)',
+               (path, stat.st_mtime, stat.st_size))
+
+
+def index_dump(db, path, stat):
+    # What an earlier version of the file left is gone, whether this one is indexed or not.
+    db.execute('DELETE FROM dumps WHERE path = ?', (path,))
+    db.execute('DELETE FROM rejected WHERE path = ?', (path,))
+    with Dump.open(path) as dump:
+        num_sectors = DUMP_SIZES.get(dump.size)
+        if num_sectors is None:
+            reject_dump(db, path, stat)
+            return False
+        cur = db.execute('INSERT INTO dumps (path, mtime, size, uid, manufacturer) VALUES (?, ?, ?, ?, ?)',
+                         (path, stat.st_mtime, stat.st_size, key_hex(dump.uid()), key_hex(dump.block(0))))
+        dump_id = cur.lastrowid
+        rows = []
+        for sector in range(num_sectors):
+            trailer = first_block_of_sector(sector) + blocks_in_sector(sector) - 1
+            rows.append((dump_id, sector, key_hex(dump.key_a(trailer)), key_hex(dump.key_b(trailer)),
+                         key_hex(dump.access_bits(trailer))))
+        db.executemany('INSERT INTO trailers (dump_id, sector, key_a, key_b, acl) VALUES (?, ?, ?, ?, ?)', rows)
+    return True
+
+
+def scan(db, root):
+    # Only files whose mtime or size changed since the last scan are read again.
+    known = {path: (mtime, size) for (path, mtime, size) in
+             db.execute('SELECT path, mtime, size FROM dumps UNION ALL SELECT path, mtime, size FROM rejected')}
+    root = os.path.abspath(root)
+    seen = set()
+    added = 0
+    skipped = 0
+    pending = 0
+    for (dir_path, _, file_names) in os.walk(root):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1].lower() not in DUMP_EXTENSIONS:
+                continue
+            path = os.path.join(dir_path, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            seen.add(path)
+            if known.get(path) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                if index_dump(db, path, stat):
+                    added += 1
+                else:
+                    skipped += 1
+            except IOError as err:
+                # Could be passing, e.g. permissions, tried again next scan.
+                print('Skip %s, err = %s' % (path, err))
+                db.execute('DELETE FROM dumps WHERE path = ?', (path,))
+                skipped += 1
+            except Exception as err:
+                # Whatever a broken file raises, it must not throw the scan away.
+                print('Skip %s, err = %s' % (path, err))
+                reject_dump(db, path, stat)
+                skipped += 1
+            pending += 1
+            if pending == COMMIT_INTERVAL:
+                db.commit()
+                pending = 0
+    removed = [path for path in known if path.startswith(root + os.sep) and path not in seen]
+    db.executemany('DELETE FROM dumps WHERE path = ?', [(path,) for path in removed])
+    db.executemany('DELETE FROM rejected WHERE path = ?', [(path,) for path in removed])
+    db.commit()
+    return added, len(removed), skipped
+
+
+def parse_sectors(text):
+    return [int(x) for x in text.split(',') if x]
+
+
+def parse_match(text):
+    # sector:key hint, e.g. 1:a0a1a2a3a4a5
+    (sector, key) = text.split(':')
+    if re.fullmatch(KEY_REGEX, key) is None:
+        raise ValueError('illegal key %s' % key)
+    return int(sector), key.lower()
+
+
+def matching_dumps_sql(matches):
+    # Dumps having every hinted key (as key A or key B) in the hinted sector.
+    sql = 'SELECT id FROM dumps'
+    args = []
+    for (sector, key) in matches:
+        sql += ' INTERSECT SELECT dump_id FROM trailers WHERE sector = ? AND (key_a = ? OR key_b = ?)'
+        args += [sector, key, key]
+    return sql, args
+
+
+def find_uid(db, uid):
+    return db.execute('SELECT path, uid, manufacturer FROM dumps WHERE uid LIKE ? ORDER BY mtime DESC',
+                      (uid.lower() + '%',)).fetchall()
+
+
+def frequent_keys(db, sectors=None, matches=None, limit=None):
+    (dump_sql, args) = matching_dumps_sql(matches or [])
+    where = 'dump_id IN (%s)' % dump_sql
+    if sectors:
+        where += ' AND sector IN (%s)' % ','.join(['?'] * len(sectors))
+        args += sectors
+    sql = ('SELECT key, COUNT(*) AS hits FROM ('
+           'SELECT key_a AS key, dump_id, sector FROM trailers WHERE %s '
+           'UNION ALL SELECT key_b AS key, dump_id, sector FROM trailers WHERE %s) '
+           'GROUP BY key ORDER BY hits DESC, key' % (where, where))
+    args = args + args
+    if limit:
+        sql += ' LIMIT ?'
+        args.append(limit)
+    return db.execute(sql, args).fetchall()
+
+
+def count_dumps(db, matches):
+    (dump_sql, args) = matching_dumps_sql(matches or [])
+    return db.execute('SELECT COUNT(*) FROM (%s)' % dump_sql, args).fetchone()[0]
+
+
+def export_keys(db, path, sectors=None, matches=None):
+    keys = frequent_keys(db, sectors, matches)
+    with open(path, 'w') as fp:
+        for (key, hits) in keys:
+            fp.write('%s  # %d\n' % (key, hits))
+    return len(keys)
+
+
+def load_key_dictionary(path):
+    # One key per line, first 12 HEX characters, anything after it is ignored.
+    keys = []
+    with open(path, 'r') as fp:
+        for line in fp:
+            key_match = re.match(KEY_REGEX, line)
+            if key_match is not None:
+                keys.append(list(bytes.fromhex(key_match.group(1))))
+    return keys
+
+
+def main():
+    try:
+        optlist, args = getopt.getopt(sys.argv[1:], 'hi:')
+    except getopt.GetoptError as err:
+        print(err)
+        usage(sys.argv[0])
+        exit(-1)
+    index_path = DEFAULT_INDEX
+    for (opt_key, opt_value) in optlist:
+        if opt_key == '-i':
+            index_path = opt_value
+        else:
+            usage(sys.argv[0])
+            exit(0)
+    if not args:
+        usage(sys.argv[0])
+        exit(-1)
+
+    command = args[0]
+    try:
+        optlist, args = getopt.gnu_getopt(args[1:], 's:m:n:')
+        sectors = None
+        matches = []
+        limit = 20
+        for (opt_key, opt_value) in optlist:
+            if opt_key == '-s':
+                sectors = parse_sectors(opt_value)
+            elif opt_key == '-m':
+                matches.append(parse_match(opt_value))
+            elif opt_key == '-n':
+                limit = int(opt_value)
+    except (getopt.GetoptError, ValueError) as err:
+        print('Illegal option: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+
+    db = open_index(index_path)
+    if command == 'scan' and len(args) == 1:
+        (added, removed, skipped) = scan(db, args[0])
+        total = db.execute('SELECT COUNT(*) FROM dumps').fetchone()[0]
+        print('Indexed %d new or changed dumps, removed %d, skipped %d, %d dumps in %s' %
+              (added, removed, skipped, total, index_path))
+    elif command == 'uid' and len(args) == 1:
+        for (path, uid, manufacturer) in find_uid(db, args[0]):
+            print('%s  %s  %s' % (uid, manufacturer, path))
+    elif command == 'keys' and len(args) == 0:
+        print('%d dumps match' % count_dumps(db, matches))
+        for (key, hits) in frequent_keys(db, sectors, matches, limit):
+            print('%s  %d' % (key, hits))
+    elif command == 'export' and len(args) == 1:
+        print('Exported %d keys to %s' % (export_keys(db, args[0], sectors, matches), args[0]))
+    else:
+        usage(sys.argv[0])
+        exit(-1)
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import sys
+from dataclasses import dataclass
+from Anticol import anticol, connect_reader
+from CardType import CLASSIC, lookup
+from MFCard import MifareClassicCard
+from MFDump import first_block_of_sector, blocks_in_sector, sector_of_block
+
+# Public key A of the MAD sectors and of the NDEF sectors (NFC Forum Type MIFARE Classic).
+MAD_KEY = [0xa0, 0xa1, 0xa2, 0xa3, 0xa4, 0xa5]
+NFC_FORUM_KEY = [0xd3, 0xf7, 0xd3, 0xf7, 0xd3, 0xf7]
+
+MAD2_SECTOR = 16
+NDEF_AID = 0xE103
+AID_NAMES = {
+    0x0000: 'free',
+    0x0001: 'defect',
+    0x0002: 'reserved',
+    0x0003: 'additional directory info',
+    0x0004: 'card holder info',
+    0x0005: 'not applicable',
+    NDEF_AID: 'NDEF',
+}
+
+TLV_NULL = 0x00
+TLV_NDEF = 0x03
+TLV_TERMINATOR = 0xFE
+
+# NDEF record header flags, the low 3 bits are the TNF.
+NDEF_MB = 0x80
+NDEF_ME = 0x40
+NDEF_CF = 0x20
+NDEF_SR = 0x10
+NDEF_IL = 0x08
+TNF_WELL_KNOWN = 0x01
+TNF_MIME = 0x02
+TNF_URI = 0x03
+TNF_EXTERNAL = 0x04
+
+# URI record identifier codes 0x00..0x23 of the NFC Forum URI RTD.
+URI_PREFIXES = [
+    '', 'http://www.', 'https://www.', 'http://', 'https://', 'tel:', 'mailto:', 'ftp://anonymous:anonymous@',
+    'ftp://ftp.', 'ftps://', 'sftp://', 'smb://', 'nfs://', 'ftp://', 'dav://', 'news:', 'telnet://', 'imap:',
+    'rtsp://', 'urn:', 'pop:', 'sip:', 'sips:', 'tftp:', 'btspp://', 'btl2cap://', 'btgoep://', 'tcpobex://',
+    'irdaobex://', 'file://', 'urn:epc:id:', 'urn:epc:tag:', 'urn:epc:pat:', 'urn:epc:raw:', 'urn:epc:', 'urn:nfc:',
+]
+
+
+@dataclass
+class NdefRecord:
+    tnf: int
+    type: bytes
+    id: bytes
+    payload: bytes
+
+
+def mad_crc(data):
+    # CRC-8 of the MAD, polynomial 0x1D preset 0xC7, over everything after the CRC byte.
+    crc = 0xC7
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1D if crc & 0x80 else crc << 1) & 0xFF
+    return crc
+
+
+def decode_mad(data, first_sector):
+    """AIDs of a MAD1 (32 bytes, sectors 1-15) or MAD2 (48 bytes, sectors 17-39).
+
+    Returns {sector: AID}, raises ValueError when the CRC does not match.
+    """
+    if mad_crc(data[1:]) != data[0]:
+        raise ValueError('MAD CRC %02x, expected %02x' % (data[0], mad_crc(data[1:])))
+    return {first_sector + i: data[2 + 2 * i] | data[3 + 2 * i] << 8 for i in range((len(data) - 2) // 2)}
+
+
+def read_mad(card: MifareClassicCard, sectors):
+    """Read and decode the MAD of a card with that many sectors.
+
+    Only sector 0, and sector 16 for a MAD2, are read. Returns {sector: AID}
+    or None when the card has no MAD.
+    """
+    card.set_key(0, MAD_KEY)
+    data = card.read_blocks([1, 2, 3])
+    if 1 not in data or 2 not in data:
+        return None
+    # General purpose byte of the trailer: MAD available (DA) and its version.
+    gpb = data[3][9] if 3 in data else 0x81
+    if not gpb & 0x80:
+        return None
+    aids = decode_mad(data[1] + data[2], 1)
+    if gpb & 0x03 == 2 and sectors > MAD2_SECTOR:
+        first = first_block_of_sector(MAD2_SECTOR)
+        card.set_key(MAD2_SECTOR, MAD_KEY)
+        data = card.read_blocks(range(first, first + 3))
+        if len(data) != 3:
+            raise IOError('MAD2 sector %d not readable' % MAD2_SECTOR)
+        aids.update(decode_mad(data[first] + data[first + 1] + data[first + 2], MAD2_SECTOR + 1))
+    return {sector: aid for (sector, aid) in aids.items() if sector < sectors}
+
+
+def app_sectors(aids, aid):
+    return sorted([sector for (sector, sector_aid) in aids.items() if sector_aid == aid])
+
+
+def app_data(card: MifareClassicCard, sectors):
+    # Data blocks of the sectors in order, each one read when it is asked for.
+    for sector in sectors:
+        first = first_block_of_sector(sector)
+        for block in range(first, first + blocks_in_sector(sector) - 1):
+            data = card.read_block(block)
+            if data is None:
+                raise IOError('block 0x%02x of sector %d not readable' % (block, sector))
+            yield data
+
+
+class ByteReader:
+    """Bytes taken from an iterator of chunks, a chunk is only fetched when needed."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = b''
+
+    def read(self, n):
+        # None when the chunks ran out before n bytes.
+        while len(self.buf) < n:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return None
+            self.buf += chunk
+        (data, self.buf) = (self.buf[:n], self.buf[n:])
+        return data
+
+
+def read_tlvs(chunks):
+    # (type, value) of the TLVs up to the terminator or the end of the data.
+    reader = ByteReader(chunks)
+    while True:
+        tlv_type = reader.read(1)
+        if tlv_type is None or tlv_type[0] == TLV_TERMINATOR:
+            return
+        if tlv_type[0] == TLV_NULL:
+            continue
+        length = reader.read(1)
+        if length is not None and length[0] == 0xFF:
+            length = reader.read(2)
+        value = reader.read(int.from_bytes(length, 'big')) if length is not None else None
+        if value is None:
+            raise ValueError('TLV %02x runs past the end of the application' % tlv_type[0])
+        yield tlv_type[0], value
+
+
+def read_ndef(card: MifareClassicCard, sectors, key=NFC_FORUM_KEY):
+    """NDEF message of the card, None when it has none.
+
+    Sector 0 is read for the MAD, then the NDEF sectors are read with key A,
+    only as far as the NDEF message TLV reaches.
+    """
+    aids = read_mad(card, sectors)
+    if aids is None:
+        return None
+    ndef_sectors = app_sectors(aids, NDEF_AID)
+    for sector in ndef_sectors:
+        card.set_key(sector, key)
+    for (tlv_type, value) in read_tlvs(app_data(card, ndef_sectors)):
+        if tlv_type == TLV_NDEF:
+            return value
+    return None
+
+
+def parse_ndef(message):
+    # Records of an NDEF message, chunked records are joined.
+    records = []
+    chunked = None
+    pos = 0
+    while pos < len(message):
+        header = message[pos]
+        # Type length, payload length (1 or 4 bytes) and ID length (when IL).
+        lengths = 2 + (1 if header & NDEF_SR else 4) + (1 if header & NDEF_IL else 0)
+        if pos + lengths > len(message):
+            raise ValueError('NDEF record %d is cut off' % len(records))
+        type_length = message[pos + 1]
+        pos += 2
+        if header & NDEF_SR:
+            payload_length = message[pos]
+            pos += 1
+        else:
+            payload_length = int.from_bytes(message[pos:pos + 4], 'big')
+            pos += 4
+        id_length = 0
+        if header & NDEF_IL:
+            id_length = message[pos]
+            pos += 1
+        record_type = bytes(message[pos:pos + type_length])
+        record_id = bytes(message[pos + type_length:pos + type_length + id_length])
+        pos += type_length + id_length
+        payload = bytes(message[pos:pos + payload_length])
+        pos += payload_length
+        if pos > len(message):
+            raise ValueError('NDEF record %d is cut off' % len(records))
+        if chunked is not None:
+            chunked.payload += payload
+        else:
+            records.append(NdefRecord(header & 0x07, record_type, record_id, payload))
+        chunked = records[-1] if header & NDEF_CF else None
+        if header & NDEF_ME:
+            break
+    return records
+
+
+def describe_record(record):
+    if record.tnf == TNF_WELL_KNOWN and record.type == b'U' and record.payload:
+        prefix = URI_PREFIXES[record.payload[0]] if record.payload[0] < len(URI_PREFIXES) else ''
+        return 'URI: %s%s' % (prefix, record.payload[1:].decode('utf-8', 'replace'))
+    if record.tnf == TNF_WELL_KNOWN and record.type == b'T' and record.payload:
+        status = record.payload[0]
+        lang = record.payload[1:1 + (status & 0x3F)].decode('ascii', 'replace')
+        text = record.payload[1 + (status & 0x3F):].decode('utf-16' if status & 0x80 else 'utf-8', 'replace')
+        return 'Text (%s): %s' % (lang, text)
+    if record.tnf == TNF_MIME:
+        return 'MIME %s: %d bytes' % (record.type.decode('ascii', 'replace'), len(record.payload))
+    if record.tnf in [TNF_URI, TNF_EXTERNAL]:
+        return '%s: %s' % (record.type.decode('utf-8', 'replace'), record.payload.hex())
+    return 'TNF %d type %s: %s' % (record.tnf, record.type.hex(), record.payload.hex())
+
+
+def aid_name(aid):
+    return AID_NAMES.get(aid, '%04x' % aid)
+
+
+def usage(program_name):
+    print('Usage: %s [-m] [-a <aid>] [-k <key>]' % program_name)
+    print('  Reads the NDEF message of a MIFARE Classic card, guided by its MAD: sector 0 with the')
+    print('  public MAD key, then only the NDEF sectors as far as the message reaches.')
+    print('  -m         - print the MAD')
+    print('  -a <aid>   - print the data of the application with this AID (4 HEX digits) instead')
+    print('  -k <key>   - key A of the application sectors, default NFC Forum %s' % bytes(NFC_FORUM_KEY).hex())
+
+
+def main():
+    args = sys.argv[1:]
+    show_mad = False
+    aid = None
+    key = None
+    try:
+        while args:
+            if args[0] == '-m':
+                show_mad = True
+                args = args[1:]
+            elif args[0] == '-a' and len(args[1]) == 4:
+                aid = int(args[1], 16)
+                args = args[2:]
+            elif args[0] == '-k' and len(args[1]) == 12:
+                key = list(bytes.fromhex(args[1]))
+                args = args[2:]
+            else:
+                raise ValueError(args[0])
+    except (IndexError, ValueError) as err:
+        print('Illegal argument: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+    (success, card_info) = anticol(mf_reader, print_info=False, no_rats=True)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    card_type = lookup(card_info[1], card_info[2], card_info[3])
+    if card_type.family != CLASSIC:
+        print('Error: %s is no MIFARE Classic' % card_type.name)
+        exit(-1)
+    sectors = sector_of_block(card_type.blocks) + 1
+    card = MifareClassicCard(mf_reader, card_info[0], [key or NFC_FORUM_KEY])
+
+    success = False
+    try:
+        aids = read_mad(card, sectors)
+        if aids is None:
+            print('Error: no MAD in sector 0')
+        elif show_mad:
+            for (sector, sector_aid) in sorted(aids.items()):
+                print('Sector %2d: %s' % (sector, aid_name(sector_aid)))
+            success = True
+        elif aid is not None:
+            app = app_sectors(aids, aid)
+            if not app:
+                print('Error: no sector of application %04x' % aid)
+            for sector in app:
+                print('Sector %2d:' % sector)
+                for data in app_data(card, [sector]):
+                    print('  %s' % data.hex())
+            success = bool(app)
+        else:
+            message = read_ndef(card, sectors, key or NFC_FORUM_KEY)
+            if message is None:
+                print('No NDEF message on the card')
+            else:
+                for record in parse_ndef(message):
+                    print(describe_record(record))
+                success = True
+    except (IOError, ValueError) as err:
+        print('Error: %s' % err)
+    touched = sorted(set([sector_of_block(block) for block in card.cache]))
+    print('%d blocks read in %d of %d sectors (%s)' % (len(card.cache), len(touched), sectors,
+                                                         ' '.join([str(s) for s in touched])))
+    card.halt()
+    exit(0 if success else -1)
+
+
+if __name__ == '__main__':
+    main()
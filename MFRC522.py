@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 
+import os
 import serial
 import signal
+import SerialTrace
 import time
 import sys
 
@@ -12,6 +14,10 @@ class MFRC522:
 
     MAX_LEN = 16
 
+    FIFO_SIZE = 64
+    # Status1Reg.LoAlert/HiAlert fire with this many bytes (or less) left to the FIFO's ends.
+    FIFO_WATER_LEVEL = 32
+
     PCD_IDLE = 0x00
     PCD_MEM = 0x01
     PCD_RNDID = 0x02
@@ -36,12 +42,57 @@ class MFRC522:
     PICC_TRANSFER = 0xB0
     PICC_HALT = 0x50
 
+    # MIFARE Ultralight/NTAG
+    PICC_UL_WRITE = 0xA2
+    PICC_GET_VERSION = 0x60
+    PICC_FAST_READ = 0x3A
+    PICC_PWD_AUTH = 0x1B
+    UL_FAST_READ_PAGES = 15
+
     PICC_ATS = 0xE0
 
     PICC_MIFARE_CLONE_UNLOCK1 = 0x40
     PICC_MIFARE_CLONE_UNLOCK2 = 0x43
     PICC_MIFARE_CLONE_WIPE = 0x41
 
+    # RF bit rates in kbit/s by TxModeReg/RxModeReg speed code, with the
+    # ModWidthReg value for the Miller pulse width at that rate.
+    BIT_RATES = [106, 212, 424, 848]
+    MOD_WIDTHS = [0x26, 0x15, 0x0A, 0x05]
+
+    # SerialSpeedReg value (BR_T0, BR_T1) by UART baud rate, the driver runs at the fastest.
+    SERIAL_SPEEDS = {7200: 0xFA, 9600: 0xEB, 14400: 0xDA, 19200: 0xCB, 38400: 0xAB, 57600: 0x9A,
+                     115200: 0x7A, 128000: 0x74, 230400: 0x5A, 460800: 0x3A, 921600: 0x1C, 1228800: 0x15}
+    SERIAL_BAUD_RATE = 1228800
+
+    # TPrescaler of the chip timer, a tick lasts (2 * TPrescaler + 1) / 13.56 MHz, ~25 us.
+    TIMER_PRESCALER = 0xA9
+
+    # Receive timeouts in ticks of the chip timer (TPrescaler 0xA9, ~25 us).
+    # The timer starts when the frame is sent and stops at the first bit
+    # received, it only limits how long a missing answer is waited for.
+    TIMEOUT_SHORT = 'short'
+    TIMEOUT_MEDIUM = 'medium'
+    TIMEOUT_LONG = 'long'
+    TIMEOUT_PROFILES = {
+        TIMEOUT_SHORT: 40,      # 1 ms, REQA/WUPA, anticollision, SELECT, HALT: answered after ~90 us
+        TIMEOUT_MEDIUM: 240,    # 6 ms, AUTH, READ, RATS: covers the 5.3 ms activation frame waiting time
+        TIMEOUT_LONG: 1000,     # 25 ms, WRITE and value operations, the card programs its EEPROM first
+    }
+
+    # CRC_A of an exchange: whether the frame sent ends with its CRC and
+    # whether the answer does. In CRC offload mode the chip appends the CRC
+    # (TxModeReg.TxCRCEn) and checks and strips the answer's (RxModeReg.RxCRCEn),
+    # the host copy of the frame CRC stays out of the FIFO. Otherwise the host
+    # sends the frame as given and checks the answer's CRC itself. Either way
+    # an answer marked with a CRC comes back without it. CRC_KEEP leaves the
+    # registers as they are, for MFAuthent which builds its frame on the chip.
+    CRC_NONE = (False, False)
+    CRC_TX = (True, False)
+    CRC_BOTH = (True, True)
+    CRC_KEEP = None
+    CRC_OFFLOAD_ENV = 'MFRC522_CRC_OFFLOAD'
+
     MI_OK = 0
     MI_NOTAGERR = 1
     MI_ERR = 2
@@ -104,19 +155,45 @@ class MFRC522:
     TestDAC2Reg = 0x3A
     TestADCReg = 0x3B
 
+    # Single byte frames built once for every register: the read command
+    # (0x80 | addr) and the address the chip echoes after a write.
+    READ_ADDRESS = [bytes([0x80 | addr]) for addr in range(0x40)]
+    WRITE_ECHO = [bytes([addr]) for addr in range(0x40)]
+
+    # Command frames with their CRC by (command, block), see commandFrame().
+    COMMAND_FRAMES = {}
+
     serNum = []
 
-    def __init__(self, dev='/dev/ttyUSB0'):
-        self.ser = serial.Serial(port=dev, baudrate=9600, timeout=0.1)
+    # ser replaces the serial port, e.g. with a SerialTrace.ReplaySerial. trace
+    # records the session to a file, MFRC522_TRACE=<file> does the same for
+    # every port the tools open. timeouts overrides TIMEOUT_PROFILES entries
+    # for this reader, e.g. {'short': 60} for a slow antenna. crc_offload lets
+    # the chip handle CRC_A, MFRC522_CRC_OFFLOAD=1 does the same for all tools.
+    def __init__(self, dev='/dev/ttyUSB0', ser=None, trace=None, timeouts=None, crc_offload=None):
+        if ser is None:
+            ser = serial.Serial(port=dev, baudrate=9600, timeout=0.1)
+            self.ser = SerialTrace.open_traced(ser, trace)
+        else:
+            self.ser = SerialTrace.TraceRecorder(ser, trace) if trace else ser
+        self.timeouts = dict(self.TIMEOUT_PROFILES)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        if crc_offload is None:
+            crc_offload = os.environ.get(self.CRC_OFFLOAD_ENV) == '1'
+        self.crc_offload = crc_offload
         self.reset(spd=1)
         # self.performSelfTest()
-        self.writeRegister(self.TModeReg, 0x80)
-        self.writeRegister(self.TPrescalerReg, 0xA9)
-        self.writeRegister(self.TReloadRegH, 0x03)
-        self.writeRegister(self.TReloadRegL, 0xE8)
+        self.timer_reload = self.timeouts[self.TIMEOUT_LONG]
+        self.timer_prescaler = self.TIMER_PRESCALER
+        self.writeRegister(self.TModeReg, 0x80 | self.TIMER_PRESCALER >> 8)
+        self.writeRegister(self.TPrescalerReg, self.TIMER_PRESCALER & 0xFF)
+        self.writeRegister(self.TReloadRegH, self.timer_reload >> 8)
+        self.writeRegister(self.TReloadRegL, self.timer_reload & 0xFF)
         self.writeRegister(self.TxASKReg, 0x40)
         self.writeRegister(self.ModeReg, 0x3D)
         self.writeRegister(self.TestPinEnReg, 0x00)
+        self.writeRegister(self.WaterLevelReg, self.FIFO_WATER_LEVEL)
         self.antennaOn()
 
     def reset(self, spd=None):
@@ -125,18 +202,21 @@ class MFRC522:
             self.writeRegister(self.CommandReg, self.PCD_RESETPHASE)
             self.ser.baudrate = 9600
             time.sleep(0.05)
-        self.writeRegister(self.SerialSpeedReg, 0x15)
-        self.ser.baudrate = 1228800
+        self.writeRegister(self.SerialSpeedReg, self.SERIAL_SPEEDS[self.SERIAL_BAUD_RATE])
+        self.ser.baudrate = self.SERIAL_BAUD_RATE
+        # TxModeReg and RxModeReg are back to their reset value 0x00.
+        self.crc_mode = self.CRC_NONE
+        self.bit_rate = (0, 0)
 
     def writeRegister(self, addr, val, size=None):
         if size is None:
+            frame = bytes((addr & 0x7F, val))
             count = 0
             while True:
                 self.ser.reset_input_buffer()
-                self.ser.write(bytes([addr & 0x7F]))
-                self.ser.write(bytes([val]))
+                self.ser.write(frame)
                 tmp = self.ser.read(1)
-                if(tmp == bytes([addr])):
+                if(tmp == self.WRITE_ECHO[addr]):
                     return True
                 count += 1
                 if(count > 10):
@@ -157,10 +237,59 @@ class MFRC522:
 
     def readRegister(self, addr):
         self.ser.reset_input_buffer()
-        self.ser.write(bytes([addr | 0x80]))
+        self.ser.write(self.READ_ADDRESS[addr])
         val = self.ser.read(1)
         return ord(val)
 
+    # Switch the UART of chip and host to baud, one of SERIAL_SPEEDS. Returns
+    # whether the chip answers at the new speed, reset() goes back to the default.
+    def setSerialSpeed(self, baud):
+        self.writeRegister(self.SerialSpeedReg, self.SERIAL_SPEEDS[baud])
+        self.ser.baudrate = baud
+        self.ser.reset_input_buffer()
+        self.ser.write(self.READ_ADDRESS[self.SerialSpeedReg])
+        return self.ser.read(1) == bytes((self.SERIAL_SPEEDS[baud],))
+
+    # Pipelined register access, every (addr, val) pair goes out in one serial
+    # write and all the address echoes are collected with one read. val can
+    # also be a run of bytes (bytes, bytearray, list), written one after the
+    # other to the same register, e.g. a FIFO payload.
+    def writeRegisterBurst(self, pairs):
+        frame = bytearray()
+        echo = bytearray()
+        for (addr, val) in pairs:
+            addr &= 0x7F
+            if isinstance(val, int):
+                frame.append(addr)
+                frame.append(val)
+                echo.append(addr)
+                continue
+            run = bytearray(2 * len(val))
+            run[0::2] = self.WRITE_ECHO[addr] * len(val)
+            run[1::2] = val
+            frame += run
+            echo += run[0::2]
+        self.ser.reset_input_buffer()
+        self.ser.write(frame)
+        if self.ser.read(len(echo)) != echo:
+            print("Write register burst error")
+            return False
+        return True
+
+    # Read several registers with one serial write, values in the order of addrs.
+    def readRegisterBurst(self, addrs):
+        self.ser.reset_input_buffer()
+        self.ser.write(bytes([addr | 0x80 for addr in addrs]))
+        return list(self.ser.read(len(addrs)))
+
+    def readFIFOBytes(self, n):
+        self.ser.reset_input_buffer()
+        self.ser.write(self.READ_ADDRESS[self.FIFODataReg] * n)
+        return self.ser.read(n)
+
+    def readFIFO(self, n):
+        return list(self.readFIFOBytes(n))
+
     def setBitMask(self, reg, mask):
         tmp = self.readRegister(reg)
         self.writeRegister(reg, tmp | mask)
@@ -177,23 +306,111 @@ class MFRC522:
     def antennaOff(self):
         self.clearBitMask(self.TxControlReg, 0x03)
 
+    # Speed codes 0..3 index BIT_RATES, tx is reader to card (DR), rx card to reader (DS).
+    # The FWT timer counts in fc units and needs no change.
+    def setBitRate(self, tx, rx):
+        self.bit_rate = (tx, rx)
+        return self.writeRegisterBurst(self.modePairs() + [(self.ModWidthReg, self.MOD_WIDTHS[tx])])
+
+    # TxModeReg/RxModeReg for the cached bit rate and CRC mode, the other bits stay 0.
+    def modePairs(self):
+        return [(self.TxModeReg, self.crc_mode[0] << 7 | self.bit_rate[0] << 4),
+                (self.RxModeReg, self.crc_mode[1] << 7 | self.bit_rate[1] << 4)]
+
+    def setCrcOffload(self, enabled):
+        # The registers follow with the next exchange that has a CRC.
+        self.crc_offload = enabled
+
+    # Frame to put into the FIFO and the register writes for an exchange
+    # marked crc, none when the CRC mode is already set.
+    def crcFrame(self, frame, crc):
+        if crc is self.CRC_KEEP:
+            return frame, []
+        if not self.crc_offload:
+            crc = self.CRC_NONE
+        elif crc[0]:
+            frame = frame[:-2]
+        if crc == self.crc_mode:
+            return frame, []
+        self.crc_mode = crc
+        return frame, self.modePairs()
+
+    # ErrorReg bits that fail an exchange: CRCErr only counts when the chip checks.
+    def errorMask(self, crc):
+        return 0x1F if self.crc_offload and crc and crc[1] else 0x1B
+
+    # Answer of an exchange marked crc, with its CRC checked and stripped by
+    # the host unless the chip already did. Returns (data, bits), None when
+    # the CRC is wrong.
+    def crcAnswer(self, crc, backData, backLen):
+        if not crc or not crc[1] or self.crc_offload:
+            return backData, backLen
+        # The CRC_A over a frame including its own CRC is 0.
+        if backLen < 24 or backLen % 8 or self.crcA(backData):
+            return None
+        return backData[:-2], backLen - 16
+
     def getAntennaGain(self):
-        return self.readRegister((self.RFCfgReg) & (0x07 << 4))
+        return self.readRegister(self.RFCfgReg) & (0x07 << 4)
 
     def setAntennaGain(self, mask):
         if self.getAntennaGain() != mask:
             self.clearBitMask(self.RFCfgReg, (0x07 << 4))
             self.setBitMask(self.RFCfgReg, mask & (0x07 << 4))
 
-    def MFRC522_ToCard(self, command, sendData):
-        backData = []
+    # Receiver gain, threshold and driver conductance, the registers RfTune sweeps.
+    RF_PROFILE_REGISTERS = ['RFCfgReg', 'RxThresholdReg', 'CWGsPReg', 'ModGsPReg']
+
+    def getRfProfile(self):
+        values = self.readRegisterBurst([getattr(self, name) for name in self.RF_PROFILE_REGISTERS])
+        return dict(zip(self.RF_PROFILE_REGISTERS, values))
+
+    def setRfProfile(self, profile):
+        return self.writeRegisterBurst([(getattr(self, name), profile[name]) for name in self.RF_PROFILE_REGISTERS
+                                        if name in profile])
+
+    # TReload writes to switch the timer to reload ticks, none when it is already set.
+    # The lean exchanges put them into their own burst, so a switch costs no round trip.
+    def timerPairs(self, reload):
+        if reload == self.timer_reload:
+            return []
+        self.timer_reload = reload
+        return [(self.TReloadRegH, reload >> 8), (self.TReloadRegL, reload & 0xFF)]
+
+    def setTimerReload(self, reload):
+        pairs = self.timerPairs(reload)
+        return self.writeRegisterBurst(pairs) if pairs else True
+
+    # 12 bit TPrescaler, for waits longer than 65535 ticks of TIMER_PRESCALER,
+    # with the reload in the same burst. The timeout profiles count in ticks of
+    # TIMER_PRESCALER, so it has to be put back.
+    def setTimerPrescaler(self, prescaler, reload=None):
+        pairs = []
+        if prescaler != self.timer_prescaler:
+            self.timer_prescaler = prescaler
+            pairs += [(self.TModeReg, 0x80 | prescaler >> 8), (self.TPrescalerReg, prescaler & 0xFF)]
+        if reload is not None:
+            pairs += self.timerPairs(reload)
+        return self.writeRegisterBurst(pairs) if pairs else True
+
+    def setTimeoutProfile(self, profile):
+        return self.setTimerReload(self.timeouts[profile])
+
+    def setTimeouts(self, timeouts):
+        # Override profiles of this reader, {profile: timer ticks}.
+        self.timeouts.update(timeouts)
+
+    # timeout names the TIMEOUT_PROFILES entry, None keeps the current one.
+    # sendData is any bytes-like or list of ints, the answer comes back as bytes.
+    # crc tells which CRC_A the exchange has, see CRC_NONE.
+    def MFRC522_ToCardBytes(self, command, sendData, timeout=None, crc=CRC_NONE):
+        backData = b''
         backLen = 0
         status = self.MI_ERR
         irqEn = 0x00
         waitIRq = 0x00
         lastBits = None
         n = 0
-        i = 0
 
         if command == self.PCD_AUTHENT:
             irqEn = 0x12
@@ -202,17 +419,21 @@ class MFRC522:
             irqEn = 0x77
             waitIRq = 0x30
 
-        self.writeRegister(self.CommIEnReg, irqEn | 0x80)
+        # A timer or CRC mode switch rides along with the first register write.
+        (sendData, pairs) = self.crcFrame(sendData, crc)
+        if timeout:
+            pairs += self.timerPairs(self.timeouts[timeout])
+        if pairs:
+            self.writeRegisterBurst(pairs + [(self.CommIEnReg, irqEn | 0x80)])
+        else:
+            self.writeRegister(self.CommIEnReg, irqEn | 0x80)
         self.clearBitMask(self.CommIrqReg, 0x80)
         self.setBitMask(self.FIFOLevelReg, 0x80)
 
-        self.writeRegister(self.CommandReg, self.PCD_IDLE)
-
-        while(i < len(sendData)):
-            self.writeRegister(self.FIFODataReg, sendData[i])
-            i = i+1
-
-        self.writeRegister(self.CommandReg, command)
+        # The payload goes into the FIFO with one burst, bracketed by the commands.
+        self.writeRegisterBurst([(self.CommandReg, self.PCD_IDLE),
+                                 (self.FIFODataReg, sendData),
+                                 (self.CommandReg, command)])
 
         if command == self.PCD_TRANSCEIVE:
             self.setBitMask(self.BitFramingReg, 0x80)
@@ -221,13 +442,14 @@ class MFRC522:
         while True:
             n = self.readRegister(self.CommIrqReg)
             i = i - 1
-            if ~((i != 0) and ~(n & 0x01) and ~(n & waitIRq)):
+            # Done, timed out (TimerIRq) or out of polls.
+            if i == 0 or n & 0x01 or n & waitIRq:
                 break
 
         self.clearBitMask(self.BitFramingReg, 0x80)
 
         if i != 0:
-            if (self.readRegister(self.ErrorReg) & 0x1B) == 0x00:
+            if (self.readRegister(self.ErrorReg) & self.errorMask(crc)) == 0x00:
                 status = self.MI_OK
 
                 if n & irqEn & 0x01:
@@ -243,62 +465,175 @@ class MFRC522:
 
                     if n == 0:
                         n = 1
-                    if n > self.MAX_LEN:
-                        n = self.MAX_LEN
-
-                    i = 0
-                    while i < n:
-                        backData.append(self.readRegister(self.FIFODataReg))
-                        i = i + 1
+                    # A CRC the host checks is read on top of the data.
+                    maxLen = self.MAX_LEN + 2 if crc and crc[1] and not self.crc_offload else self.MAX_LEN
+                    if n > maxLen:
+                        n = maxLen
+
+                    backData = self.readFIFOBytes(n)
+                    if status == self.MI_OK:
+                        answer = self.crcAnswer(crc, backData, backLen)
+                        if answer is None:
+                            status = self.MI_ERR
+                        else:
+                            (backData, backLen) = answer
             else:
                 status = self.MI_ERR
 
         return (status, backData, backLen)
 
+    # List answer as the driver has always returned it.
+    def MFRC522_ToCard(self, command, sendData, timeout=None, crc=CRC_NONE):
+        (status, backData, backLen) = self.MFRC522_ToCardBytes(command, sendData, timeout, crc)
+        return (status, list(backData), backLen)
+
+    # Lean transceive used by the bulk paths: FIFO setup, payload and StartSend
+    # go out as one burst, no read-modify-write of CommIrqReg/FIFOLevelReg/BitFramingReg.
+    # timeout names the TIMEOUT_PROFILES entry, None keeps the current one.
+    def MFRC522_TransceiveBytes(self, sendData, txLastBits=0, timeout=None, crc=CRC_NONE):
+        (sendData, pairs) = self.crcFrame(sendData, crc)
+        if timeout:
+            pairs += self.timerPairs(self.timeouts[timeout])
+        pairs += [(self.CommandReg, self.PCD_IDLE),
+                  (self.BitFramingReg, txLastBits),
+                  (self.CommIrqReg, 0x7F),
+                  (self.FIFOLevelReg, 0x80),
+                  (self.FIFODataReg, sendData),
+                  (self.CommandReg, self.PCD_TRANSCEIVE),
+                  (self.BitFramingReg, 0x80 | txLastBits)]
+        if not self.writeRegisterBurst(pairs):
+            return (self.MI_ERR, b'', 0)
+
+        # Wait for RxIRq/IdleIRq, TimerIRq or ErrIRq.
+        i = 100
+        while True:
+            n = self.readRegister(self.CommIrqReg)
+            i = i - 1
+            if i == 0 or n & 0x33:
+                break
+        if i == 0 or not (n & 0x30) or (self.readRegister(self.ErrorReg) & self.errorMask(crc)):
+            return (self.MI_ERR, b'', 0)
+
+        n = self.readRegister(self.FIFOLevelReg)
+        lastBits = self.readRegister(self.ControlReg) & 0x07
+        if n == 0:
+            return (self.MI_NOTAGERR, b'', 0)
+        backLen = (n - 1) * 8 + lastBits if lastBits else n * 8
+        answer = self.crcAnswer(crc, self.readFIFOBytes(n), backLen)
+        if answer is None:
+            return (self.MI_ERR, b'', 0)
+        return (self.MI_OK,) + answer
+
+    def MFRC522_Transceive(self, sendData, txLastBits=0, timeout=None, crc=CRC_NONE):
+        (status, backData, backLen) = self.MFRC522_TransceiveBytes(sendData, txLastBits, timeout, crc)
+        return (status, list(backData), backLen)
+
+    # Transceive frames longer than the FIFO, e.g. ISO-DEP blocks up to 256 bytes.
+    # While sending, the FIFO is refilled each time Status1Reg.LoAlert shows it
+    # ran down to the water level; while receiving it is drained each time
+    # HiAlert shows it filled up to 64 - water level bytes. Both are checked
+    # together with CommIrqReg in one serial round trip per poll. timeout is
+    # the wall clock limit in seconds, the chip's timer still ends the receive.
+    def MFRC522_TransceiveLong(self, sendData, timeout=0.1):
+        room = self.FIFO_SIZE - self.FIFO_WATER_LEVEL
+        rest = sendData[self.FIFO_SIZE:]
+        # The frames carry the CRC of the host, the chip's is turned off.
+        pairs = self.crcFrame(sendData, self.CRC_NONE)[1]
+        pairs += [(self.CommandReg, self.PCD_IDLE),
+                 (self.BitFramingReg, 0x00),
+                 (self.CommIrqReg, 0x7F),
+                 (self.FIFOLevelReg, 0x80)]
+        pairs += [(self.FIFODataReg, sendData[:self.FIFO_SIZE]),
+                  (self.CommandReg, self.PCD_TRANSCEIVE),
+                  (self.BitFramingReg, 0x80)]
+        if not self.writeRegisterBurst(pairs):
+            return (self.MI_ERR, [], 0)
+
+        backData = []
+        deadline = time.monotonic() + timeout
+        while True:
+            (status1, n) = self.readRegisterBurst([self.Status1Reg, self.CommIrqReg])
+            if n & 0x30 and not rest:
+                break
+            if n & 0x01 or time.monotonic() > deadline:
+                return (self.MI_ERR, [], 0)
+            if rest:
+                if status1 & 0x01:
+                    # At most water level bytes left, room for the next chunk.
+                    if not self.writeRegisterBurst([(self.FIFODataReg, rest[:room])]):
+                        return (self.MI_ERR, [], 0)
+                    rest = rest[room:]
+            elif n & 0x40 and status1 & 0x02:
+                # TxIRq, the FIFO now only holds received bytes.
+                backData += self.readFIFO(room)
+
+        (error, n, lastBits) = self.readRegisterBurst([self.ErrorReg, self.FIFOLevelReg, self.ControlReg])
+        if error & 0x1B:
+            return (self.MI_ERR, [], 0)
+        if n:
+            backData += self.readFIFO(n)
+        lastBits &= 0x07
+        if not backData:
+            return (self.MI_NOTAGERR, [], 0)
+        backLen = (len(backData) - 1) * 8 + lastBits if lastBits else len(backData) * 8
+        return (self.MI_OK, backData, backLen)
+
+    # Send a frame without waiting for an answer, e.g. the operand of a value operation.
+    def MFRC522_Transmit(self, sendData, crc=CRC_NONE):
+        (sendData, pairs) = self.crcFrame(sendData, crc)
+        pairs += [(self.CommandReg, self.PCD_IDLE),
+                 (self.BitFramingReg, 0x00),
+                 (self.CommIrqReg, 0x7F),
+                 (self.FIFOLevelReg, 0x80)]
+        pairs += [(self.FIFODataReg, sendData),
+                  (self.CommandReg, self.PCD_TRANSMIT)]
+        if not self.writeRegisterBurst(pairs):
+            return self.MI_ERR
+
+        # The command terminates by itself once the frame is out (IdleIRq).
+        i = 100
+        while True:
+            n = self.readRegister(self.CommIrqReg)
+            i = i - 1
+            if i == 0 or n & 0x11:
+                break
+        return self.MI_OK if n & 0x10 else self.MI_ERR
+
     def MFRC522_Request(self, reqMode):
         status = None
         backBits = None
 
         self.writeRegister(self.BitFramingReg, 0x07)
 
-        sendData = [reqMode]
-        (status, backData, backBits) = self.MFRC522_ToCard(
-            self.PCD_TRANSCEIVE, sendData)
+        (status, backData, backBits) = self.MFRC522_ToCardBytes(
+            self.PCD_TRANSCEIVE, bytes((reqMode,)), timeout=self.TIMEOUT_SHORT, crc=self.CRC_NONE)
 
         if ((status != self.MI_OK) | (backBits != 0x10)):
             status = self.MI_ERR
 
-        return (status, backData, backBits)
+        return (status, list(backData), backBits)
 
-    def MFRC522_RequestATS(self):
-        backData = []
-        buf = []
-        buf.append(self.PICC_ATS)
-        buf.append(0x50)
-        pOut = self.CalulateCRC(buf)
-        buf.append(pOut[0])
-        buf.append(pOut[1])
-        (status, backData, backLen) = self.MFRC522_ToCard(self.PCD_TRANSCEIVE, buf)
+    # fsdi codes the largest frame the reader accepts, 5 = 64 bytes, 8 = 256 bytes.
+    # The ATS comes back as received, with its CRC.
+    def MFRC522_RequestATS(self, fsdi=5):
+        # Not through MFRC522_ToCardBytes, the ATS can be longer than MAX_LEN.
+        (status, backData, backLen) = self.MFRC522_TransceiveBytes(
+            self.commandFrame(self.PICC_ATS, fsdi << 4), timeout=self.TIMEOUT_MEDIUM, crc=self.CRC_TX)
 
         if (status == self.MI_OK):
             # print("ATS: len = %x" % backLen)
-            return status, backData
+            return status, list(backData)
         else:
             return self.MI_ERR, None
 
     def MFRC522_Anticoll(self, cl=0):
-        backData = []
         serNumCheck = 0x0
 
-        serNum = []
-
         self.writeRegister(self.BitFramingReg, 0x00)
 
-        serNum.append(self.PICC_ANTICOLL + 2 * cl)
-        serNum.append(0x20)
-
-        (status, backData, backBits) = self.MFRC522_ToCard(
-            self.PCD_TRANSCEIVE, serNum)
+        (status, backData, backBits) = self.MFRC522_ToCardBytes(
+            self.PCD_TRANSCEIVE, bytes((self.PICC_ANTICOLL + 2 * cl, 0x20)), timeout=self.TIMEOUT_SHORT,
+            crc=self.CRC_NONE)
 
         if(status == self.MI_OK):
             i = 0
@@ -312,17 +647,35 @@ class MFRC522:
             else:
                 status = self.MI_ERR
 
-        return (status, backData)
+        return (status, list(backData))
 
-    # Use host processor to calc CRC.
-    def CalulateCRC(self, pInData):
+    # CRC_A of ISO 14443-3 as an int, sent low byte first.
+    def crcA(self, pInData):
         wCrc = 0x6363
         for bt in pInData:
             bt = (bt ^ (wCrc & 0xff))
             bt = (bt ^ (bt << 4)) & 0xff
             wCrc = (wCrc >> 8) ^ (bt << 8) ^ (bt << 3) ^ (bt >> 4)
+        return wCrc
+
+    # Use host processor to calc CRC.
+    def CalulateCRC(self, pInData):
+        wCrc = self.crcA(pInData)
         return [ wCrc & 0xff, (wCrc >> 8) & 0xff ]
 
+    # frame as bytes with its CRC_A appended.
+    def appendCRC(self, frame):
+        return bytes(frame) + self.crcA(frame).to_bytes(2, 'little')
+
+    # Two byte command frames (READ, WRITE, TRANSFER, value commands, HALT) with
+    # their CRC are the same every time, they are built once and shared.
+    def commandFrame(self, command, blockAddr):
+        frame = self.COMMAND_FRAMES.get((command, blockAddr))
+        if frame is None:
+            frame = self.appendCRC((command, blockAddr))
+            self.COMMAND_FRAMES[(command, blockAddr)] = frame
+        return frame
+
     def CalulateCRCDevice(self, pInData):
         self.clearBitMask(self.DivIrqReg, 0x04)
         self.setBitMask(self.FIFOLevelReg, 0x80)
@@ -344,51 +697,27 @@ class MFRC522:
         return pOutData
 
     def MFRC522_SelectTag(self, serNum, cl=0):
-        backData = []
-        buf = []
-        buf.append(self.PICC_SELECTTAG + 2 * cl)
-        buf.append(0x70)
-        i = 0
-        while i < 5:
-            buf.append(serNum[i])
-            i = i + 1
-        pOut = self.CalulateCRC(buf)
-        buf.append(pOut[0])
-        buf.append(pOut[1])
-        (status, backData, backLen) = self.MFRC522_ToCard(self.PCD_TRANSCEIVE, buf)
+        buf = self.appendCRC(bytes((self.PICC_SELECTTAG + 2 * cl, 0x70)) + bytes(serNum[:5]))
+        (status, backData, backLen) = self.MFRC522_ToCardBytes(self.PCD_TRANSCEIVE, buf, timeout=self.TIMEOUT_SHORT,
+                                                               crc=self.CRC_BOTH)
 
-        if (status == self.MI_OK) and (backLen == 0x18):
+        # SAK, its CRC is already checked and stripped.
+        if (status == self.MI_OK) and (backLen == 0x08):
             # print("SAK: 0x%x" % backData[0])
             return status, backData[0]
         else:
             return self.MI_ERR, None
 
     def MFRC522_Auth(self, authMode, BlockAddr, Sectorkey, serNum):
-        buff = []
-
-        # First byte should be the authMode (A or B)
-        buff.append(authMode)
-
-        # Second byte is the trailerBlock (usually 7)
-        buff.append(BlockAddr)
-
-        # Now we need to append the authKey which usually is 6 bytes of 0xFF
-        i = 0
-        while(i < len(Sectorkey)):
-            buff.append(Sectorkey[i])
-            i = i + 1
-        i = 0
-
-        # Next we append the last 4 bytes of the UID
+        # authMode (A or B), the block, the 6 byte key and the last 4 bytes of the UID.
         # From MF1S50YYX_V1, 10.1.3
         # In general, the input parameter to the MIFARE Classic Authenticate command is the set of 4 bytes retrieved during the 
         # last cascade level from the ISO/IEC 14443-3 Type A anticollision.
-        while(i < 4):
-            buff.append(serNum[len(serNum)-4+i])
-            i = i + 1
+        buff = bytes((authMode, BlockAddr)) + bytes(Sectorkey) + bytes(serNum[len(serNum)-4:])
 
         # Now we start the authentication itself
-        (status, backData, backLen) = self.MFRC522_ToCard(self.PCD_AUTHENT, buff)
+        (status, backData, backLen) = self.MFRC522_ToCardBytes(self.PCD_AUTHENT, buff, timeout=self.TIMEOUT_MEDIUM,
+                                                               crc=self.CRC_KEEP)
 
         # Check if an error occurred
         if status != self.MI_OK:
@@ -404,50 +733,49 @@ class MFRC522:
     def MFRC522_StopCrypto1(self):
         self.clearBitMask(self.Status2Reg, 0x08)
 
-    def MFRC522_Read(self, blockAddr):
-        recvData = []
-        recvData.append(self.PICC_READ)
-        recvData.append(blockAddr)
-        pOut = self.CalulateCRC(recvData)
-        recvData.append(pOut[0])
-        recvData.append(pOut[1])
-        (status, backData, backLen) = self.MFRC522_ToCard(
-            self.PCD_TRANSCEIVE, recvData)
-        msg = {}
+    # Only the first step of an authentication: send the auth command in plain
+    # and return (status, nt) with the 32 bit tag nonce as an int. The tag then
+    # waits for a reader answer that never comes and drops back to idle.
+    def MFRC522_AuthNonce(self, authMode, blockAddr):
+        (status, backData, backLen) = self.MFRC522_TransceiveBytes(self.commandFrame(authMode, blockAddr), 0,
+                                                                   self.TIMEOUT_MEDIUM, self.CRC_TX)
+        if status != self.MI_OK or backLen != 32:
+            return self.MI_ERR, None
+        return self.MI_OK, int.from_bytes(backData, 'big')
+
+    # Returns (status, the 16 bytes of the block as bytes or None).
+    def MFRC522_ReadBlock(self, blockAddr):
+        (status, backData, backLen) = self.MFRC522_ToCardBytes(
+            self.PCD_TRANSCEIVE, self.commandFrame(self.PICC_READ, blockAddr), timeout=self.TIMEOUT_MEDIUM,
+            crc=self.CRC_BOTH)
         if not(status == self.MI_OK):
             print(("Error while reading!"))
-        else:
-            if len(backData) == 16:
-                msg[0] = blockAddr
-                msg[1] = backData
-            else:
-                print("Error byte read out = %d vs 16" % len(backData))
-                status = self.MI_ERR
+        elif len(backData) != 16:
+            print("Error byte read out = %d vs 16" % len(backData))
+            status = self.MI_ERR
+        return status, (backData if status == self.MI_OK else None)
+
+    # Returns (status, {0: blockAddr, 1: data as a list}), msg is empty on errors.
+    def MFRC522_Read(self, blockAddr):
+        (status, backData) = self.MFRC522_ReadBlock(blockAddr)
+        msg = {}
+        if status == self.MI_OK:
+            msg[0] = blockAddr
+            msg[1] = list(backData)
         return status, msg
 
+    # writeData is any bytes-like or list of at least 16 bytes.
     def MFRC522_Write(self, blockAddr, writeData):
-        buff = []
-        buff.append(self.PICC_WRITE)
-        buff.append(blockAddr)
-        crc = self.CalulateCRC(buff)
-        buff.append(crc[0])
-        buff.append(crc[1])
-        (status, backData, backLen) = self.MFRC522_ToCard(
-            self.PCD_TRANSCEIVE, buff)
+        (status, backData, backLen) = self.MFRC522_ToCardBytes(
+            self.PCD_TRANSCEIVE, self.commandFrame(self.PICC_WRITE, blockAddr), timeout=self.TIMEOUT_LONG,
+            crc=self.CRC_TX)
         if not(status == self.MI_OK) or not(backLen == 4) or not((backData[0] & 0x0F) == 0x0A):
             status = self.MI_ERR
 
         if status == self.MI_OK:
-            i = 0
-            buf = []
-            while i < 16:
-                buf.append(writeData[i])
-                i = i + 1
-            crc = self.CalulateCRC(buf)
-            buf.append(crc[0])
-            buf.append(crc[1])
-            (status, backData, backLen) = self.MFRC522_ToCard(
-                self.PCD_TRANSCEIVE, buf)
+            buf = self.appendCRC(bytes(writeData[:16]))
+            (status, backData, backLen) = self.MFRC522_ToCardBytes(
+                self.PCD_TRANSCEIVE, buf, crc=self.CRC_TX)
             if not(status == self.MI_OK) or not(backLen == 4) or not((backData[0] & 0x0F) == 0x0A):
                 print(("Error while writing data"))
                 status = self.MI_ERR
@@ -457,6 +785,121 @@ class MFRC522:
             print("Error while process write cmd")
         return status
 
+    # 4 bit ACK/NAK nibble answered to a frame ending with its CRC, 0 when
+    # nothing came back. The nibble has no CRC.
+    def MFRC522_TransceiveAck(self, frame, timeout=None, crc=CRC_TX):
+        (status, backData, backLen) = self.MFRC522_TransceiveBytes(frame, timeout=timeout, crc=crc)
+        if status != self.MI_OK or backLen != 4:
+            return 0
+        return backData[0] & 0x0F
+
+    def MFRC522_WriteFrames(self, blockAddr, writeData):
+        # Both frames of a MIFARE WRITE with their CRC, built ahead of the exchange.
+        return (self.commandFrame(self.PICC_WRITE, blockAddr), self.appendCRC(bytes(writeData[:16])))
+
+    # Unlock a gen1a card once and stream all blocks back to back, blocks is a
+    # list of (blockAddr, data) tuples. Returns status and the blocks not written.
+    def MFRC522_BackdoorWriteBlocks(self, blocks, format=False):
+        frames = [(addr,) + self.MFRC522_WriteFrames(addr, data) for (addr, data) in blocks]
+        if not self.MFRC522_OpenUidBackdoor(format):
+            return self.MI_ERR, [addr for (addr, _) in blocks]
+
+        acks = bytearray()
+        for (addr, cmd, data) in frames:
+            acks.append(self.MFRC522_TransceiveAck(cmd, self.TIMEOUT_SHORT))
+            acks.append(self.MFRC522_TransceiveAck(data, self.TIMEOUT_LONG) if acks[-1] == 0x0A else 0)
+            if acks[-1] != 0x0A:
+                # A NAK sends the card back to idle, nothing after it will be accepted.
+                break
+
+        # Each block has two ack nibbles, a missing ack means the block was not written.
+        acks += bytes(2 * len(frames) - len(acks))
+        failed = [frames[i][0] for i in range(len(frames)) if acks[2 * i] != 0x0A or acks[2 * i + 1] != 0x0A]
+        return (self.MI_OK if not failed else self.MI_ERR), failed
+
+    def MFRC522_ValueFrames(self, command, blockAddr, operand=0):
+        # Command frame and 4 byte operand frame of INCREMENT/DECREMENT/RESTORE with their CRC.
+        return (self.commandFrame(command, blockAddr), self.appendCRC((operand & 0xFFFFFFFF).to_bytes(4, 'little')))
+
+    def MFRC522_TransferFrame(self, blockAddr):
+        return self.commandFrame(self.PICC_TRANSFER, blockAddr)
+
+    # Load a value block into the card's transfer buffer and apply the operand.
+    # The card does not answer the operand frame, so it is only transmitted.
+    def MFRC522_ValueOperation(self, command, blockAddr, operand=0):
+        (cmd, data) = self.MFRC522_ValueFrames(command, blockAddr, operand)
+        if self.MFRC522_TransceiveAck(cmd, self.TIMEOUT_SHORT) != 0x0A:
+            print("Error while process value cmd")
+            return self.MI_ERR
+        return self.MFRC522_Transmit(data, self.CRC_TX)
+
+    def MFRC522_Increment(self, blockAddr, value):
+        return self.MFRC522_ValueOperation(self.PICC_INCREMENT, blockAddr, value)
+
+    def MFRC522_Decrement(self, blockAddr, value):
+        return self.MFRC522_ValueOperation(self.PICC_DECREMENT, blockAddr, value)
+
+    def MFRC522_Restore(self, blockAddr):
+        return self.MFRC522_ValueOperation(self.PICC_RESTORE, blockAddr)
+
+    # Write the transfer buffer to a value block.
+    def MFRC522_Transfer(self, blockAddr):
+        if self.MFRC522_TransceiveAck(self.MFRC522_TransferFrame(blockAddr), self.TIMEOUT_LONG) != 0x0A:
+            print("Error while transfer value")
+            return self.MI_ERR
+        return self.MI_OK
+
+    # Transceive a frame with CRC_A appended, returns (status, data) with the
+    # response CRC checked and stripped. A 4 bit NAK is reported as MI_ERR.
+    def MFRC522_TransceiveCRC(self, frame, timeout=None):
+        (status, backData, backLen) = self.MFRC522_TransceiveBytes(self.appendCRC(frame), timeout=timeout,
+                                                                   crc=self.CRC_BOTH)
+        if status != self.MI_OK or backLen < 8 or backLen % 8:
+            return self.MI_ERR, None
+        return self.MI_OK, list(backData)
+
+    # 8 byte version info of Ultralight EV1/NTAG21x, vendor, type, subtype,
+    # major, minor, storage size and protocol.
+    def MFRC522_UltralightGetVersion(self):
+        (status, data) = self.MFRC522_TransceiveCRC([self.PICC_GET_VERSION], self.TIMEOUT_MEDIUM)
+        if status != self.MI_OK or len(data) != 8:
+            return self.MI_ERR, None
+        return self.MI_OK, data
+
+    # READ answers 4 pages (16 bytes) starting at pageAddr, rolling over at the end of memory.
+    def MFRC522_UltralightRead(self, pageAddr):
+        (status, data) = self.MFRC522_TransceiveCRC([self.PICC_READ, pageAddr], self.TIMEOUT_MEDIUM)
+        if status != self.MI_OK or len(data) != 16:
+            return self.MI_ERR, None
+        return self.MI_OK, data
+
+    # FAST_READ of pages startPage..endPage, split into exchanges of
+    # UL_FAST_READ_PAGES pages so data and CRC fit the 64 byte FIFO.
+    def MFRC522_UltralightFastRead(self, startPage, endPage):
+        data = []
+        page = startPage
+        while page <= endPage:
+            last = min(endPage, page + self.UL_FAST_READ_PAGES - 1)
+            (status, backData) = self.MFRC522_TransceiveCRC([self.PICC_FAST_READ, page, last], self.TIMEOUT_MEDIUM)
+            if status != self.MI_OK or len(backData) != (last - page + 1) * 4:
+                return self.MI_ERR, data
+            data += backData
+            page = last + 1
+        return self.MI_OK, data
+
+    def MFRC522_UltralightWrite(self, pageAddr, pageData):
+        frame = [self.PICC_UL_WRITE, pageAddr] + list(pageData[:4])
+        if self.MFRC522_TransceiveAck(self.appendCRC(frame), self.TIMEOUT_LONG) != 0x0A:
+            return self.MI_ERR
+        return self.MI_OK
+
+    # PWD_AUTH with a 4 byte password, returns status and the 2 byte PACK.
+    def MFRC522_UltralightPwdAuth(self, pwd):
+        (status, data) = self.MFRC522_TransceiveCRC([self.PICC_PWD_AUTH] + list(pwd[:4]), self.TIMEOUT_MEDIUM)
+        if status != self.MI_OK or len(data) != 2:
+            return self.MI_ERR, None
+        return self.MI_OK, data
+
     def MFRC522_DumpClassic1K(self, key, uid):
         i = 0
         while i < 64:
@@ -469,14 +912,9 @@ class MFRC522:
             i = i+1
 
     def MFRC522_HaltA(self):
-        backData = []
-        buf = []
-        buf.append(self.PICC_HALT)
-        buf.append(0x0)
-        pOut = self.CalulateCRC(buf)
-        buf.append(pOut[0])
-        buf.append(pOut[1])
-        (status, backData, backLen) = self.MFRC522_ToCard(self.PCD_TRANSCEIVE, buf)
+        # The card never answers a HALT, only the timeout is waited for.
+        (status, backData, backLen) = self.MFRC522_ToCardBytes(
+            self.PCD_TRANSCEIVE, self.commandFrame(self.PICC_HALT, 0), timeout=self.TIMEOUT_SHORT, crc=self.CRC_TX)
 
         return status
 
@@ -495,7 +933,7 @@ class MFRC522:
         # We only have 7 bit payload.
         self.writeRegister(self.BitFramingReg, 0x07)
         (status, backData, backLen) = self.MFRC522_ToCard(
-            self.PCD_TRANSCEIVE, [self.PICC_MIFARE_CLONE_UNLOCK1])
+            self.PCD_TRANSCEIVE, [self.PICC_MIFARE_CLONE_UNLOCK1], timeout=self.TIMEOUT_SHORT)
         if status != self.MI_OK:
             print(
                 "Card did not respond to MIFARE_CLONE_UNLOCK1 after HALT command. Are you sure it is a UID changeable one?")
@@ -505,15 +943,18 @@ class MFRC522:
             print("Got bad response on backdoor MIFARE_CLONE_UNLOCK1 command: %02x" % backData[0])
             return False
         if format:
+            # The wipe erases the whole EEPROM before it is acknowledged.
             self.writeRegister(self.BitFramingReg, 0x00)
-            (status, backData, backLen) = self.MFRC522_ToCard(self.PCD_TRANSCEIVE, [self.PICC_MIFARE_CLONE_WIPE])
+            (status, backData, backLen) = self.MFRC522_ToCard(
+                self.PCD_TRANSCEIVE, [self.PICC_MIFARE_CLONE_WIPE], timeout=self.TIMEOUT_LONG)
             if status != self.MI_OK:
                 print("Card did not response to MIFARE_CLONE_WIPE")
                 return False
             # Halt again.
             self.MFRC522_HaltA()
             self.writeRegister(self.BitFramingReg, 0x07)
-            (status, backData, backLen) = self.MFRC522_ToCard(self.PCD_TRANSCEIVE, [self.PICC_MIFARE_CLONE_UNLOCK1])
+            (status, backData, backLen) = self.MFRC522_ToCard(
+                self.PCD_TRANSCEIVE, [self.PICC_MIFARE_CLONE_UNLOCK1], timeout=self.TIMEOUT_SHORT)
             if status != self.MI_OK:
                 print("Card did not respond to MIFARE_CLONE_UNLOCK1 after HALT command in wipe phrase.")
                 return False
@@ -536,7 +977,7 @@ class MFRC522:
             lock3 = [0x85, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x0,
                      0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x01, 0x18, 0x47]
             (status, backData, backLen) = self.MFRC522_ToCard(
-                self.PCD_TRANSCEIVE, lock1)
+                self.PCD_TRANSCEIVE, lock1, timeout=self.TIMEOUT_LONG)
             if status != self.MI_OK:
                 print("Card did not response to lock1")
                 print("Status = %d" % status)
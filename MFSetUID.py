@@ -1,17 +1,23 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 
-import MFRC522
 import sys
-from Anticol import anticol, auto_find_port
+import time
+from Anticol import anticol, connect_reader
+from CardType import DIRECT_WRITE, GEN1A, MAGIC_PROBES, identify, lookup
+from Common import should_read
+from MFClassic import is_trailer_block
+
+# Number of consecutive missed WUPA before a card counts as removed.
+REMOVED_MISSES = 3
 
 abt_data = [0x01,  0x23,  0x45,  0x67,  0x00,  0x08,  0x04,  0x00,
             0x46,  0x59,  0x25,  0x58,  0x49,  0x10,  0x23,  0x02,  0x23,  0xeb]
 abt_blank = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0x07,
              0x80, 0x69, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0x36, 0xCC]
 
-def print_hex(prompt, data):
-    print(prompt + ' '.join(['%02x' % x for x in data]))
+def print_hex(prompt, data, end=None):
+    print(prompt + ' '.join(['%02x' % x for x in data]), end=end)
 
 
 def usage(program_name):
@@ -21,11 +27,12 @@ def usage(program_name):
     print('\t-f\tFormat. Delete all data (set to 0xFF) and reset ACLs to default.')
     print('\t-r\tRecovery. Try to recover card event if card does not found.')
     print('\t-l\tLock. Try to lock card after success UID modification, only valid for CUID card.')
+    print('\t-b FILE\tBatch. Provision one card per line of FILE (UID or BLOCK0, first CSV column), keep the reader open.')
     print('\n\tSpecify UID (4 HEX bytes) to set UID, or leave blank for default \'01234567\'.')
     print('\n\tSpecify BLOCK0 (16 HEX bytes) to set content of Block0. CRC (Byte 4) is recalculated an overwritten.')
     print('\tThis utility can be used to recover cards that have been damaged by writing bad')
     print('\tdata (e.g. wrong BCC), thus making them non-selectable by most tools/readers.')
-    print('\n\t*** Note: this utility only works with special Mifare 1K cards (Chinese clones).\n')
+    print('\n\t*** Note: this utility only works with special Mifare Mini/1K/2K/4K cards (Chinese clones).\n')
 
 
 def main():
@@ -33,7 +40,9 @@ def main():
     format = False
     recovery = False
     lock = False
-    for argv in sys.argv[1:]:
+    batch_file = None
+    args = iter(sys.argv[1:])
+    for argv in args:
         if argv == '-h':
             usage(sys.argv[0])
             exit(0)
@@ -43,51 +52,194 @@ def main():
             recovery = True
         elif argv == '-l':
             lock = True
+        elif argv == '-b':
+            batch_file = next(args, None)
+            if batch_file is None:
+                print('-b needs a file of UIDs or BLOCK0 images.')
+                usage(sys.argv[0])
+                exit(-1)
         elif len(argv) in [8, 32]:
-            for i in range(0, len(argv), 2):
-                abt_data[int(i/2)] = int(argv[i:(i+2)], 16)
-            abt_data[4] = abt_data[0] ^ abt_data[1] ^ abt_data[2] ^ abt_data[3]
+            abt_data = parse_block0(argv)
         else:
             print('%s is not supported option.' % argv)
             usage(sys.argv[0])
             exit(-1)
-    set_uid(format, recovery, lock)
+    if batch_file is not None:
+        batch_set_uid(batch_file, format, lock)
+    else:
+        set_uid(format, recovery, lock)
+
+
+def parse_block0(text, template=None):
+    # UID (4 HEX bytes) or BLOCK0 (16 HEX bytes), BCC is always recalculated.
+    data = list(template or abt_data)
+    for i in range(0, len(text), 2):
+        data[int(i/2)] = int(text[i:(i+2)], 16)
+    data[4] = data[0] ^ data[1] ^ data[2] ^ data[3]
+    return data
+
+
+def read_batch_file(file_name):
+    entries = []
+    with open(file_name, 'r') as fp:
+        for (line_no, line) in enumerate(fp, 1):
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            field = line.replace(';', ',').split(',')[0].strip().replace(' ', '').replace(':', '')
+            if len(field) not in [8, 32]:
+                print('%s:%d: skip entry %s, need a UID or a BLOCK0' % (file_name, line_no, field))
+                continue
+            try:
+                entries.append(parse_block0(field))
+            except ValueError:
+                print('%s:%d: skip entry %s, not HEX' % (file_name, line_no, field))
+    return entries
+
+
+def card_blocks(card_info):
+    # Last block number from the fingerprint table, recovery mode has no card info and assumes 1K.
+    if card_info is None:
+        return 0x3f
+    (_, sak, atqa, ats) = card_info
+    blocks = lookup(sak, atqa, ats).blocks
+    return blocks if blocks is not None else 0x3f
+
+
+def write_uid(mf_reader, data, format = False, lock = False, blocks = 0x3f):
+    # Card must be halted (or just detected) when called.
+    mf_reader.MFRC522_HaltA()
+
+    # Block 0 and all the trailers go through a single backdoor session.
+    write_blocks = [(0, data)]
+    if format:
+        write_blocks += [(i, abt_blank) for i in range(1, blocks + 1) if is_trailer_block(i)]
+    (status, failed) = mf_reader.MFRC522_BackdoorWriteBlocks(write_blocks)
+    if status != mf_reader.MI_OK:
+        print('Error: %d blocks not written, first failed block %02d' % (len(failed), failed[0]))
+        return False
+    print("New Sector[00]\t%s" % (' '.join([('%02x' % x) for x in data[:16]])))
+    if format:
+        print('Formatted %d sector trailers' % (len(write_blocks) - 1))
+
+    # Make sure to stop reading for cards
+    mf_reader.MFRC522_HaltA()
+
+    if lock:
+        print('Warning: Locking card will make card no longer able to modify UID!')
+        if not mf_reader.MFRC522_LockUidSector():
+            return False
+
+        # Halt again.
+        mf_reader.MFRC522_HaltA()
+    return True
+
+
+def write_uid_direct(mf_reader, uid, data, format = False, lock = False):
+    # gen2/CUID cards take block 0 with a plain WRITE after authenticating with the default key.
+    if format or lock:
+        print('Note: format and lock need the gen1a backdoor, ignored for this card')
+    if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, 0, abt_blank[0:6], uid) != mf_reader.MI_OK:
+        print('Error: block 0 does not authenticate with the default key A')
+        return False
+    if mf_reader.MFRC522_Write(0, data[:16]) != mf_reader.MI_OK:
+        print('Error: block 0 not written')
+        return False
+    print("New Sector[00]\t%s" % (' '.join([('%02x' % x) for x in data[:16]])))
+    mf_reader.MFRC522_HaltA()
+    mf_reader.MFRC522_StopCrypto1()
+    return True
+
+
+def verify_uid(mf_reader, data):
+    # The card is halted after write_uid, wake it up and check the UID it reports.
+    (success, card_info) = anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
+    mf_reader.MFRC522_HaltA()
+    return success and card_info[0] == data[:4]
+
+
+def wait_card_removed(mf_reader):
+    misses = 0
+    while misses < REMOVED_MISSES and should_read():
+        (status, _, _) = mf_reader.MFRC522_Request(mf_reader.PICC_WUPA)
+        misses = 0 if status == mf_reader.MI_OK else misses + 1
+        time.sleep(0.05)
+
+
+def change_uid(mf_reader, card_info, data, format = False, lock = False):
+    # Block 0 written the way the card's magic generation takes it, False when that fails or there is none.
+    card_type = identify(mf_reader, card_info, MAGIC_PROBES)
+    if card_type.magic == GEN1A:
+        return write_uid(mf_reader, data, format, lock, card_blocks(card_info))
+    if card_type.magic in DIRECT_WRITE:
+        return write_uid_direct(mf_reader, card_info[0], data, format, lock)
+    print('Error: %s, the UID of this card can not be changed by this tool' % card_type.name)
+    return False
 
 
 def set_uid(format = False, recovery = False, lock = False):
     # Create an object of the class MFRC522
-    port = auto_find_port()
-    mf_reader = MFRC522.MFRC522(dev=port)
+    (mf_reader, port) = connect_reader()
 
     # Welcome message
     print_hex("MFRC522(%s) opened, will change UID to " % port, abt_data[:4])
 
-    if recovery or anticol(mf_reader)[0]:
-        # Stop encrypted traffic so we can send raw bytes
-        mf_reader.MFRC522_HaltA()
-        
-        if mf_reader.MFRC522_OpenUidBackdoor():
-            print("Card unlocked!")
-            mf_reader.MFRC522_Write(0, abt_data)
-            print("New Sector[00]\t%s" % (' '.join([('%02x' % x) for x in abt_data])))
-
-            if format:
-                for i in range(3, 64, 4):
-                    print('Format Sector[%02d]' % i)
-                    mf_reader.MFRC522_Write(i, abt_blank)
-
-            # Make sure to stop reading for cards
-            mf_reader.MFRC522_HaltA()
-
-            if lock:
-                print('Warning: Locking card will make card no longer able to modify UID!')
-                mf_reader.MFRC522_LockUidSector()
-
-                # Halt again.
-                mf_reader.MFRC522_HaltA()
+    (success, card_info) = (False, None) if recovery else anticol(mf_reader)
+    if recovery:
+        write_uid(mf_reader, abt_data, format, lock, card_blocks(card_info))
+    elif success:
+        if not change_uid(mf_reader, card_info, abt_data, format, lock):
+            exit(-2)
     else:
         print('Error: No tag available')
         exit(-2)
 
+
+def batch_set_uid(file_name, format = False, lock = False):
+    try:
+        entries = read_batch_file(file_name)
+    except IOError as err:
+        print('Could not open batch file: %s, err = %s' % (file_name, err))
+        exit(-1)
+    if not entries:
+        print('Error: no UID found in %s' % file_name)
+        exit(-1)
+
+    # Reader is opened and initialised once for the whole batch.
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened, %d cards to provision." % (port, len(entries)))
+
+    start = time.monotonic()
+    done = 0
+    failed = 0
+    index = 0
+    while index < len(entries) and should_read():
+        data = entries[index]
+        print_hex('[%d/%d] Waiting for card, will change UID to ' % (index + 1, len(entries)), data[:4])
+        (success, card_info) = (False, None)
+        while should_read() and not success:
+            (success, card_info) = anticol(mf_reader, print_info=False)
+            if not success:
+                time.sleep(0.02)
+        if not success:
+            break
+
+        if change_uid(mf_reader, card_info, data, format, lock) and verify_uid(mf_reader, data):
+            done += 1
+            index += 1
+            elapsed = time.monotonic() - start
+            print_hex('[%d/%d] OK ' % (index, len(entries)), data[:4], end='')
+            print(', %d done, %d failed, %.1f cards/min' % (done, failed, done * 60.0 / elapsed))
+        else:
+            failed += 1
+            print_hex('[%d/%d] FAILED ' % (index + 1, len(entries)), data[:4], end='')
+            print(', present the next card to retry this entry.')
+        print('Remove the card...')
+        wait_card_removed(mf_reader)
+
+    elapsed = time.monotonic() - start
+    print('Batch finished, %d of %d cards provisioned, %d failed in %.1fs (%.1f cards/min).' %
+          (done, len(entries), failed, elapsed, done * 60.0 / elapsed if elapsed else 0))
+
 if __name__ == '__main__':
     main()
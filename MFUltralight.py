@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import MFRC522
+import sys
+import time
+from dataclasses import dataclass
+from Anticol import anticol, connect_reader, print_hex
+
+PAGE_SIZE = 4
+FIRST_USER_PAGE = 4
+
+
+@dataclass
+class UltralightType:
+    name: str
+    pages: int          # total number of pages
+    user_end: int       # last page of user memory, lock and config pages follow it
+    fast_read: bool = True
+
+
+# Keyed on the storage size byte of GET_VERSION.
+VERSION_TYPES = {
+    0x0B: UltralightType('MIFARE Ultralight EV1 (MF0UL11)', 20, 0x0F),
+    0x0E: UltralightType('MIFARE Ultralight EV1 (MF0UL21)', 41, 0x23),
+    0x0F: UltralightType('NTAG213', 45, 0x27),
+    0x11: UltralightType('NTAG215', 135, 0x81),
+    0x13: UltralightType('NTAG216', 231, 0xE1),
+}
+
+# Cards without GET_VERSION.
+ULTRALIGHT = UltralightType('MIFARE Ultralight', 16, 0x0F, False)
+ULTRALIGHT_C = UltralightType('MIFARE Ultralight C', 48, 0x27, False)
+ULTRALIGHT_C_PROBE_PAGE = 0x2B
+
+
+def usage(program_name):
+    print('Usage: %s r|w <dump.bin> [-l] [-p <pwd>]' % program_name)
+    print('  r|w           - read the card to dump.bin or write dump.bin to the card')
+    print('  <dump.bin>    - raw page image, 4 bytes per page starting at page 0')
+    print('  -l            - also write the lock, OTP and configuration pages')
+    print('                  *** locking is permanent, only use it with a checked dump')
+    print('  -p <pwd>      - authenticate with the 4 byte password first, 8 HEX digits (EV1/NTAG)')
+    print('Examples:')
+    print('  %s r mytag.bin' % program_name)
+    print('  %s w mytag.bin -p 12345678' % program_name)
+
+
+def reselect(mf_reader: MFRC522):
+    # A NAK sends the tag back to idle, wake it up again.
+    return anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)[0]
+
+
+def detect_type(mf_reader: MFRC522):
+    # Returns (UltralightType, version bytes or None), the tag is selected afterwards.
+    (status, version) = mf_reader.MFRC522_UltralightGetVersion()
+    if status == mf_reader.MI_OK:
+        card_type = VERSION_TYPES.get(version[6])
+        if card_type is not None:
+            return card_type, version
+        # Unknown EV1/NTAG, derive the size from the storage byte (2^(n/2) bytes).
+        pages = (1 << (version[6] >> 1)) // PAGE_SIZE + FIRST_USER_PAGE
+        return UltralightType('Unknown (storage 0x%02x)' % version[6], pages, pages - 1), version
+
+    if not reselect(mf_reader):
+        return None, None
+    # Ultralight C has 48 pages, a plain Ultralight NAKs reads past page 0x0F.
+    (status, _) = mf_reader.MFRC522_UltralightRead(ULTRALIGHT_C_PROBE_PAGE)
+    if status == mf_reader.MI_OK:
+        return ULTRALIGHT_C, None
+    if not reselect(mf_reader):
+        return None, None
+    return ULTRALIGHT, None
+
+
+def read_pages(mf_reader: MFRC522, card_type):
+    """Read all pages of the tag into a bytearray, None on failure.
+
+    FAST_READ gets up to 15 pages per exchange, tags without it are read with
+    READ which answers 4 pages at a time. Pages protected by a password or
+    not readable at all (e.g. the Ultralight C key) read as 00.
+    """
+    data = bytearray(card_type.pages * PAGE_SIZE)
+    print('Reading out %d pages |' % card_type.pages, end='', flush=True)
+    page = 0
+    step = mf_reader.UL_FAST_READ_PAGES if card_type.fast_read else 4
+    while page < card_type.pages:
+        last = min(card_type.pages - 1, page + step - 1)
+        if card_type.fast_read:
+            (status, chunk) = mf_reader.MFRC522_UltralightFastRead(page, last)
+        else:
+            (status, chunk) = mf_reader.MFRC522_UltralightRead(page)
+        if status != mf_reader.MI_OK:
+            print('!\nError: unable to read page 0x%02x' % page)
+            return None
+        count = last - page + 1
+        data[page * PAGE_SIZE:(last + 1) * PAGE_SIZE] = bytes(chunk[:count * PAGE_SIZE])
+        print('.' * count, end='', flush=True)
+        page = last + 1
+    print('|')
+    return data
+
+
+def write_pages(mf_reader: MFRC522, card_type, data, lock=False):
+    # Pages 0 and 1 hold the UID and are read only, page 2 starts with BCC1
+    # and the internal byte which the tag ignores on write.
+    last = card_type.pages - 1 if lock else card_type.user_end
+    pages = list(range(FIRST_USER_PAGE, last + 1))
+    if lock:
+        pages = pages + [2, 3]
+    print('Writing %d pages |' % len(pages), end='', flush=True)
+    written = 0
+    for page in pages:
+        if mf_reader.MFRC522_UltralightWrite(page, data[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]) != mf_reader.MI_OK:
+            print('!\nError: unable to write page 0x%02x' % page)
+            break
+        written += 1
+        print('.', end='', flush=True)
+    else:
+        print('|')
+    print('Done, %d of %d pages written.' % (written, len(pages)))
+    return written == len(pages)
+
+
+def main():
+    args = sys.argv[1:]
+    lock = '-l' in args
+    args = [arg for arg in args if arg != '-l']
+    pwd = None
+    if '-p' in args:
+        i = args.index('-p')
+        if i + 1 >= len(args) or len(args[i + 1]) != 8:
+            print('Error, -p needs a password of 8 HEX digits')
+            usage(sys.argv[0])
+            exit(-1)
+        try:
+            pwd = list(bytes.fromhex(args[i + 1]))
+        except ValueError as err:
+            print('Error, illegal password: %s' % err)
+            exit(-1)
+        del args[i:i + 2]
+    if len(args) != 2 or args[0] not in ['r', 'w']:
+        usage(sys.argv[0])
+        exit(-1)
+    write = args[0] == 'w'
+    path = args[1]
+
+    data = None
+    if write:
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+        except IOError as err:
+            print('Could not open dump file: %s, err = %s' % (path, err))
+            exit(-1)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+
+    (success, card_info) = anticol(mf_reader, no_rats=True)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    if card_info[1] != 0x00 or len(card_info[0]) != 7:
+        print('Warning: tag is probably not a MIFARE Ultralight/NTAG!')
+
+    (card_type, version) = detect_type(mf_reader)
+    if card_type is None:
+        print('Error: tag was removed')
+        exit(-1)
+    print('Tag type: %s, %d pages' % (card_type.name, card_type.pages))
+    if version is not None:
+        print_hex('Version: ', version)
+
+    if pwd is not None:
+        (status, pack) = mf_reader.MFRC522_UltralightPwdAuth(pwd)
+        if status != mf_reader.MI_OK:
+            print('Error: password authentication failed')
+            exit(-1)
+        print_hex('PACK: ', pack)
+
+    t_start = time.monotonic()
+    if write:
+        if len(data) < (card_type.user_end + 1) * PAGE_SIZE:
+            print('Dump file %s has %d bytes, the tag needs at least %d' %
+                  (path, len(data), (card_type.user_end + 1) * PAGE_SIZE))
+            exit(-1)
+        if lock and len(data) < card_type.pages * PAGE_SIZE:
+            print('Dump file %s has no lock and configuration pages' % path)
+            exit(-1)
+        success = write_pages(mf_reader, card_type, data, lock)
+    else:
+        data = read_pages(mf_reader, card_type)
+        success = data is not None
+        if success:
+            print('Done, %d pages read.' % card_type.pages)
+            try:
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+            except IOError as err:
+                print('Could not write to file: %s, err = %s' % (path, err))
+                exit(-1)
+    print('%.3f seconds' % (time.monotonic() - t_start))
+
+    mf_reader.MFRC522_HaltA()
+    exit(0 if success else -1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import MFRC522
+import struct
+import sys
+from dataclasses import dataclass
+from Anticol import anticol, connect_reader
+from MFCard import MifareClassicCard
+from MFDump import sector_of_block
+
+# A value block holds a signed 32 bit value, inc and dec take an unsigned 32 bit operand.
+VALUE_MIN = -2 ** 31
+VALUE_MAX = 2 ** 31 - 1
+OPERAND_MAX = 2 ** 32 - 1
+
+
+@dataclass
+class ValueOp:
+    op: str             # 'inc', 'dec' or 'restore'
+    block: int
+    operand: int = 0
+    target: int = None  # block the result is transferred to, the source block when None
+
+
+def encode_value(value, addr):
+    # value, ~value, value, addr, ~addr, addr, ~addr
+    data = struct.pack('<i', value)
+    inverted = bytes([~x & 0xFF for x in data])
+    return list(data + inverted + data + bytes([addr & 0xFF, ~addr & 0xFF, addr & 0xFF, ~addr & 0xFF]))
+
+
+def is_value_block(data):
+    for i in range(4):
+        if data[i] != data[i + 8] or data[i] != (~data[i + 4] & 0xFF):
+            return False
+    return data[12] == data[14] and data[13] == data[15] and data[12] == (~data[13] & 0xFF)
+
+
+def decode_value(data):
+    # Returns (value, addr), or None when data is not a valid value block.
+    if not is_value_block(data):
+        return None
+    return struct.unpack('<i', bytes(data[0:4]))[0], data[12]
+
+
+def apply_value_ops(mf_reader: MFRC522, uid, key, key_a, ops, authenticated_sector=None):
+    """Apply a list of ValueOp, authenticating once per sector.
+
+    All command, operand and transfer frames are built before the first
+    exchange. Each operation costs one acknowledged command, one transmit-only
+    operand and one acknowledged transfer; the acks are checked together at
+    the end. Returns status and the indexes of the operations not applied.
+    """
+    codes = {'inc': mf_reader.PICC_INCREMENT, 'dec': mf_reader.PICC_DECREMENT, 'restore': mf_reader.PICC_RESTORE}
+    auth_cmd = mf_reader.PICC_AUTHENT1A if key_a else mf_reader.PICC_AUTHENT1B
+    frames = []
+    for op in ops:
+        target = op.block if op.target is None else op.target
+        if op.op not in codes or sector_of_block(target) != sector_of_block(op.block):
+            print('Illegal value operation %s on block %d' % (op.op, op.block))
+            return mf_reader.MI_ERR, list(range(len(ops)))
+        (cmd, data) = mf_reader.MFRC522_ValueFrames(codes[op.op], op.block, op.operand)
+        frames.append((sector_of_block(op.block), cmd, data, mf_reader.MFRC522_TransferFrame(target)))
+
+    acks = bytearray()
+    for (sector, cmd, data, transfer) in frames:
+        if sector != authenticated_sector:
+            if mf_reader.MFRC522_Auth(auth_cmd, cmd[1], key, uid) != mf_reader.MI_OK:
+                break
+            authenticated_sector = sector
+        acks.append(mf_reader.MFRC522_TransceiveAck(cmd, mf_reader.TIMEOUT_SHORT))
+        if acks[-1] == 0x0A and mf_reader.MFRC522_Transmit(data, mf_reader.CRC_TX) == mf_reader.MI_OK:
+            acks.append(mf_reader.MFRC522_TransceiveAck(transfer, mf_reader.TIMEOUT_LONG))
+        else:
+            acks.append(0)
+        if acks[-1] != 0x0A:
+            # The card went back to idle, everything after this needs a reselect.
+            break
+
+    acks += bytes(2 * len(frames) - len(acks))
+    failed = [i for i in range(len(frames)) if acks[2 * i] != 0x0A or acks[2 * i + 1] != 0x0A]
+    return (mf_reader.MI_OK if not failed else mf_reader.MI_ERR), failed
+
+
+def usage(program_name):
+    print('Usage: %s a|b <key> <operation> [<operation> ...]' % program_name)
+    print('  a|b           - authenticate with key A or key B')
+    print('  <key>         - 12 HEX digits, e.g. ffffffffffff')
+    print('Operations, run in the given order, consecutive inc/dec/copy are sent as one batch:')
+    print('  get <block>            - print the value of a value block')
+    print('  set <block> <value>    - format block as value block holding value')
+    print('  inc <block> <n>        - increment the value by n')
+    print('  dec <block> <n>        - decrement the value by n')
+    print('  copy <block> <target>  - restore block and transfer it to target (same sector)')
+    print('Example: %s a ffffffffffff set 4 100 inc 4 20 dec 4 5 copy 4 5 get 5' % program_name)
+
+
+def parse_ops(args):
+    ops = []
+    arity = {'get': 1, 'set': 2, 'inc': 2, 'dec': 2, 'copy': 2}
+    i = 0
+    while i < len(args):
+        name = args[i]
+        if name not in arity or i + arity[name] >= len(args):
+            raise ValueError('illegal operation %s' % ' '.join(args[i:]))
+        values = [int(x, 0) for x in args[i + 1:i + 1 + arity[name]]]
+        if (name == 'set' and not VALUE_MIN <= values[1] <= VALUE_MAX or
+                name in ['inc', 'dec'] and not 0 <= values[1] <= OPERAND_MAX):
+            raise ValueError('%s value %d out of range' % (name, values[1]))
+        if name == 'copy':
+            ops.append(('value', ValueOp('restore', values[0], 0, values[1])))
+        elif name in ['inc', 'dec']:
+            ops.append(('value', ValueOp(name, values[0], values[1])))
+        else:
+            ops.append((name, values))
+        i += 1 + arity[name]
+    return ops
+
+
+def main():
+    if len(sys.argv) < 5 or sys.argv[1] not in ['a', 'b'] or len(sys.argv[2]) != 12:
+        usage(sys.argv[0])
+        exit(-1)
+    key_a = sys.argv[1] == 'a'
+    try:
+        key = list(bytes.fromhex(sys.argv[2]))
+        ops = parse_ops(sys.argv[3:])
+    except ValueError as err:
+        print('Error: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+
+    (success, card_info) = anticol(mf_reader, no_rats=True)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    card = MifareClassicCard(mf_reader, card_info[0], [key], key_a)
+
+    success = True
+    i = 0
+    while i < len(ops) and success:
+        (name, args) = ops[i]
+        if name == 'value':
+            batch = []
+            while i < len(ops) and ops[i][0] == 'value':
+                batch.append(ops[i][1])
+                i += 1
+            (status, failed) = apply_value_ops(mf_reader, card.uid, key, key_a, batch, card.sector)
+            for op in batch:
+                card.invalidate(op.block if op.target is None else op.target)
+            # The operations leave the last sector authenticated, or the card idle after a failure.
+            if status == mf_reader.MI_OK:
+                card.sector = sector_of_block(batch[-1].block)
+            else:
+                card.reselect()
+            print('%d of %d value operations applied' % (len(batch) - len(failed), len(batch)))
+            success = status == mf_reader.MI_OK
+            continue
+        i += 1
+        block = args[0]
+        if name == 'get':
+            data = card.read_block(block)
+            value = decode_value(data) if data is not None else None
+            if data is None:
+                print('Error: block 0x%02x not read' % block)
+                success = False
+            elif value is None:
+                print('Block 0x%02x is not a value block' % block)
+                success = False
+            else:
+                print('Block 0x%02x: value %d, addr 0x%02x' % (block, value[0], value[1]))
+        else:
+            success = card.write_block(block, encode_value(args[1], block))
+            if success:
+                print('Block 0x%02x: set to %d' % (block, args[1]))
+
+    card.halt()
+    exit(0 if success else -1)
+
+
+if __name__ == '__main__':
+    main()
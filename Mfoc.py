@@ -8,8 +8,10 @@ import getopt
 import re
 import time
 from dataclasses import dataclass
-from Anticol import anticol, auto_find_port, print_hex
+from Anticol import anticol, connect_reader, print_hex
 
+from CardType import CLASSIC, lookup
+from MFAccess import sector_count
 from MFClassic import GUESS_KEYS, is_trailer_block
 
 
@@ -18,32 +20,6 @@ PACKAGE_VERSION = '0.10.7(0.0.1)'
 MEM_CHUNK = 10000
 TRY_KEYS = 50
 
-# Number of trailers == number of sectors
-# Mifare Classic 1k 16x64b = 16
-NR_TRAILERS_1k = 16
-
-# Mifare Classic Mini
-NR_TRAILERS_MINI = 5
-
-# Mifare Classic 4k 32x64b + 8*256b = 40
-NR_TRAILERS_4k = 40
-
-# Mifare Classic 2k 32x64b
-NR_TRAILERS_2k = 32
-
-# Number of blocks
-# Mifare Classic 1k
-NR_BLOCKS_1k = 0x3f
-
-# Mifare Classic Mini
-NR_BLOCKS_MINI = 0x13
-
-# Mifare Classic 4k
-NR_BLOCKS_4k = 0xff
-
-# Mifare Classic 2k
-NR_BLOCKS_2k = 0x7f
-
 MAX_FRAME_LEN = 264
 
 # Used for counting nonce distances, explore [nd-value, nd+value]
@@ -123,6 +99,69 @@ def re_anticol(mf_reader: MFRC522):
         exit(-1)
 
 
+def find_default_keys(mf_reader: MFRC522, t: MfTag, keys):
+    # Authenticate every sector with every key until both keys are known, key B
+    # is also read out of the trailer after a key A hit. Returns the B keys found.
+    b_keys = []
+    print("Symbols: '.' no key found, '/' A key found, '\\' B key found, 'x' both keys found")
+    for key in keys:
+        print_hex('[Key: ', key, end='')
+        print('] -> [', end='', flush=True)
+        i = 0   # Sector counter
+        # Iterate over every block, where we haven't found a key yet
+        for block in range(t.num_blocks+1):
+            if is_trailer_block(block):
+                if not t.sectors[i].found_keyA:
+                    if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, block, key, t.auth_uid) != mf_reader.MI_OK:
+                        # Try to anticol again.
+                        re_anticol(mf_reader)
+                    else:
+                        # Save all information about successfull keyA authentization
+                        t.sectors[i].keyA = key
+                        t.sectors[i].found_keyA = True
+                        # Although KeyA can never be directly read from the data sector, KeyB can, so
+                        # if we need KeyB for this sector, it should be revealed by a data read with KeyA
+                        # todo - check for duplicates in cracked key list (do we care? will not be huge overhead)
+                        # todo - make code more modular! :)
+                        if not t.sectors[i].found_keyB:
+                            (status, data) = mf_reader.MFRC522_Read(block)
+                            if status == mf_reader.MI_OK:
+                                keyB = data[1][10:16]
+                                if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1B, block, keyB, t.auth_uid) != mf_reader.MI_OK:
+                                    re_anticol(mf_reader)
+                                else:
+                                    t.sectors[i].keyB = keyB
+                                    t.sectors[i].found_keyB = True
+                                    b_keys.append(keyB)
+                            else:
+                                # Try to anticol again.
+                                re_anticol(mf_reader)
+                # if key reveal failed, try other keys
+                if not t.sectors[i].found_keyB:
+                    if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1B, block, key, t.auth_uid) != mf_reader.MI_OK:
+                        # Try to anticol again.
+                        re_anticol(mf_reader)
+                        # No success, try next block
+                        t.sectors[i].trailer = block
+                    else:
+                        t.sectors[i].keyB = key
+                        t.sectors[i].found_keyB = True
+                if t.sectors[i].found_keyA and t.sectors[i].found_keyB:
+                    print('x', end='', flush=True)
+                elif t.sectors[i].found_keyA:
+                    print('/', end='', flush=True)
+                elif t.sectors[i].found_keyB:
+                    print('\\', end='', flush=True)
+                else:
+                    print('.', end='', flush=True)
+                # Save position of a trailer block to sector struct
+                t.sectors[i].trailer = block
+                i += 1
+        print("]")
+
+    return b_keys
+
+
 def main():
     d = Denonce(None, 0, DEFAULT_DIST_NR, DEFAULT_TOLERANCE, [0x00, 0x00, 0x00])
     t = MfTag()
@@ -188,8 +227,7 @@ def main():
         print('Parameter -O is mandatory')
         exit(-1)
 
-    port = auto_find_port()
-    mf_reader = MFRC522.MFRC522(dev=port)
+    (mf_reader, port) = connect_reader()
     
     (success, card_info) = anticol(mf_reader, no_rats=True)
     if not success:
@@ -197,100 +235,26 @@ def main():
         exit(-1)
 
     (uid, sak, atqa, ats) = card_info
-    if sak & 0x08 == 0 and sak != 0x01:
+    card_type = lookup(sak, atqa, ats)
+    if card_type.family != CLASSIC:
         print('Only Mifare Classic is supported')
         exit(-1)
 
     # Use last full bytes.
     t.auth_uid = uid[-4:]
 
-    if sak in [0x01, 0x08, 0x88, 0x28]:
-        # Check if MIFARE Plus 2K
-        if ats is not None and len(ats) >= 10 and ats[5:9] == [0xc1, 0x05, 0x2f, 0x2f] and (atqa[1] & 0x02 == 0):
-            print('Found Mifare Plus 2k tag')
-            t.num_sectors = NR_TRAILERS_2k
-            t.num_blocks = NR_BLOCKS_2k
-        else:
-            print('Found Mifare Classic 1k tag')
-            t.num_sectors = NR_TRAILERS_1k
-            t.num_blocks = NR_BLOCKS_1k
-    elif sak == 0x09:
-        print('Found Mifare Classic Mini tag')
-        t.num_sectors = NR_TRAILERS_MINI
-        t.num_blocks = NR_BLOCKS_MINI
-    elif sak == 0x18:
-        print('Found Mifare Classic 4k tag')
-        t.num_sectors = NR_TRAILERS_4k
-        t.num_blocks = NR_BLOCKS_4k
-    else:
-        print('Cannot determine card type from SAK')
-        exit(-1)
+    print('Found %s tag' % card_type.name)
+    t.num_blocks = card_type.blocks
+    t.num_sectors = sector_count(card_type.blocks)
     
     t.sectors = [Sector() for _ in range(t.num_sectors)]
     p_keys = []
-    b_keys = []
 
     d.distances = [0 for _ in range(d.num_distances)]
 
     print('Try to authenticate to all sectors with default keys...')
-    print("Symbols: '.' no key found, '/' A key found, '\\' B key found, 'x' both keys found")
-
     # Try customer_keys first, than default GUESS_KEYS
-    for key in customer_keys + GUESS_KEYS:
-        print_hex('[Key: ', key, end='')
-        print('] -> [', end='', flush=True)
-        i = 0   # Sector counter
-        # Iterate over every block, where we haven't found a key yet
-        for block in range(t.num_blocks+1):
-            if is_trailer_block(block):
-                if not t.sectors[i].found_keyA:
-                    if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, block, key, t.auth_uid) != mf_reader.MI_OK:
-                        # Try to anticol again.
-                        re_anticol(mf_reader)
-                    else:
-                        # Save all information about successfull keyA authentization
-                        t.sectors[i].keyA = key
-                        t.sectors[i].found_keyA = True
-                        # Although KeyA can never be directly read from the data sector, KeyB can, so
-                        # if we need KeyB for this sector, it should be revealed by a data read with KeyA
-                        # todo - check for duplicates in cracked key list (do we care? will not be huge overhead)
-                        # todo - make code more modular! :)
-                        if not t.sectors[i].found_keyB:
-                            (status, data) = mf_reader.MFRC522_Read(block)
-                            if status == mf_reader.MI_OK:
-                                keyB = data[1][10:16]
-                                if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1B, block, keyB, t.auth_uid) != mf_reader.MI_OK:
-                                    re_anticol(mf_reader)
-                                else:
-                                    t.sectors[i].keyB = keyB
-                                    t.sectors[i].found_keyB = True
-                                    b_keys.append(keyB)
-                            else:
-                                # Try to anticol again.
-                                re_anticol(mf_reader)
-                # if key reveal failed, try other keys
-                if not t.sectors[i].found_keyB:
-                    if mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1B, block, key, t.auth_uid) != mf_reader.MI_OK:
-                        # Try to anticol again.
-                        re_anticol(mf_reader)
-                        # No success, try next block
-                        t.sectors[i].trailer = block
-                    else:
-                        t.sectors[i].keyB = key
-                        t.sectors[i].found_keyB = True
-                if t.sectors[i].found_keyA and t.sectors[i].found_keyB:
-                    print('x', end='', flush=True)
-                elif t.sectors[i].found_keyA:
-                    print('/', end='', flush=True)
-                elif t.sectors[i].found_keyB:
-                    print('\\', end='', flush=True)
-                else:
-                    print('.', end='', flush=True)
-                # Save position of a trailer block to sector struct
-                t.sectors[i].trailer = block
-                i += 1
-        print("]")
-
+    find_default_keys(mf_reader, t, customer_keys + GUESS_KEYS)
     print()
 
     known_key = None
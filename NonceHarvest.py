@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import MFRC522
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from Anticol import anticol, connect_reader, print_hex, cascade_parts, fast_select
+from MFDump import first_block_of_sector
+from SerialTrace import encode_varint, decode_varint
+
+# Nonce file: MAGIC, the header
+#   uid length (varint), uid, auth command (1 byte), block (1 byte)
+# then one record per nonce:
+#   time since the previous nonce in ns (varint), nt (4 bytes, big endian)
+MAGIC = b'MFNONCE1'
+
+DEFAULT_COUNT = 100
+
+# Share of identical nonces from which the tag counts as a static nonce tag.
+STATIC_SHARE = 0.5
+# Share of nonces passing the 16 bit LFSR check from which the PRNG counts as weak.
+WEAK_SHARE = 0.9
+
+PRNG_WEAK = 'weak'
+PRNG_STATIC = 'static'
+PRNG_HARDENED = 'hardened'
+
+ATTACKS = {
+    PRNG_WEAK: 'nested attack (mfoc), the nonce distance predicts the next nt',
+    PRNG_STATIC: 'static nested attack, the tag answers the same nt every time',
+    PRNG_HARDENED: 'hardnested attack, nt is not predictable, collect encrypted nonces instead',
+}
+
+# Position of every 16 bit LFSR state in the sequence of the Crypto1 tag PRNG,
+# the same table crapto1 builds for nonce_distance(). Built on first use.
+lfsr_positions = None
+
+
+@dataclass
+class NonceSet:
+    uid: list
+    auth_cmd: int
+    block: int
+    nonces: list      # (delta_ns, nt)
+
+
+def lfsr_table():
+    global lfsr_positions
+    if lfsr_positions is None:
+        lfsr_positions = [0] * 65536
+        x = 1
+        for i in range(1, 65536):
+            lfsr_positions[(x & 0xff) << 8 | x >> 8] = i
+            x = x >> 1 | ((x ^ x >> 2 ^ x >> 3 ^ x >> 5) & 1) << 15
+    return lfsr_positions
+
+
+def nonce_distance(nt_from, nt_to):
+    # PRNG steps from one nonce to the next, both taken from a weak PRNG.
+    table = lfsr_table()
+    return (65535 + table[nt_to >> 16] - table[nt_from >> 16]) % 65535
+
+
+def is_lfsr_nonce(nt):
+    # A weak PRNG nonce is 32 consecutive bits of the 16 bit LFSR, its low half
+    # is the high half 16 steps further on.
+    table = lfsr_table()
+    return (65535 - table[nt >> 16] + table[nt & 0xffff]) % 65535 == 16
+
+
+def classify(nonces):
+    """Classify the tag PRNG from a list of nt values.
+
+    Returns (kind, distances), the distances between successive nonces are
+    only given for a weak PRNG.
+    """
+    most = Counter(nonces).most_common(1)[0][1]
+    if len(nonces) > 1 and most >= len(nonces) * STATIC_SHARE:
+        return PRNG_STATIC, None
+    valid = len([nt for nt in nonces if is_lfsr_nonce(nt)])
+    if valid < len(nonces) * WEAK_SHARE:
+        return PRNG_HARDENED, None
+    return PRNG_WEAK, [nonce_distance(a, b) for (a, b) in zip(nonces, nonces[1:])]
+
+
+def harvest(mf_reader: MFRC522, uid, auth_cmd, block, count, print_info=True):
+    """Collect count tag nonces, one plain auth request per selection.
+
+    Returns a list of (delta_ns, nt), delta_ns is the time since the previous
+    nonce (since the start for the first one).
+    """
+    parts = cascade_parts(uid)
+    nonces = []
+    failures = 0
+    t_last = time.monotonic_ns()
+    mf_reader.MFRC522_StopCrypto1()
+    while len(nonces) < count:
+        if fast_select(mf_reader, parts):
+            (status, nt) = mf_reader.MFRC522_AuthNonce(auth_cmd, block)
+            if status == mf_reader.MI_OK:
+                now = time.monotonic_ns()
+                nonces.append((now - t_last, nt))
+                t_last = now
+                if print_info and len(nonces) % 10 == 0:
+                    print('.', end='', flush=True)
+                continue
+        failures += 1
+        if failures > count:
+            print('\nError: too many failed authentications, tag removed?')
+            break
+    if print_info:
+        print()
+    return nonces
+
+
+def save_nonces(path, nonce_set):
+    with open(path, 'wb') as fp:
+        fp.write(MAGIC + encode_varint(len(nonce_set.uid)) + bytes(nonce_set.uid))
+        fp.write(bytes([nonce_set.auth_cmd, nonce_set.block]))
+        for (delta, nt) in nonce_set.nonces:
+            fp.write(encode_varint(delta) + nt.to_bytes(4, 'big'))
+
+
+def load_nonces(path):
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('%s is not a nonce file' % path)
+    (length, pos) = decode_varint(data, len(MAGIC))
+    uid = list(data[pos:pos + length])
+    pos += length
+    (auth_cmd, block) = data[pos:pos + 2]
+    pos += 2
+    nonces = []
+    while pos < len(data):
+        (delta, pos) = decode_varint(data, pos)
+        if pos + 4 > len(data):
+            raise ValueError('truncated nonce at offset %d' % pos)
+        nonces.append((delta, int.from_bytes(data[pos:pos + 4], 'big')))
+        pos += 4
+    return NonceSet(uid, auth_cmd, block, nonces)
+
+
+def print_report(nonce_set):
+    nonces = [nt for (_, nt) in nonce_set.nonces]
+    if not nonces:
+        print('No nonces')
+        return
+    deltas = sorted([delta for (delta, _) in nonce_set.nonces[1:]])
+    print_hex('UID: ', nonce_set.uid)
+    print('Key %s, block %d, %d nonces, %d distinct' %
+          ('A' if nonce_set.auth_cmd == MFRC522.MFRC522.PICC_AUTHENT1A else 'B', nonce_set.block,
+           len(nonces), len(set(nonces))))
+    if deltas:
+        print('Time per nonce: %.2f ms median, %.2f ms max' % (deltas[len(deltas) // 2] / 1000000, deltas[-1] / 1000000))
+    (kind, distances) = classify(nonces)
+    print('PRNG: %s' % kind)
+    if distances:
+        distances = sorted(distances)
+        print('Nonce distance: %d median, %d..%d' % (distances[len(distances) // 2], distances[0], distances[-1]))
+    print('Key recovery: %s' % ATTACKS[kind])
+
+
+def usage(program_name):
+    print('Usage: %s a|b <sector> <nonces.bin> [-n <count>]' % program_name)
+    print('       %s -c <nonces.bin>' % program_name)
+    print('  a|b           - authenticate with key A or key B')
+    print('  <sector>      - sector to authenticate against')
+    print('  <nonces.bin>  - nonces with their timing are written to this file')
+    print('  -n <count>    - number of nonces, default %d' % DEFAULT_COUNT)
+    print('  -c            - classify the nonces of a saved file, no reader needed')
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 2 and args[0] == '-c':
+        try:
+            nonce_set = load_nonces(args[1])
+        except (IOError, ValueError) as err:
+            print('Could not read nonce file: %s, err = %s' % (args[1], err))
+            exit(-1)
+        print_report(nonce_set)
+        exit(0)
+
+    count = DEFAULT_COUNT
+    try:
+        if len(args) == 5 and args[3] == '-n':
+            count = int(args[4])
+            args = args[:3]
+        if len(args) != 3 or args[0] not in ['a', 'b'] or count < 1:
+            raise ValueError(' '.join(args))
+        sector = int(args[1])
+    except ValueError:
+        usage(sys.argv[0])
+        exit(-1)
+    block = first_block_of_sector(sector)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+    (success, card_info) = anticol(mf_reader, no_rats=True)
+    if not success:
+        print('Error: no tag was found')
+        exit(-1)
+    uid = card_info[0]
+    auth_cmd = mf_reader.PICC_AUTHENT1A if args[0] == 'a' else mf_reader.PICC_AUTHENT1B
+
+    print('Harvesting %d nonces from sector %d ' % (count, sector), end='', flush=True)
+    t_start = time.monotonic()
+    nonces = harvest(mf_reader, uid, auth_cmd, block, count)
+    elapsed = time.monotonic() - t_start
+    print('%d nonces in %.2f s, %.1f nonces/s' % (len(nonces), elapsed, len(nonces) / elapsed))
+
+    nonce_set = NonceSet(uid, auth_cmd, block, nonces)
+    try:
+        save_nonces(args[2], nonce_set)
+    except IOError as err:
+        print('Could not write nonce file: %s, err = %s' % (args[2], err))
+        exit(-1)
+    print_report(nonce_set)
+
+
+if __name__ == '__main__':
+    main()
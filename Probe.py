@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import contextlib
+import io
+import json
+import MFRC522
+import os
+import statistics
+import sys
+import time
+from Anticol import anticol, connect_reader
+from CardType import CLASSIC, lookup
+from MFClassic import read_card, is_trailer_block
+from ReaderDaemon import RemoteMFRC522
+from RfTune import reader_id
+
+HISTORY_ENV = 'MFRC522_PROBE_HISTORY'
+DEFAULT_HISTORY_FILE = os.path.join(os.path.expanduser('~'), '.mfrc522_probe.json')
+
+REGISTER_SAMPLES = 1000
+SPEED_SAMPLES = 200
+DEFAULT_CARD_SAMPLES = 100
+DEFAULT_BLOCK = 1
+DEFAULT_KEY = [0xff, 0xff, 0xff, 0xff, 0xff, 0xff]
+
+# UART speeds swept, slowest first so the sweep ends at the driver's own speed.
+SWEEP_BAUD_RATES = [9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600, 1228800]
+
+
+def history_file():
+    return os.environ.get(HISTORY_ENV, DEFAULT_HISTORY_FILE)
+
+
+def load_history(path=None):
+    # {reader id: [results of every run, oldest first]}
+    try:
+        with open(path or history_file(), 'r') as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_results(results, path=None):
+    path = path or history_file()
+    history = load_history(path)
+    history.setdefault(results['reader'], []).append(results)
+    with open(path, 'w') as fp:
+        json.dump(history, fp, indent=2, sort_keys=True)
+    return path
+
+
+def latency_stats(samples, failed=0):
+    # Durations in s to the per call statistics kept in the history, in us.
+    if not samples:
+        return {'count': 0, 'failed': failed}
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        'count': n,
+        'failed': failed,
+        'ops_per_s': round(n / sum(samples), 1),
+        'mean_us': round(statistics.mean(samples) * 1000000, 1),
+        'min_us': round(samples[0] * 1000000, 1),
+        'p50_us': round(samples[n // 2] * 1000000, 1),
+        'p99_us': round(samples[min(n - 1, n * 99 // 100)] * 1000000, 1),
+        'max_us': round(samples[-1] * 1000000, 1),
+        'jitter_us': round(statistics.pstdev(samples) * 1000000, 1),
+    }
+
+
+def time_calls(operation, count, prepare=None):
+    """Time count calls of operation, prepare runs untimed before each call.
+
+    A call returning False counts as failed and is left out of the timings.
+    """
+    samples = []
+    failed = 0
+    for _ in range(count):
+        if prepare is not None:
+            prepare()
+        t_start = time.perf_counter()
+        success = operation()
+        elapsed = time.perf_counter() - t_start
+        if success:
+            samples.append(elapsed)
+        else:
+            failed += 1
+    return latency_stats(samples, failed)
+
+
+def probe_register(mf_reader: MFRC522, count=REGISTER_SAMPLES):
+    # One serial round trip per call, the chip answers at once.
+    return time_calls(lambda: mf_reader.readRegister(mf_reader.VersionReg) is not None, count)
+
+
+def restore_speed(mf_reader: MFRC522, baud):
+    # After a failed switch the chip runs at baud or still at the old speed,
+    # the way back is tried from both.
+    for host_baud in [baud, mf_reader.SERIAL_BAUD_RATE]:
+        try:
+            mf_reader.ser.baudrate = host_baud
+        except (ValueError, IOError):
+            continue
+        if mf_reader.setSerialSpeed(mf_reader.SERIAL_BAUD_RATE):
+            return True
+    return False
+
+
+def probe_serial_speeds(mf_reader: MFRC522, bauds=SWEEP_BAUD_RATES, count=SPEED_SAMPLES):
+    """Register round trips at every UART speed in bauds.
+
+    Returns {baud: stats}, a speed the adapter or the cable does not manage
+    has {'error': reason}. The reader is left at the driver's speed.
+    """
+    speeds = {}
+    for baud in bauds:
+        try:
+            switched = mf_reader.setSerialSpeed(baud)
+        except (ValueError, IOError) as err:
+            (switched, reason) = (False, str(err))
+        else:
+            reason = 'no answer'
+        if not switched:
+            speeds[str(baud)] = {'error': reason}
+            if not restore_speed(mf_reader, baud):
+                print('Error: reader lost after switching to %d baud, power cycle it' % baud)
+                break
+            continue
+        speeds[str(baud)] = probe_register(mf_reader, count)
+    else:
+        if bauds[-1] != mf_reader.SERIAL_BAUD_RATE:
+            mf_reader.setSerialSpeed(mf_reader.SERIAL_BAUD_RATE)
+    return speeds
+
+
+def probe_select(mf_reader: MFRC522, count):
+    # WUPA, anticollision and SELECT of a halted card, the HALT is not timed.
+    return time_calls(lambda: anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)[0], count,
+                      mf_reader.MFRC522_HaltA)
+
+
+def probe_auth(mf_reader: MFRC522, uid, block, key, count):
+    return time_calls(lambda: mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, block, key, uid) == mf_reader.MI_OK,
+                      count)
+
+
+def probe_read(mf_reader: MFRC522, block, count):
+    return time_calls(lambda: mf_reader.MFRC522_ReadBlock(block)[0] == mf_reader.MI_OK, count)
+
+
+def probe_write(mf_reader: MFRC522, block, data, count):
+    # The block gets its own content written back.
+    return time_calls(lambda: mf_reader.MFRC522_Write(block, data) == mf_reader.MI_OK, count)
+
+
+def probe_dump(mf_reader: MFRC522, uid, blocks, key):
+    # Full read with key A, as MFClassic does it, from a freshly selected card.
+    mf_reader.MFRC522_HaltA()
+    if not anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)[0]:
+        return {'blocks': blocks + 1, 'ok': False}
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_start = time.perf_counter()
+        (success, _) = read_card(mf_reader, uid, False, None, False, blocks, True, False, False, [key])
+        elapsed = time.perf_counter() - t_start
+    return {'blocks': blocks + 1, 'ok': success, 'seconds': round(elapsed, 3)}
+
+
+def probe_card(mf_reader: MFRC522, results, count, block, key):
+    # Card measurements, results is filled in as far as the card allows.
+    (success, card_info) = anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
+    if not success:
+        print('No card in the field, only the serial link was measured.')
+        return
+    (uid, sak, atqa, ats) = card_info
+    card_type = lookup(sak, atqa, ats)
+    results['card'] = card_type.name
+    results['select'] = probe_select(mf_reader, count)
+    if card_type.family != CLASSIC:
+        print('%s is no MIFARE Classic, auth, read, write and dump skipped.' % card_type.name)
+        return
+
+    mf_reader.MFRC522_HaltA()
+    if not anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)[0] or \
+            mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, block, key, uid) != mf_reader.MI_OK:
+        print('Error: key A %s does not authenticate block %d, auth, read, write and dump skipped.' %
+              (bytes(key).hex(), block))
+        return
+    results['auth'] = probe_auth(mf_reader, uid, block, key, count)
+    results['read'] = probe_read(mf_reader, block, count)
+    (status, data) = mf_reader.MFRC522_ReadBlock(block)
+    if status == mf_reader.MI_OK:
+        results['write'] = probe_write(mf_reader, block, data, count)
+    if card_type.blocks is not None:
+        results['dump'] = probe_dump(mf_reader, uid, card_type.blocks, key)
+
+
+def format_stats(stats):
+    if 'error' in stats:
+        return 'failed, %s' % stats['error']
+    if not stats['count']:
+        return 'failed %d of %d' % (stats['failed'], stats['failed'])
+    line = '%10.1f %10.1f %10.1f %10.1f %10.1f' % (stats['ops_per_s'], stats['mean_us'], stats['p50_us'],
+                                                 stats['p99_us'], stats['jitter_us'])
+    if stats['failed']:
+        line += '  %d of %d failed' % (stats['failed'], stats['count'] + stats['failed'])
+    return line
+
+
+def print_results(results):
+    print('Reader %s (%s)%s' % (results['reader'], results['port'],
+                                 ', %s' % results['label'] if results.get('label') else ''))
+    if 'card' in results:
+        print('Card %s' % results['card'])
+    print('%-22s %10s %10s %10s %10s %10s' % ('', 'ops/s', 'mean us', 'p50 us', 'p99 us', 'jitter us'))
+    print('%-22s %s' % ('register', format_stats(results['register'])))
+    for (baud, stats) in results.get('serial_speeds', {}).items():
+        print('%-22s %s' % ('register %s baud' % baud, format_stats(stats)))
+    for name in ['select', 'auth', 'read', 'write']:
+        if name in results:
+            print('%-22s %s' % (name, format_stats(results[name])))
+    if 'dump' in results:
+        dump = results['dump']
+        print('%-22s %s' % ('dump %d blocks' % dump['blocks'],
+                            '%10.3f s' % dump['seconds'] if dump['ok'] else 'failed'))
+
+
+def print_history(history):
+    # One line per run, the main figures only.
+    for (reader, runs) in sorted(history.items()):
+        print('Reader %s' % reader)
+        print('  %-19s %-16s %10s %10s %10s %10s %10s' % ('time', 'label', 'reg us', 'select us', 'reads/s',
+                                                          'writes/s', 'dump s'))
+        for run in runs:
+            figures = [run.get('register', {}).get('mean_us'), run.get('select', {}).get('mean_us'),
+                       run.get('read', {}).get('ops_per_s'), run.get('write', {}).get('ops_per_s'),
+                       run.get('dump', {}).get('seconds')]
+            print('  %-19s %-16s %s' % (run['time'], run.get('label', '')[:16],
+                                        ' '.join(['%10s' % ('-' if f is None else f) for f in figures])))
+
+
+def usage(program_name):
+    print('Usage: %s [-n <count>] [-k <key>] [-b <block>] [-l <label>] [-s] [-j] [-x]' % program_name)
+    print('       %s -H' % program_name)
+    print('  Measures the reader, its cable and USB serial adapter: register round trip latency')
+    print('  and jitter, register round trips at every UART speed, WUPA to SELECT latency, auths,')
+    print('  reads and writes per second and the time of a full dump with a MIFARE Classic card')
+    print('  whose key A is known. Every run is added to the history of the reader.')
+    print('  -n <count>  - card operations timed per measurement, default %d' % DEFAULT_CARD_SAMPLES)
+    print('  -k <key>    - key A of the card, default ffffffffffff')
+    print('  -b <block>  - data block that is authenticated, read and written back, default %d' % DEFAULT_BLOCK)
+    print('  -l <label>  - stored with the results, e.g. the cable or adapter under test')
+    print('  -s          - skip the UART speed sweep')
+    print('  -j          - print the results as JSON instead of a table')
+    print('  -x          - do not add the run to the history')
+    print('  -H          - print the history of all readers')
+    print('History is kept in %s ($%s)' % (DEFAULT_HISTORY_FILE, HISTORY_ENV))
+
+
+def main():
+    args = sys.argv[1:]
+    count = DEFAULT_CARD_SAMPLES
+    key = DEFAULT_KEY
+    block = DEFAULT_BLOCK
+    label = None
+    sweep = True
+    json_out = False
+    save = True
+    if args == ['-H']:
+        print_history(load_history())
+        exit(0)
+    try:
+        while args:
+            if args[0] == '-n':
+                count = int(args[1])
+                args = args[2:]
+            elif args[0] == '-k' and len(args[1]) == 12:
+                key = list(bytes.fromhex(args[1]))
+                args = args[2:]
+            elif args[0] == '-b':
+                block = int(args[1], 0)
+                if block == 0 or block > 0xff or is_trailer_block(block):
+                    raise ValueError('%d is not a data block' % block)
+                args = args[2:]
+            elif args[0] == '-l':
+                label = args[1]
+                args = args[2:]
+            elif args[0] == '-s':
+                sweep = False
+                args = args[1:]
+            elif args[0] == '-j':
+                json_out = True
+                args = args[1:]
+            elif args[0] == '-x':
+                save = False
+                args = args[1:]
+            else:
+                raise ValueError(args[0])
+    except (IndexError, ValueError) as err:
+        print('Illegal argument: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+
+    if json_out:
+        # Keep stdout for the JSON, everything human readable goes to stderr.
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+    results = {'reader': reader_id(port), 'port': port, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    if label:
+        results['label'] = label
+    results['register'] = probe_register(mf_reader)
+    if sweep:
+        if isinstance(mf_reader, RemoteMFRC522):
+            # The sweep switches the host side of the serial port, which the daemon keeps.
+            print('UART speed sweep skipped, the daemon\'s reader is not switched from here.')
+        else:
+            results['serial_speeds'] = probe_serial_speeds(mf_reader)
+    probe_card(mf_reader, results, count, block, key)
+    mf_reader.MFRC522_HaltA()
+
+    if save:
+        print('Added to %s' % save_results(results))
+    if json_out:
+        json.dump(results, stdout, indent=2, sort_keys=True)
+        stdout.write('\n')
+    else:
+        print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import json
+import os
+import signal
+import socket
+import sys
+import MFRC522
+
+DEFAULT_SOCKET = '/tmp/mfrc522.sock'
+SOCKET_ENV = 'MFRC522_DAEMON'
+
+# Pure host computations, run by the client itself instead of a round trip.
+LOCAL_METHODS = ['CalulateCRC', 'crcA', 'appendCRC', 'commandFrame', 'MFRC522_WriteFrames', 'MFRC522_ValueFrames',
+                 'MFRC522_TransferFrame']
+
+# Instance attributes of the daemon's reader a client can not have.
+PRIVATE_ATTRIBUTES = ['ser']
+
+
+class DaemonError(Exception):
+    pass
+
+
+def socket_path():
+    return os.environ.get(SOCKET_ENV, DEFAULT_SOCKET)
+
+
+# JSON has no tuples, int keyed dicts or bytes, the driver returns all three
+# (e.g. MFRC522_Read gives (status, {0: addr, 1: data})). They travel tagged.
+def to_wire(value):
+    if isinstance(value, tuple):
+        return {'t': [to_wire(x) for x in value]}
+    if isinstance(value, list):
+        return [to_wire(x) for x in value]
+    if isinstance(value, dict):
+        return {'d': [[to_wire(k), to_wire(v)] for (k, v) in value.items()]}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'b': bytes(value).hex()}
+    return value
+
+
+def from_wire(value):
+    if isinstance(value, list):
+        return [from_wire(x) for x in value]
+    if isinstance(value, dict):
+        if 't' in value:
+            return tuple(from_wire(x) for x in value['t'])
+        if 'd' in value:
+            return {from_wire(k): from_wire(v) for (k, v) in value['d']}
+        if 'b' in value:
+            return bytes.fromhex(value['b'])
+    return value
+
+
+def callable_methods():
+    # Everything public of the driver that talks to the chip.
+    return set([name for name in dir(MFRC522.MFRC522) if not name.startswith('_') and
+                callable(getattr(MFRC522.MFRC522, name))])
+
+
+class ReaderDaemon:
+    """Owns the serial port and the initialised MFRC522, serves it on a Unix socket.
+
+    One request per line: {"m": method, "a": [args]} or {"g": attribute},
+    answered with {"r": result} or {"e": error}. Clients are served one at a
+    time, further connections wait in the listen backlog, so a card session
+    is never interleaved with another client's commands. Every client starts
+    with the reader as the daemon opened it, see reset_session().
+    """
+
+    def __init__(self, mf_reader: MFRC522, path):
+        self.reader = mf_reader
+        self.path = path
+        self.methods = callable_methods()
+        self.crc_offload = mf_reader.crc_offload
+        self.timeouts = dict(mf_reader.timeouts)
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        os.chmod(path, 0o600)
+        self.server.listen(16)
+
+    def reset_session(self):
+        # Whatever the last client left, also when it died in the middle of a
+        # transaction: Crypto1 session, PPS bit rate, CRC mode, timer and profiles.
+        reader = self.reader
+        reader.MFRC522_StopCrypto1()
+        reader.crc_mode = reader.CRC_NONE
+        reader.setBitRate(0, 0)
+        reader.setCrcOffload(self.crc_offload)
+        reader.timeouts = dict(self.timeouts)
+        reader.setTimerPrescaler(reader.TIMER_PRESCALER, reader.timeouts[reader.TIMEOUT_LONG])
+        reader.antennaOn()
+
+    def get(self, name):
+        if name in PRIVATE_ATTRIBUTES or name.startswith('_') or name not in vars(self.reader):
+            return {'e': 'no attribute %s' % name}
+        return {'r': to_wire(getattr(self.reader, name))}
+
+    def call(self, request):
+        if 'g' in request:
+            return self.get(request['g'])
+        name = request.get('m')
+        if name not in self.methods:
+            return {'e': 'unknown method %s' % name}
+        try:
+            result = getattr(self.reader, name)(*from_wire(request.get('a', [])))
+        except Exception as err:
+            return {'e': '%s: %s' % (type(err).__name__, err)}
+        return {'r': to_wire(result)}
+
+    def serve_client(self, conn):
+        with conn, conn.makefile('rwb') as fp:
+            for line in fp:
+                try:
+                    response = self.call(json.loads(line))
+                except ValueError as err:
+                    response = {'e': 'bad request: %s' % err}
+                fp.write(json.dumps(response).encode() + b'\n')
+                fp.flush()
+
+    def serve_forever(self):
+        while True:
+            (conn, _) = self.server.accept()
+            try:
+                self.reset_session()
+                self.serve_client(conn)
+            except OSError:
+                # Client went away in the middle of a request.
+                pass
+
+    def close(self):
+        self.server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class RemoteMFRC522:
+    """Client side stand-in for MFRC522, every driver method is one round trip.
+
+    Constants such as MI_OK or PICC_READ come from the MFRC522 class, pure
+    host helpers like CalulateCRC run locally. Instance state of the daemon's
+    reader (crc_offload, timeouts, ...) is read with a round trip on every
+    access; the serial port stays with the daemon, ser raises AttributeError.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        self.fp = self.sock.makefile('rwb')
+
+    def request(self, request):
+        self.fp.write(json.dumps(request).encode() + b'\n')
+        self.fp.flush()
+        line = self.fp.readline()
+        if not line:
+            raise DaemonError('reader daemon closed the connection')
+        response = json.loads(line)
+        if 'e' in response:
+            raise DaemonError(response['e'])
+        return from_wire(response['r'])
+
+    def call(self, name, *args):
+        return self.request({'m': name, 'a': to_wire(list(args))})
+
+    def close(self):
+        self.fp.close()
+        self.sock.close()
+
+    def __getattr__(self, name):
+        if name in LOCAL_METHODS:
+            method = getattr(MFRC522.MFRC522, name)
+            return lambda *args: method(self, *args)
+        if name in PRIVATE_ATTRIBUTES or name.startswith('_'):
+            raise AttributeError('%s of the reader stays with the reader daemon' % name)
+        if hasattr(MFRC522.MFRC522, name):
+            value = getattr(MFRC522.MFRC522, name)
+            if callable(value):
+                return lambda *args: self.call(name, *args)
+            return value
+        try:
+            return self.request({'g': name})
+        except DaemonError as err:
+            raise AttributeError(str(err))
+
+
+def connect(path=None):
+    # A RemoteMFRC522 when a daemon is listening, None otherwise.
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        return RemoteMFRC522(path)
+    except OSError:
+        return None
+
+
+def usage(program_name):
+    print('Usage: %s [-s <socket>]' % program_name)
+    print('  -s <socket>   - Unix socket to serve on, default %s or $%s' % (DEFAULT_SOCKET, SOCKET_ENV))
+    print('The tools use the daemon automatically while it runs, stop it with Ctrl-C.')
+
+
+def main():
+    path = socket_path()
+    if len(sys.argv) == 3 and sys.argv[1] == '-s':
+        path = sys.argv[2]
+    elif len(sys.argv) != 1:
+        usage(sys.argv[0])
+        exit(-1)
+
+    from Common import auto_find_port, open_reader
+    port = auto_find_port()
+    mf_reader = open_reader(port)
+    daemon = ReaderDaemon(mf_reader, path)
+    print('MFRC522(%s) opened, serving on %s' % (port, path))
+
+    def stop(signum, frame):
+        daemon.close()
+        print('Reader daemon stopped.')
+        exit(0)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    daemon.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
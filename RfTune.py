@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import json
+import MFRC522
+import os
+import sys
+import time
+from serial.tools import list_ports
+from Anticol import anticol, connect_reader
+
+PROFILE_ENV = 'MFRC522_RF_PROFILES'
+DEFAULT_PROFILE_FILE = os.path.join(os.path.expanduser('~'), '.mfrc522_rf.json')
+
+# Values tried per register. RFCfgReg: RxGain in bits 6..4, codes 2/3 repeat
+# the 18/23 dB of codes 0/1 and are left out, the reserved low bits keep their
+# reset value 8. RxThresholdReg: MinLevel in bits 7..4, CollLevel 4. CWGsPReg and
+# ModGsPReg: 6 bit p-driver conductance.
+SWEEP = [
+    ('RFCfgReg', [0x08, 0x18, 0x48, 0x58, 0x68, 0x78]),
+    ('RxThresholdReg', [0x44, 0x64, 0x84, 0xA4, 0xC4]),
+    ('CWGsPReg', [0x10, 0x20, 0x30, 0x3F]),
+    ('ModGsPReg', [0x10, 0x20, 0x30, 0x3F]),
+]
+
+# Coordinate sweeps over all registers, stops early when a pass changes nothing.
+MAX_PASSES = 2
+
+DEFAULT_KEY = [0xff, 0xff, 0xff, 0xff, 0xff, 0xff]
+
+
+def profile_file():
+    return os.environ.get(PROFILE_ENV, DEFAULT_PROFILE_FILE)
+
+
+def reader_id(port):
+    # USB serial number of the adapter when it has one, so the profile follows the
+    # reader to another port; the device name otherwise.
+    for info in list_ports.comports():
+        if info.device == port and info.serial_number:
+            return 'usb:%s' % info.serial_number
+    return port
+
+
+def load_profiles(path=None):
+    try:
+        with open(path or profile_file(), 'r') as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_profile(port, profile, path=None):
+    path = path or profile_file()
+    profiles = load_profiles(path)
+    profiles[reader_id(port)] = profile
+    with open(path, 'w') as fp:
+        json.dump(profiles, fp, indent=2, sort_keys=True)
+    return path
+
+
+def apply_saved_profile(mf_reader: MFRC522, port):
+    # Called when a reader is opened, returns the profile applied or None. A
+    # 'timeouts' entry overrides the timeout profiles of this reader, e.g.
+    # {"short": 60} for an antenna that answers late.
+    profile = load_profiles().get(reader_id(port))
+    if profile:
+        mf_reader.setRfProfile(profile)
+        if 'timeouts' in profile:
+            mf_reader.setTimeouts(profile['timeouts'])
+    return profile
+
+
+def read_reference(mf_reader: MFRC522, key):
+    """One trial: select the reference card, authenticate and read block 0.
+
+    The field is switched off afterwards, a failure can leave the card
+    anywhere in its state machine and the power cycle starts every trial
+    from the same point.
+    """
+    (success, card_info) = anticol(mf_reader, print_info=False, wakeup=True, no_rats=True)
+    if success:
+        success = mf_reader.MFRC522_Auth(mf_reader.PICC_AUTHENT1A, 0, key, card_info[0]) == mf_reader.MI_OK
+        if success:
+            success = mf_reader.MFRC522_Read(0)[0] == mf_reader.MI_OK
+    mf_reader.MFRC522_StopCrypto1()
+    mf_reader.antennaOff()
+    time.sleep(0.005)
+    mf_reader.antennaOn()
+    time.sleep(0.005)
+    return success
+
+
+def measure(mf_reader: MFRC522, trials, key):
+    # Returns (success rate, mean latency of the good trials in s).
+    good = 0
+    elapsed = 0.0
+    for _ in range(trials):
+        t_start = time.monotonic()
+        if read_reference(mf_reader, key):
+            good += 1
+            elapsed += time.monotonic() - t_start
+    return good / trials, (elapsed / good if good else None)
+
+
+def score(result):
+    # Success rate first, latency breaks ties.
+    (rate, latency) = result
+    return rate, -(latency if latency is not None else 1e9)
+
+
+def tune(mf_reader: MFRC522, trials=20, key=DEFAULT_KEY, print_info=True):
+    """Coordinate sweep: one register at a time over its values, the others fixed.
+
+    The best value is kept before the next register is swept. Returns the
+    best profile (already applied) and its (success rate, latency).
+    """
+    profile = mf_reader.getRfProfile()
+    best = measure(mf_reader, trials, key)
+    if print_info:
+        print('Start  %s: %3.0f%%, %s' % (format_profile(profile), best[0] * 100, format_latency(best[1])))
+    for _ in range(MAX_PASSES):
+        changed = False
+        for (name, values) in SWEEP:
+            for value in values:
+                if value == profile[name]:
+                    continue
+                candidate = dict(profile)
+                candidate[name] = value
+                mf_reader.setRfProfile(candidate)
+                result = measure(mf_reader, trials, key)
+                if print_info:
+                    print('       %s: %3.0f%%, %s' % (format_profile(candidate), result[0] * 100,
+                                                       format_latency(result[1])))
+                if score(result) > score(best):
+                    (profile, best, changed) = (candidate, result, True)
+            mf_reader.setRfProfile(profile)
+        if not changed:
+            break
+    return profile, best
+
+
+def format_profile(profile):
+    return ' '.join(['%s=%02x' % (name.replace('Reg', ''), profile[name]) for name in MFRC522.MFRC522.RF_PROFILE_REGISTERS])
+
+
+def format_latency(latency):
+    return '%.1f ms' % (latency * 1000) if latency is not None else '-'
+
+
+def usage(program_name):
+    print('Usage: %s [-n <trials>] [-k <key>] [-d]' % program_name)
+    print('  Sweeps the receiver gain, threshold and driver conductance with a reference')
+    print('  card in the field and saves the best setting for this reader, the tools apply')
+    print('  it whenever they open the reader.')
+    print('  -n <trials>  - reads per setting, default 20')
+    print('  -k <key>     - key A of sector 0 of the reference card, default ffffffffffff')
+    print('  -d           - dry run, do not save the profile')
+    print('Profiles are kept in %s ($%s)' % (DEFAULT_PROFILE_FILE, PROFILE_ENV))
+
+
+def main():
+    args = sys.argv[1:]
+    trials = 20
+    key = DEFAULT_KEY
+    save = True
+    try:
+        while args:
+            if args[0] == '-n':
+                trials = int(args[1])
+                args = args[2:]
+            elif args[0] == '-k' and len(args[1]) == 12:
+                key = list(bytes.fromhex(args[1]))
+                args = args[2:]
+            elif args[0] == '-d':
+                save = False
+                args = args[1:]
+            else:
+                raise ValueError(args[0])
+    except (IndexError, ValueError) as err:
+        print('Illegal argument: %s' % err)
+        usage(sys.argv[0])
+        exit(-1)
+
+    (mf_reader, port) = connect_reader()
+    print("MFRC522(%s) opened." % port)
+    if measure(mf_reader, 5, key)[0] == 0:
+        print('Error: no reference card readable with key %s' % bytes(key).hex())
+        exit(-1)
+
+    (profile, result) = tune(mf_reader, trials, key)
+    print('Best   %s: %3.0f%%, %s' % (format_profile(profile), result[0] * 100, format_latency(result[1])))
+    if save:
+        if port.startswith('daemon '):
+            print('Profile applied to the daemon\'s reader, run RfTune without the daemon to save it.')
+        else:
+            print('Saved to %s' % save_profile(port, profile))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+import atexit
+import os
+import sys
+import time
+
+# Trace file: MAGIC, then one record per serial call:
+#   type (1 byte), time since the previous record in ns (varint), length (varint), payload
+MAGIC = b'MFTRACE1'
+
+RECORD_WRITE = 0x01     # bytes sent
+RECORD_READ = 0x02      # bytes received, shorter than asked for on a timeout
+RECORD_FLUSH = 0x03     # reset_input_buffer, no payload
+RECORD_BAUD = 0x04      # baudrate change, payload is the new rate as varint
+
+RECORD_NAMES = {RECORD_WRITE: 'W', RECORD_READ: 'R', RECORD_FLUSH: 'F', RECORD_BAUD: 'B'}
+
+TRACE_ENV = 'MFRC522_TRACE'
+
+
+class TraceError(Exception):
+    pass
+
+
+def encode_varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, pos):
+    # Returns (value, position after it).
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise TraceError('truncated varint at offset %d' % pos)
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, pos
+        shift += 7
+
+
+def read_trace(path):
+    """Load a trace file as a list of (type, delta_ns, payload) records."""
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    if not data.startswith(MAGIC):
+        raise TraceError('%s is not a serial trace' % path)
+    records = []
+    pos = len(MAGIC)
+    while pos < len(data):
+        kind = data[pos]
+        (delta, pos) = decode_varint(data, pos + 1)
+        (length, pos) = decode_varint(data, pos)
+        if pos + length > len(data):
+            raise TraceError('truncated record at offset %d' % pos)
+        records.append((kind, delta, data[pos:pos + length]))
+        pos += length
+    return records
+
+
+class TraceRecorder:
+    """Wraps a serial.Serial and records every call into a trace file.
+
+    Records are buffered and written out on close() or at interpreter exit,
+    the overhead per call is one monotonic clock read and a few appends.
+    """
+
+    def __init__(self, ser, path):
+        self.ser = ser
+        self.path = path
+        self.fp = open(path, 'wb')
+        self.fp.write(MAGIC)
+        self.last_ns = time.monotonic_ns()
+        self.record(RECORD_BAUD, encode_varint(ser.baudrate))
+        atexit.register(self.close)
+
+    def record(self, kind, payload):
+        now = time.monotonic_ns()
+        self.fp.write(bytes([kind]) + encode_varint(now - self.last_ns) + encode_varint(len(payload)))
+        self.fp.write(payload)
+        self.last_ns = now
+
+    def write(self, data):
+        count = self.ser.write(data)
+        self.record(RECORD_WRITE, bytes(data))
+        return count
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.record(RECORD_READ, data)
+        return data
+
+    def reset_input_buffer(self):
+        self.ser.reset_input_buffer()
+        self.record(RECORD_FLUSH, b'')
+
+    @property
+    def baudrate(self):
+        return self.ser.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self.ser.baudrate = value
+        self.record(RECORD_BAUD, encode_varint(value))
+
+    def close(self):
+        if not self.fp.closed:
+            self.fp.close()
+            self.ser.close()
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+
+class ReplaySerial:
+    """Stand-in for serial.Serial that plays a recorded trace back.
+
+    Reads return the recorded answers. With strict, every write must send
+    exactly the recorded bytes, so a driver change that alters the traffic
+    fails at the first difference instead of getting wrong answers. With
+    realtime, the recorded gaps before each read are waited out again.
+    """
+
+    def __init__(self, path, strict=True, realtime=False):
+        self.records = read_trace(path)
+        self.pos = 0
+        self.strict = strict
+        self.realtime = realtime
+        self.baudrate = 9600
+        if self.records and self.records[0][0] == RECORD_BAUD:
+            self.baudrate = decode_varint(self.records[0][2], 0)[0]
+            self.pos = 1
+
+    def next_record(self, kind):
+        # Skips flush and baud records the caller did not ask for.
+        while self.pos < len(self.records):
+            record = self.records[self.pos]
+            self.pos += 1
+            if record[0] == kind:
+                return record
+            if record[0] not in [RECORD_FLUSH, RECORD_BAUD] and self.strict:
+                raise TraceError('record %d: expected %s, trace has %s' %
+                                 (self.pos - 1, RECORD_NAMES[kind], RECORD_NAMES.get(record[0], '?')))
+        raise TraceError('end of trace')
+
+    def write(self, data):
+        record = self.next_record(RECORD_WRITE)
+        if self.strict and bytes(data) != record[2]:
+            raise TraceError('record %d: wrote %s, trace has %s' % (self.pos - 1, bytes(data).hex(), record[2].hex()))
+        return len(data)
+
+    def read(self, size=1):
+        record = self.next_record(RECORD_READ)
+        if self.realtime:
+            time.sleep(record[1] / 1000000000)
+        return record[2][:size]
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        pass
+
+    def done(self):
+        return self.pos >= len(self.records)
+
+
+def open_traced(ser, path=None):
+    # Wrap ser with a recorder when a path is given or MFRC522_TRACE is set.
+    if path is None:
+        path = os.environ.get(TRACE_ENV)
+    if not path:
+        return ser
+    return TraceRecorder(ser, path)
+
+
+def summary(records):
+    counts = {}
+    total_ns = 0
+    read_ns = 0
+    for (kind, delta, payload) in records:
+        (n, size) = counts.get(kind, (0, 0))
+        counts[kind] = (n + 1, size + len(payload))
+        total_ns += delta
+        if kind == RECORD_READ:
+            read_ns += delta
+    return counts, total_ns, read_ns
+
+
+def usage(program_name):
+    print('Usage: %s <trace.bin> [-v]' % program_name)
+    print('  Prints the summary of a serial trace recorded with %s=<trace.bin>' % TRACE_ENV)
+    print('  -v          - also list every record with its time offset')
+
+
+def main():
+    if len(sys.argv) < 2 or len(sys.argv) > 3 or (len(sys.argv) == 3 and sys.argv[2] != '-v'):
+        usage(sys.argv[0])
+        exit(-1)
+    try:
+        records = read_trace(sys.argv[1])
+    except (IOError, TraceError) as err:
+        print('Could not read trace: %s, err = %s' % (sys.argv[1], err))
+        exit(-1)
+
+    if len(sys.argv) == 3:
+        t_ns = 0
+        for (kind, delta, payload) in records:
+            t_ns += delta
+            text = str(decode_varint(payload, 0)[0]) if kind == RECORD_BAUD else payload.hex()
+            print('%12.3f ms %+9.3f ms %s %s' % (t_ns / 1000000, delta / 1000000, RECORD_NAMES.get(kind, '?'), text))
+
+    (counts, total_ns, read_ns) = summary(records)
+    print('%d records, %.3f ms' % (len(records), total_ns / 1000000))
+    for kind in sorted(counts):
+        print('  %s: %d calls, %d bytes' % (RECORD_NAMES.get(kind, '?'), counts[kind][0], counts[kind][1]))
+    print('  waiting in read: %.3f ms' % (read_ns / 1000000))
+
+
+if __name__ == '__main__':
+    main()